@@ -1,25 +1,23 @@
-import smtplib
+import os
 from email.mime.text import MIMEText
+from dotenv import load_dotenv
 
-def send_email(to_email: str, code: str) -> bool:
-    from_email = "zhubanysheva03@bk.ru"
-    password = "Gulduru651456"  
-    smtp_server = "smtp.mail.com"
-    smtp_port = 587
+load_dotenv()
 
-    subject = "Код подтверждения"
-    body = f"Ваш код подтверждения: {code}"
+SMTP_FROM = os.getenv("SMTP_FROM", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.mail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+
+CODE_EMAIL_SUBJECT = "Код подтверждения"
+
+def code_email_body(code: str) -> str:
+    return f"Ваш код подтверждения: {code}"
+
+def build_message(to_email: str, subject: str, body: str) -> MIMEText:
     msg = MIMEText(body)
     msg["Subject"] = subject
-    msg["From"] = from_email
+    msg["From"] = SMTP_FROM
     msg["To"] = to_email
-
-    try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(from_email, password)
-            server.sendmail(from_email, to_email, msg.as_string())
-        return True
-    except Exception as e:
-        print(f"[Email Error] {e}")
-        return False
+    return msg
@@ -1,22 +1,10 @@
-import requests
+import os
+from dotenv import load_dotenv
 
-TELEGRAM_BOT_TOKEN = "8034634515:AAGcI4TGLiQIjEbDBZWFfgp4Ld_SunKP7zM"
-TELEGRAM_API_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+load_dotenv()
 
-def send_telegram_code(chat_id: str, code: str) -> bool:
-    message = f"🔐 Код подтверждения: {code}"
-    payload = {
-        "chat_id": chat_id,
-        "text": message,
-        "parse_mode": "HTML"
-    }
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage")
 
-    try:
-        response = requests.post(TELEGRAM_API_URL, data=payload)
-        if response.status_code != 200:
-            print(f"[Telegram Error] Status: {response.status_code}, Text: {response.text}")
-            return False
-        return True
-    except Exception as e:
-        print(f"[Telegram Exception] {e}")
-        return False
+def telegram_code_message(code: str) -> str:
+    return f"🔐 Код подтверждения: {code}"
@@ -1,57 +1,62 @@
+from contextlib import asynccontextmanager
+import os
 from fastapi import FastAPI, Request, Query, Depends
 from starlette.middleware.sessions import SessionMiddleware
-from starlette.responses import RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
-from starlette.middleware.base import BaseHTTPMiddleware
 
+from middleware.auth import AuthMiddleware
 from routes import auth, asset, cmdb_import
 from routes.profile import profile_router
-from db import init_db, SessionLocal, get_db
-from apscheduler.schedulers.background import BackgroundScheduler
-from routes.cmdb_import import import_from_glpi
+from db import init_db, get_db, engine
+from routes.cmdb_import import cmdb_import_job
 from dotenv import load_dotenv
-from models.asset import Asset
-from models.risk_assessment import RiskAssessment
-from models.risk_map import RiskListEntry
-from models.measure import Measure, Notification
-from routes import risk_assessment, risk_map, measure
+from services.dashboard_stats import get_dashboard_stats
+from services.render_pool import shutdown_render_pool
+from services.password_hashing import shutdown_password_pool
+from services.asset_search import ensure_asset_search_index
+from services.asset_sync import ensure_asset_sync_schema
+from services.risk_map_filters import ensure_risk_list_indexes
+from services.notifications import ensure_notification_schema, notifications_job
+from services.ephemeral_store import ephemeral_sweep_job
+from services.outbox import outbox_cleanup_job, start_outbox_worker, stop_outbox_worker
+from services.scheduler import register_job, start_scheduler, shutdown_scheduler
+from routes import risk_assessment, risk_map, measure, system
 
 load_dotenv()
 
-templates = Jinja2Templates(directory="templates")
-
-class InjectUserMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        path = request.url.path
-        public_paths = ["/login", "/register", "/static", "/"]
-
-        user = None
-        if "session" in request.scope:
-            user_val = request.session.get("user")
-            
-            if isinstance(user_val, str):
-                user = {"username": user_val}
-            elif isinstance(user_val, dict):
-                user = user_val
+CMDB_IMPORT_INTERVAL_MINUTES = int(os.getenv("CMDB_IMPORT_INTERVAL_MINUTES", "30"))
+NOTIFICATION_INTERVAL_MINUTES = int(os.getenv("NOTIFICATION_INTERVAL_MINUTES", "5"))
+EPHEMERAL_SWEEP_INTERVAL_MINUTES = int(os.getenv("EPHEMERAL_SWEEP_INTERVAL_MINUTES", "10"))
+OUTBOX_CLEANUP_INTERVAL_HOURS = int(os.getenv("OUTBOX_CLEANUP_INTERVAL_HOURS", "24"))
 
-        request.state.user = user
-
-        if not user and not any(path.startswith(p) for p in public_paths):
-            return RedirectResponse("/login", status_code=303)
+templates = Jinja2Templates(directory="templates")
 
-        return await call_next(request)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_scheduler()
+    start_outbox_worker()
+    yield
+    await stop_outbox_worker()
+    shutdown_scheduler()
+    shutdown_render_pool()
+    shutdown_password_pool()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
+# Последний добавленный middleware — внешний: сессия разбирается до проверки входа
+app.add_middleware(AuthMiddleware)
 app.add_middleware(SessionMiddleware, secret_key="your-super-secret-key")
-app.add_middleware(InjectUserMiddleware)
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
 init_db()
+ensure_asset_sync_schema()
+ensure_asset_search_index(engine)
+ensure_risk_list_indexes(engine)
+ensure_notification_schema(engine)
 
 app.include_router(risk_map.router)
 app.include_router(auth.router)
@@ -60,6 +65,12 @@ app.include_router(asset.router)
 app.include_router(cmdb_import.router, prefix="/cmdb")
 app.include_router(risk_assessment.router)
 app.include_router(measure.router)
+app.include_router(system.router)
+
+register_job("cmdb_import", cmdb_import_job, minutes=CMDB_IMPORT_INTERVAL_MINUTES)
+register_job("notifications", notifications_job, minutes=NOTIFICATION_INTERVAL_MINUTES)
+register_job("ephemeral_sweep", ephemeral_sweep_job, minutes=EPHEMERAL_SWEEP_INTERVAL_MINUTES)
+register_job("outbox_cleanup", outbox_cleanup_job, hours=OUTBOX_CLEANUP_INTERVAL_HOURS)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -68,48 +79,15 @@ async def index(request: Request):
 
 @app.get("/dashboard")
 def dashboard(request: Request, db: Session = Depends(get_db)):
-    user = request.session.get("user")
-    if not user:
-        return RedirectResponse("/login", status_code=303)
-
-    if isinstance(user, str):
-        user = {"username": user}
-
-    total_assets = db.query(Asset).count()
-    total_risks = db.query(RiskAssessment).count()
-    high_risks = db.query(RiskAssessment).filter(RiskAssessment.level.in_(['Высокий', 'Критический'])).count()
-    high_critical_count = db.query(Asset).filter(Asset.criticality == "High").count()
-    critical_priority_count=db.query(RiskListEntry).filter(RiskListEntry.priority.in_(['Критический'])).count()
-    new_status_count=db.query(RiskListEntry).filter(RiskListEntry.status.in_(['Новый'])).count()
-    in_progress_count = db.query(RiskListEntry).filter(RiskListEntry.status.in_(['В работе'])).count()
-    total_measures = db.query(Measure).count()
-    total_notifications = db.query(Notification).count()
+    user = request.state.user
+
+    stats = get_dashboard_stats(db)
 
     return templates.TemplateResponse(
         "dashboard.html",
         {
             "request": request,
             "user":user, 
-            "total_assets": total_assets,
-            "total_risks": total_risks,
-            "high_risks": high_risks,
-            "high_critical_count": high_critical_count,
-            "critical_priority_count": critical_priority_count,
-            "new_status_count": new_status_count,
-            "in_progress_count": in_progress_count,
-            "total_measures": total_measures,  
-            "total_notifications": total_notifications  
+            **stats
         }
     )
-
-def auto_import_job():
-    db = SessionLocal()
-    try:
-        import_from_glpi(db)
-    finally:
-        db.close()
-
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(auto_import_job, 'interval', minutes=30)
-    scheduler.start()
-
@@ -1,30 +1,80 @@
-from fastapi import Request, Response
-from fastapi.responses import RedirectResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.datastructures import MutableHeaders
-from starlette.middleware.sessions import SessionMiddleware
-from sqlalchemy.orm import Session as DBSession
-from models.user import User
-from database import SessionLocal
-
-class InjectUserMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        path = request.url.path
-        public_paths = ["/login", "/register", "/static", "/"]
-
-        user = None
-        if "session" in request.scope:
-            user_val = request.session.get("user")
-            print("SESSION USER:", user_val) 
-            if isinstance(user_val, str):
-                user = {"username": user_val}
-            elif isinstance(user_val, dict):
-                user = user_val
-
-        from main import templates
-        templates.env.globals["user"] = user
-
-        if not user and not any(path.startswith(p) for p in public_paths):
-            return RedirectResponse("/login", status_code=303)
-
-        return await call_next(request)
+from typing import Optional
+
+from starlette.responses import RedirectResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from services.user_cache import resolve_user
+
+# Страницы, доступные без входа: точные пути и префиксы (по целым сегментам пути)
+PUBLIC_PATHS = ("/", "/login", "/register", "/logout", "/favicon.ico")
+PUBLIC_PREFIXES = ("/static", "/verify")
+
+_END = object()
+
+
+def _segments(path: str) -> list:
+    return [segment for segment in path.split("/") if segment]
+
+
+class PathAllowList:
+    def __init__(self, exact=(), prefixes=()):
+        self._exact = frozenset(self._normalize(path) for path in exact)
+        self._trie = {}
+        for prefix in prefixes:
+            node = self._trie
+            for segment in _segments(prefix):
+                node = node.setdefault(segment, {})
+            node[_END] = True
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        return path.rstrip("/") or "/"
+
+    def __contains__(self, path: str) -> bool:
+        if self._normalize(path) in self._exact:
+            return True
+        node = self._trie
+        if _END in node:
+            return True
+        for segment in _segments(path):
+            node = node.get(segment)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+
+# В сессии хранится либо email, либо {"username": email}
+def session_subject(session) -> Optional[str]:
+    value = session.get("user")
+    if isinstance(value, dict):
+        value = value.get("username")
+    return value if isinstance(value, str) and value else None
+
+
+# Чистый ASGI: тело ответа не оборачивается, поэтому потоковые выгрузки и SSE идут напрямую.
+# Пользователь определяется один раз (через кэш services/user_cache) и доступен
+# обработчикам как request.state.user.
+class AuthMiddleware:
+    def __init__(self, app: ASGIApp, public_paths=PUBLIC_PATHS, public_prefixes=PUBLIC_PREFIXES, login_url: str = "/login"):
+        self.app = app
+        self.allow_list = PathAllowList(public_paths, public_prefixes)
+        self.login_url = login_url
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        assert "session" in scope, "AuthMiddleware должен подключаться внутри SessionMiddleware"
+        subject = session_subject(scope["session"])
+        user = await resolve_user(subject) if subject else None
+        scope.setdefault("state", {})["user"] = user
+
+        if user is None and scope["path"] not in self.allow_list:
+            response = RedirectResponse(self.login_url, status_code=303)
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
@@ -19,5 +19,7 @@ class Asset(Base):
     source = Column(String, nullable=False)
     inventory_number = Column(Integer)
     description = Column(String)
+    # Когда полная сверка не нашла актив в CMDB; NULL — актив в CMDB есть или ведётся вручную
+    removed_from_cmdb_at = Column(DateTime(timezone=True), nullable=True)
 
     risk_assessments = relationship("RiskAssessment", back_populates="asset", cascade="all, delete")
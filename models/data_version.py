@@ -0,0 +1,9 @@
+from sqlalchemy import Column, String, BigInteger
+from db import Base
+
+# Счётчик изменений таблицы: увеличивается в каждой транзакции, которая её меняет
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
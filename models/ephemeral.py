@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, DateTime, Text, Index
+from db import Base
+
+# Короткоживущие значения (коды 2FA и т.п.) для backend "sql" в services/ephemeral_store.py
+class EphemeralEntry(Base):
+    __tablename__ = "ephemeral_entries"
+
+    key = Column(String, primary_key=True)
+    value = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_ephemeral_entries_expires_at", "expires_at"),
+    )
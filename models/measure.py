@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Text, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, Text, DateTime, Boolean, Index, func
 from sqlalchemy.orm import relationship
 from db import Base
 from datetime import datetime
@@ -13,9 +13,9 @@ class Measure(Base):
     description = Column(Text, nullable=True)
     status = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow) 
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     risk_type_id = Column(Integer, ForeignKey("risk_list_entries.id"))
     risk_type = relationship("RiskListEntry")
-    risk_type_kz = relationship("RiskListEntry")
     notifications = relationship("Notification", back_populates="measure")
 
 
@@ -31,5 +31,25 @@ class Notification(Base):
     message_kz = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     read = Column(Boolean, default=False)
+    # День, за который сработало правило; уведомление одного типа по мере создаётся раз в день
+    day = Column(Date, nullable=True)
     
     measure = relationship("Measure", back_populates="notifications")
+
+
+# measure_id у сводных уведомлений пустой, а NULL в уникальном индексе не совпадают между собой
+Index(
+    "uq_notifications_type_measure_day",
+    Notification.type, func.coalesce(Notification.measure_id, 0), Notification.day,
+    unique=True,
+)
+# Частичный индекс: счётчик непрочитанных не зависит от размера истории
+Index(
+    "ix_notifications_unread", Notification.id,
+    postgresql_where=Notification.read == False,
+    sqlite_where=Notification.read == False,
+)
+Index("ix_notifications_created_at_id", Notification.created_at, Notification.id)
+Index("ix_measures_due_date", Measure.due_date)
+Index("ix_measures_created_at", Measure.created_at)
+Index("ix_measures_updated_at", Measure.updated_at)
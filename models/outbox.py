@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from db import Base
+from datetime import datetime
+
+class OutboxMessage(Base):
+    __tablename__ = "outbox_messages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # telegram / email
+    channel = Column(String, nullable=False)
+    # chat_id для telegram, адрес для email
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=True)
+    body = Column(Text, nullable=False)
+    # pending / sent / failed
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        # Очередь доставки: только неотправленные сообщения
+        Index(
+            "ix_outbox_messages_pending", "next_attempt_at",
+            postgresql_where=(status == "pending"),
+            sqlite_where=(status == "pending"),
+        ),
+    )
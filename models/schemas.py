@@ -65,6 +65,7 @@ class RiskUpdateSchema(BaseModel):
 class RiskTypeOut(BaseModel):
     id: int
     title: str
+    title_kz: Optional[str] = None
     class Config:
         orm_mode = True
 
@@ -108,4 +109,11 @@ class NotificationBase(BaseModel):
     read: bool
 
 class NotificationOut(NotificationBase):
-    pass
\ No newline at end of file
+    pass
+
+class NotificationPage(BaseModel):
+    items: List[NotificationOut]
+    next_cursor: Optional[str] = None
+
+class UnreadCountOut(BaseModel):
+    unread: int
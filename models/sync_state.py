@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, DateTime
+
+from db import Base
+
+class SyncWatermark(Base):
+    __tablename__ = "sync_watermarks"
+
+    name = Column(String, primary_key=True)
+    watermark = Column(DateTime, nullable=True)
+    last_full_sync = Column(DateTime, nullable=True)
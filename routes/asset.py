@@ -1,66 +1,103 @@
 from fastapi import APIRouter, Request, Depends, Form, HTTPException, status, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from db import get_db
+from db import get_async_db, get_db
 from models.asset import Asset
 from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse
-import io
-import pandas as pd
-from routes.cmdb_import import import_from_glpi
+from routes.cmdb_import import run_glpi_import
 from starlette.status import HTTP_302_FOUND
 from fastapi.templating import Jinja2Templates
 from models.schemas import AssetCreate, AssetUpdate, AssetDelete
 from typing import Optional
 from datetime import datetime
+from urllib.parse import urlencode
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 from fastapi import status as http_status
 from fastapi.responses import Response
-from reportlab.lib.pagesizes import letter, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Image
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-import matplotlib.pyplot as plt
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase import pdfmetrics
-import matplotlib.pyplot as plt
-from io import BytesIO
 from dependencies.lang import get_lang
+from services.export import DB_FETCH_SIZE, PDF_MEDIA_TYPE, XLSX_MEDIA_TYPE, cached_export_response, xlsx_response
+from services.export_cache import export_cache_key, store_export_bytes
+from services.data_versions import data_versions
+from services.pdf_reports import render_assets_pdf
+from services.render_pool import render
+from services.asset_filters import asset_filter_clauses, order_by_relevance
+from services.asset_search import ASSET_SEARCH_COUNT_CAP
+from services.pagination import capped_count, estimated_count, exact_count, keyset_window
+from services.asset_stats import get_asset_distributions
+import os
 
-pdfmetrics.registerFont(TTFont('Arial', 'C:/Windows/Fonts/arial.ttf')) 
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
+ASSET_SORT_COLUMNS = {
+    "created_at": Asset.created_at,
+    "name": Asset.name,
+    "type": Asset.type,
+    "criticality": Asset.criticality,
+    "status": Asset.status,
+}
+
+# Ниже этой оценки число активов считается точно
+ASSET_EXACT_COUNT_BELOW = int(os.getenv("ASSET_EXACT_COUNT_BELOW", "10000"))
+
 @router.get("/assets")
 async def list_assets(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     lang: str = Depends(get_lang),
-    page: int = 1,
-    per_page: int = 10,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(10, ge=1, le=200),
     search: str = "",
     type: str = "",
-    criticality: str = ""
+    criticality: str = "",
+    sort: str = "-created_at",
+    cursor: Optional[str] = None,
+    before: Optional[str] = None,
+    exact: bool = False
      ):
-    offset = (page - 1) * per_page
-    query = db.query(Asset)
+    user = request.state.user
+
+    descending = sort.startswith("-")
+    sort_column = ASSET_SORT_COLUMNS.get(sort.lstrip("-"))
+    if sort_column is None:
+        raise HTTPException(status_code=422, detail=f"Неизвестное поле сортировки: {sort}")
+
+    stmt = select(Asset).where(*asset_filter_clauses(db, search, type, criticality))
+    filters = {"search": search, "type": type, "criticality": criticality, "sort": sort, "per_page": per_page}
+    prev_query = next_query = None
 
     if search:
-        query = query.filter(Asset.name.ilike(f"%{search}%"))
-    if type:
-        query = query.filter(Asset.type == type)
-    if criticality:
-        query = query.filter(Asset.criticality == criticality)
-
-    user = request.session.get("user")
-    if not user:
-        return RedirectResponse("/login", status_code=303)
-
-    if isinstance(user, str):
-        user = {"username": user}
-    total_assets = query.count()
-    assets = query.offset(offset).limit(per_page).all()
-    total_pages = (total_assets + per_page - 1) // per_page
+        # Выдача поиска упорядочена по релевантности и ограничена ASSET_SEARCH_COUNT_CAP,
+        # поэтому листаем её номерами страниц
+        total_assets, total_exact = await db.run_sync(capped_count, stmt, ASSET_SEARCH_COUNT_CAP)
+        total_label = f"{total_assets}" if total_exact else f"{total_assets}+"
+        offset = (page - 1) * per_page
+        assets = (await db.scalars(order_by_relevance(stmt, db, search).offset(offset).limit(per_page + 1))).all()
+        if page > 1:
+            prev_query = urlencode({**filters, "page": page - 1})
+        if len(assets) > per_page and offset + per_page < ASSET_SEARCH_COUNT_CAP:
+            next_query = urlencode({**filters, "page": page + 1})
+        assets = assets[:per_page]
+    else:
+        if exact:
+            total_assets, total_exact = await db.run_sync(exact_count, stmt), True
+        else:
+            total_assets, total_exact = await db.run_sync(estimated_count, stmt, exact_below=ASSET_EXACT_COUNT_BELOW)
+        total_label = f"{total_assets}" if total_exact else f"~{total_assets}"
+        try:
+            assets, prev_cursor, next_cursor = await db.run_sync(
+                keyset_window, stmt, sort_column, Asset.id,
+                cursor=cursor, before=before, limit=per_page, descending=descending
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if prev_cursor:
+            prev_query = urlencode({**filters, "before": prev_cursor})
+        if next_cursor:
+            next_query = urlencode({**filters, "cursor": next_cursor})
 
     return templates.TemplateResponse(
         "assets.html",
@@ -70,24 +107,26 @@ async def list_assets(
             "lang": lang,
             "assets": assets,
             "total_assets": total_assets,
-            "page": page,
-            "total_pages": total_pages,
+            "total_label": total_label,
+            "prev_query": prev_query,
+            "next_query": next_query,
             "per_page": per_page,
             "search": search,
             "type": type,
-            "criticality": criticality
+            "criticality": criticality,
+            "sort": sort
         }
     )
 
 @router.post("/assets/import")
-def manual_import(request: Request, db: Session = Depends(get_db)):
-    import_from_glpi(db)
+async def manual_import(request: Request, db: Session = Depends(get_db)):
+    await run_glpi_import(db)
     return RedirectResponse(url="/assets", status_code=HTTP_302_FOUND)
 
 @router.post("/assets/create")
 async def create_asset(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     name: str = Form(...),
     type: str = Form(...),
     criticality: str = Form(...),
@@ -110,7 +149,7 @@ async def create_asset(
         )
         
         db.add(new_asset)
-        db.commit()
+        await db.commit()
        
         return JSONResponse({
             "success": True,
@@ -119,7 +158,7 @@ async def create_asset(
         })
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return JSONResponse({
             "success": False,
             "message": f"Ошибка при создании актива: {str(e)}"
@@ -137,10 +176,10 @@ async def update_asset(
     owner: Optional[str] = Form(None),
     source: Optional[str] = Form(None),
     description: Optional[str] = Form(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
      ):
     try:        
-        db_asset = db.query(Asset).filter(Asset.id == id).first()
+        db_asset = await db.get(Asset, id)
         if not db_asset:
             return JSONResponse(
                 status_code=http_status.HTTP_404_NOT_FOUND,
@@ -158,12 +197,12 @@ async def update_asset(
         db_asset.description = description
         db_asset.updated_at = datetime.utcnow()
 
-        db.commit()
+        await db.commit()
 
         return RedirectResponse(url="/assets", status_code=http_status.HTTP_302_FOUND)
 
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return JSONResponse(
             status_code=http_status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={
@@ -186,18 +225,19 @@ async def update_asset(
 @router.post("/assets/delete")
 async def delete_asset(
     asset_data: AssetDelete,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
     ):
     try:
-        db_asset = db.query(Asset).filter(Asset.id == asset_data.id).first()
+        db_asset = await db.get(Asset, asset_data.id)
         if not db_asset:
             return JSONResponse(
                 status_code=status.HTTP_404_NOT_FOUND,
                 content={"success": False, "message": "Актив не найден"}
             )
 
-        db.delete(db_asset)
-        db.commit()
+        # delete() подгружает risk_assessments для каскадного удаления
+        await db.delete(db_asset)
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -209,7 +249,7 @@ async def delete_asset(
         )
 
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return JSONResponse(
     status_code=http_status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={
@@ -229,50 +269,68 @@ async def delete_asset(
         )
 
 @router.get("/assets/export/excel")
-async def export_assets_excel(
+def export_assets_excel(
     department: Optional[str] = Query(None),
+    search: str = "",
+    type: str = "",
+    criticality: str = "",
     db: Session = Depends(get_db)
     ):
-    # 🔍 Фильтрация по подразделению, если указано
-    query = db.query(Asset)
+    filters = {"department": department, "search": search, "type": type, "criticality": criticality}
+    cache_key = export_cache_key("assets.xlsx", filters, "", data_versions(db, [Asset.__tablename__]))
+    if cached := cached_export_response(cache_key, ".xlsx", XLSX_MEDIA_TYPE, "it_assets.xlsx"):
+        return cached
+
+    # 🔍 Те же фильтры, что и на странице активов, плюс подразделение
+    stmt = select(
+        Asset.name, Asset.type, Asset.criticality, Asset.department,
+        Asset.owner, Asset.status, Asset.source, Asset.created_at
+    ).where(*asset_filter_clauses(db, search, type, criticality))
     if department:
-        query = query.filter(Asset.department == department)
-    assets = query.all()
-    
-    # Далее всё без изменений...
-    data = [{
-        "Название": asset.name,
-        "Тип": asset.type,
-        "Критичность": asset.criticality,
-        "Подразделение": asset.department or "",
-        "Владелец": asset.owner or "",
-        "Статус": asset.status,
-        "Источник": asset.source,
-        "Создан": asset.created_at.strftime("%d.%m.%Y") if asset.created_at else ""
-    } for asset in assets]
-    
-    df = pd.DataFrame(data)
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, sheet_name='IT активы', index=False)
-        worksheet = writer.sheets['IT активы']
-        for i, col in enumerate(df.columns):
-            max_len = max(df[col].astype(str).map(len).max(), len(col)) + 2
-            worksheet.set_column(i, i, max_len)
-    
-    output.seek(0)
-    headers = {
-        "Content-Disposition": "attachment; filename=it_assets.xlsx",
-        "Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    }
-    return StreamingResponse(output, headers=headers)
+        stmt = stmt.where(Asset.department == department)
+    stmt = order_by_relevance(stmt, db, search)
+    result = db.execute(stmt.execution_options(yield_per=DB_FETCH_SIZE))
+
+    rows = (
+        (
+            a.name,
+            a.type,
+            a.criticality,
+            a.department or "",
+            a.owner or "",
+            a.status,
+            a.source,
+            a.created_at.strftime("%d.%m.%Y") if a.created_at else ""
+        )
+        for a in result
+    )
+
+    return xlsx_response(
+        rows,
+        ["Название", "Тип", "Критичность", "Подразделение", "Владелец", "Статус", "Источник", "Создан"],
+        sheet_name="IT активы",
+        filename="it_assets.xlsx",
+        cache_key=cache_key
+    )
 
 @router.get("/assets/export/pdf")
-async def export_assets_pdf(department: str = Query("", alias="department"), db: Session = Depends(get_db)):
-    query = db.query(Asset)
+async def export_assets_pdf(
+    department: str = Query("", alias="department"),
+    search: str = "",
+    type: str = "",
+    criticality: str = "",
+    db: AsyncSession = Depends(get_async_db)
+    ):
+    filters = {"department": department, "search": search, "type": type, "criticality": criticality}
+    versions = await db.run_sync(data_versions, [Asset.__tablename__])
+    cache_key = export_cache_key("assets.pdf", filters, "", versions)
+    if cached := cached_export_response(cache_key, ".pdf", PDF_MEDIA_TYPE, "it_assets.pdf"):
+        return cached
+
+    stmt = select(Asset).where(*asset_filter_clauses(db, search, type, criticality))
     if department:
-        query = query.filter(Asset.department == department)
-    assets = query.all()
+        stmt = stmt.where(Asset.department == department)
+    assets = (await db.scalars(order_by_relevance(stmt, db, search))).all()
 
     data = [[
         asset.name,
@@ -285,60 +343,31 @@ async def export_assets_pdf(department: str = Query("", alias="department"), db:
         asset.created_at.strftime("%d.%m.%Y") if asset.created_at else "-"
     ] for asset in assets]
 
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter))
-
-    styles = getSampleStyleSheet()
-    styles['Title'].fontName = 'Arial'
-    styles['Normal'].fontName = 'Arial'
-
-    elements = []
-    title = Paragraph("Отчет по IT активам", styles['Title'])
-    elements.append(title)
-
-    headers = ["Название", "Тип", "Критичность", "Подразделение",
-               "Владелец", "Статус", "Источник", "Создан"]
-    table_data = [headers] + data
-    table = Table(table_data)
-
-    table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Arial'),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-
-    elements.append(table)
-
-    fig, ax = plt.subplots()
+    headings = ["Название", "Тип", "Критичность", "Подразделение",
+                "Владелец", "Статус", "Источник", "Создан"]
     types = [asset.type for asset in assets]
-    ax.hist(types, bins=len(set(types)))
-    ax.set_title("Распределение по типам")
-    img_buffer = BytesIO()
-    plt.savefig(img_buffer, format='png')
-    plt.close()
-    img_buffer.seek(0)
-
-    img = Image(img_buffer, width=500, height=250)
-    elements.append(img)
 
-    doc.build(elements)
-    buffer.seek(0)
+    pdf = await render(render_assets_pdf, headings, data, types)
+    store_export_bytes(cache_key, ".pdf", pdf)
 
     headers = {
         "Content-Disposition": "attachment; filename=it_assets.pdf",
         "Content-Type": "application/pdf"
     }
-    return Response(content=buffer.getvalue(), headers=headers)
+    return Response(content=pdf, headers=headers)
+
+@router.get("/assets/stats")
+def get_assets_stats(
+    search: str = "",
+    type: str = "",
+    criticality: str = "",
+    db: Session = Depends(get_db)
+    ):
+    return get_asset_distributions(db, search, type, criticality)
 
 @router.get("/assets/json")
-async def get_all_assets(db: Session = Depends(get_db)):
-    assets = db.query(Asset).all()
+async def get_all_assets(db: AsyncSession = Depends(get_async_db)):
+    assets = (await db.scalars(select(Asset))).all()
     return [
         {
             "name": asset.name,
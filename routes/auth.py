@@ -1,20 +1,30 @@
 from fastapi import APIRouter, Request, Form, Depends
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from db import SessionLocal
+from db import SessionLocal, get_async_db
 from models.user import User
-from passlib.hash import bcrypt
-from config.sms import send_telegram_code
+from config.sms import telegram_code_message
+from services.ephemeral_store import get_ephemeral_store
+from services.outbox import enqueue_telegram
+from services.password_hashing import hash_password_sync, verify_password
 import pyotp, random, string
-from datetime import datetime, timedelta
+import os
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
-verification_codes = {}
-totp_secrets = {}
-verification_expiry = {}
+# Состояние подтверждения 2FA лежит в общем хранилище с TTL, чтобы код,
+# выданный одним воркером, проверялся любым другим
+VERIFICATION_TTL_SECONDS = int(os.getenv("VERIFICATION_TTL_SECONDS", "300"))
+
+def verification_code_key(email):
+    return f"2fa:code:{email}"
+
+def totp_secret_key(email):
+    return f"2fa:totp:{email}"
 
 def get_db():
     db = SessionLocal()
@@ -27,21 +37,28 @@ def get_db():
 def show_login(request: Request):
     return templates.TemplateResponse("login.html", {"request": request,  "user": User})
 
+# bcrypt считается в отдельном ограниченном пуле (services/password_hashing), а не в общем пуле потоков
 @router.post("/login")
-def login(
+async def login(
     request: Request,
     email: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
     ):
-    user = db.query(User).filter(User.email == email).first()
+    user = await db.scalar(select(User).where(User.email == email))
 
-    if not user or not bcrypt.verify(password, user.password):
+    valid, new_hash = await verify_password(password, user.password) if user else (False, None)
+    if not valid:
         return templates.TemplateResponse(
             "login.html",
             {"request": request, "error": "Неверный логин или пароль"}
         )
 
+    # Хэш со старой стоимостью bcrypt заменяем, пока пароль известен
+    if new_hash:
+        user.password = new_hash
+        await db.commit()
+
     # ❗ Сохраняем только email в сессию
     request.session["user"] = email
 
@@ -64,7 +81,6 @@ def register(
         return templates.TemplateResponse("register.html", {"request": request, "error": "Email уже зарегистрирован"})
 
     code = generate_code()
-    hashed = bcrypt.hash(password)
 
     request.session["pending_email"] = email
     request.session["pending_password"] = password
@@ -77,16 +93,16 @@ def register(
         if not telegram_chat_id:
             return templates.TemplateResponse("register.html", {"request": request, "error": "Введите Telegram chat ID"})
 
-        verification_codes[email] = code
-        verification_expiry[email] = datetime.utcnow() + timedelta(minutes=5)
-        send_telegram_code(telegram_chat_id, code)
+        get_ephemeral_store().set(verification_code_key(email), code, VERIFICATION_TTL_SECONDS)
+        # Доставкой занимается воркер outbox, обработчик только ставит сообщение в очередь
+        enqueue_telegram(db, telegram_chat_id, telegram_code_message(code))
+        db.commit()
         return RedirectResponse(f"/verify/{email}", status_code=303)
 
 
     elif method == "totp":
         secret = pyotp.random_base32()
-        totp_secrets[email] = secret
-        verification_expiry[email] = datetime.utcnow() + timedelta(minutes=5)
+        get_ephemeral_store().set(totp_secret_key(email), secret, VERIFICATION_TTL_SECONDS)
 
         request.session["totp_secret"] = secret
 
@@ -110,8 +126,8 @@ def verify_code(
     code: str = Form(...),
     db: Session = Depends(get_db)
     ):
+    store = get_ephemeral_store()
     print("✅ Получен код из формы:", code)
-    print("🧠 Ожидаемый код из памяти:", verification_codes.get(email))
 
     method = request.session.get("pending_method")
     if not method:
@@ -121,8 +137,10 @@ def verify_code(
             "error": "Метод не найден"
         })
 
-    expires_at = verification_expiry.get(email)
-    if not expires_at or datetime.utcnow() > expires_at:
+    # Ключ исчезает из хранилища по истечении TTL
+    pending_key = totp_secret_key(email) if method == "totp" else verification_code_key(email)
+    expected = store.get(pending_key)
+    if expected is None:
         return templates.TemplateResponse("verify.html", {
             "request": request,
             "email": email,
@@ -139,7 +157,6 @@ def verify_code(
             })
 
     elif method == "telegram":
-        expected = verification_codes.get(email)
         actual = str(code).strip()
         print(" Сравнение:", repr(expected), "vs", repr(actual))
 
@@ -157,7 +174,7 @@ def verify_code(
             "error": "Неизвестный метод 2FA"
         })
 
-    hashed_password = bcrypt.hash(request.session.get("pending_password"))
+    hashed_password = hash_password_sync(request.session.get("pending_password"))
     user = User(
         email=email,
         password=hashed_password,
@@ -171,8 +188,7 @@ def verify_code(
 
     for key in ["pending_email", "pending_password", "pending_method", "pending_chat_id", "totp_secret"]:
         request.session.pop(key, None)
-    verification_codes.pop(email, None)
-    verification_expiry.pop(email, None)
+    store.delete(pending_key)
 
     request.session["user"] = {"username": email}
 
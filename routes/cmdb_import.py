@@ -1,7 +1,12 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from db import get_db
-from models.asset import Asset
+from services.asset_sync import sync_external_assets, deactivate_missing_assets
+from services.glpi_client import GLPIClient, GLPIError
+from services.sync_state import get_sync_state
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import asyncio
 import os
 import httpx
 from dotenv import load_dotenv
@@ -14,76 +19,167 @@ GLPI_URL = os.getenv("GLPI_URL")
 APP_TOKEN = os.getenv("GLPI_APP_TOKEN")
 USER_TOKEN = os.getenv("GLPI_USER_TOKEN")
 
+# Как часто делать полную сверку (она же находит удалённые в GLPI устройства)
+CMDB_FULL_SYNC_HOURS = float(os.getenv("CMDB_FULL_SYNC_HOURS", "24"))
+# Запас назад от водяного знака, чтобы не потерять изменения, сделанные в ту же секунду
+CMDB_WATERMARK_OVERLAP = timedelta(seconds=int(os.getenv("CMDB_WATERMARK_OVERLAP_SECONDS", "60")))
+
 DEVICE_TYPES = {
     "Computer": "Computer",
     "Monitor": "Monitor",
     "Printer": "Printer"
 }
 
-@router.post("/cmdb/import")
-def import_from_glpi(db: Session = Depends(get_db)):
-    if not all([GLPI_URL, APP_TOKEN, USER_TOKEN]):
-        return {"error": "GLPI credentials are not configured in .env"}
-
-    headers = {
-        "App-Token": APP_TOKEN,
-        "Authorization": f"user_token {USER_TOKEN}"
+# Номера полей searchOptions GLPI
+GLPI_FIELD_NAME = "1"
+GLPI_FIELD_ID = "2"
+GLPI_FIELD_DATE_MOD = "19"
+GLPI_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def glpi_search_params(modified_since: datetime = None) -> dict:
+    params = {
+        "forcedisplay[0]": GLPI_FIELD_ID,
+        "forcedisplay[1]": GLPI_FIELD_NAME,
+        "forcedisplay[2]": GLPI_FIELD_DATE_MOD,
     }
-
+    if modified_since:
+        params.update({
+            "criteria[0][field]": GLPI_FIELD_DATE_MOD,
+            "criteria[0][searchtype]": "morethan",
+            "criteria[0][value]": modified_since.strftime(GLPI_DATE_FORMAT),
+        })
+    return params
+
+def parse_glpi_date(value):
     try:
-        with httpx.Client() as client:
-            auth_response = client.get(f"{GLPI_URL}/initSession", headers=headers)
-            if auth_response.status_code != 200:
-                return {"error": "GLPI session init failed", "details": auth_response.text}
-
-            session_token = auth_response.json().get("session_token")
-            if not session_token:
-                return {"error": "No session token returned from GLPI"}
+        return datetime.strptime(value, GLPI_DATE_FORMAT) if value else None
+    except ValueError:
+        return None
+
+def glpi_items_to_assets(items, asset_type):
+    for item in items:
+        if not isinstance(item, dict) or GLPI_FIELD_ID not in item:
+            continue
+
+        asset = {"external_id": str(item[GLPI_FIELD_ID]), "type": asset_type}
+        if GLPI_FIELD_NAME in item:
+            asset["name"] = item[GLPI_FIELD_NAME]
+        yield asset
+
+def glpi_client() -> GLPIClient:
+    return GLPIClient(GLPI_URL, APP_TOKEN, USER_TOKEN)
+
+def load_sync_states(db: Session) -> dict:
+    return {glpi_type: get_sync_state(db, f"glpi:{glpi_type}") for glpi_type in DEVICE_TYPES}
+
+def full_sync_due(state, now: datetime) -> bool:
+    return (
+        state.watermark is None
+        or state.last_full_sync is None
+        or now - state.last_full_sync >= timedelta(hours=CMDB_FULL_SYNC_HOURS)
+    )
+
+async def run_glpi_import(db: Session, client: GLPIClient = None, full: bool = False):
+    if client is None:
+        if not all([GLPI_URL, APP_TOKEN, USER_TOKEN]):
+            return {"error": "GLPI credentials are not configured in .env"}
+        client = glpi_client()
+
+    # Session не потокобезопасна: вся работа с БД идёт в одном выделенном потоке,
+    # а event loop тем временем догружает следующие страницы GLPI
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cmdb-import-db")
+    loop = asyncio.get_running_loop()
+
+    def in_db_thread(fn, *args):
+        return loop.run_in_executor(executor, fn, *args)
 
-            session_headers = {
-                "App-Token": APP_TOKEN,
-                "Session-Token": session_token
-            }
+    try:
+        return await _run_glpi_import(db, client, full, in_db_thread)
+    finally:
+        # Без ожидания: при отмене поток сам завершит текущую страницу
+        executor.shutdown(wait=False)
+
+async def _run_glpi_import(db: Session, client: GLPIClient, full: bool, in_db_thread):
+    started_at = datetime.utcnow()
+    states = await in_db_thread(load_sync_states, db)
+    full_types = {
+        glpi_type for glpi_type, state in states.items()
+        if full or full_sync_due(state, started_at)
+    }
 
-            total_received = 0
-            new_assets = 0
+    requests = {
+        glpi_type: (
+            f"search/{glpi_type}",
+            glpi_search_params(
+                None if glpi_type in full_types else state.watermark - CMDB_WATERMARK_OVERLAP
+            ),
+        )
+        for glpi_type, state in states.items()
+    }
 
-            for glpi_type, asset_type in DEVICE_TYPES.items():
-                response = client.get(f"{GLPI_URL}/{glpi_type}", headers=session_headers)
-                if response.status_code != 200:
-                    continue  
+    total_received = 0
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    seen = {}
+    latest_modified = {}
 
-                items = response.json()
+    try:
+        async with client as glpi:
+            # Каждая страница сразу уходит в upsert, пока следующие страницы догружаются
+            async for glpi_type, items in glpi.iter_pages(requests):
                 total_received += len(items)
+                assets = list(glpi_items_to_assets(items, DEVICE_TYPES[glpi_type]))
 
+                seen.setdefault(glpi_type, set()).update(a["external_id"] for a in assets)
                 for item in items:
-                    if not isinstance(item, dict) or "id" not in item:
-                        continue
-
-                    external_id = str(item["id"])
-                    asset = db.query(Asset).filter_by(external_id=external_id).first()
-                    if asset:
-                        asset.name = item.get("name", asset.name)
-                        asset.type = asset_type
-                    else:
-                        new_asset = Asset(
-                            name=item.get("name", "Unnamed"),
-                            type=asset_type,
-                            criticality="medium",
-                            external_id=external_id,
-                            is_external=True
-                        )
-                        db.add(new_asset)
-                        new_assets += 1
-
-            client.get(f"{GLPI_URL}/killSession", headers=session_headers)
+                    modified = parse_glpi_date(item.get(GLPI_FIELD_DATE_MOD))
+                    if modified and (glpi_type not in latest_modified or modified > latest_modified[glpi_type]):
+                        latest_modified[glpi_type] = modified
 
+                page_counts = await in_db_thread(sync_external_assets, db, assets)
+                for key, value in page_counts.items():
+                    counts[key] += value
+
+    except GLPIError as e:
+        await in_db_thread(db.rollback)
+        return {"error": str(e), "details": e.details}
     except httpx.RequestError as e:
+        await in_db_thread(db.rollback)
         return {"error": "HTTP connection failed", "details": str(e)}
 
-    db.commit()
+    def finish():
+        deactivated = 0
+        for glpi_type, state in states.items():
+            if glpi_type in latest_modified:
+                state.watermark = max(filter(None, [state.watermark, latest_modified[glpi_type]]))
+            # Сверяем только типы, которые GLPI действительно отдал целиком
+            if glpi_type in full_types and glpi_type in seen:
+                deactivated += deactivate_missing_assets(db, DEVICE_TYPES[glpi_type], seen[glpi_type])
+                state.last_full_sync = started_at
+        db.commit()
+        return deactivated
+
+    deactivated = await in_db_thread(finish)
     return {
         "status": "Импорт завершен",
-        "new_assets": new_assets,
+        "full_sync_types": sorted(full_types),
+        "new_assets": counts["inserted"],
+        "updated_assets": counts["updated"],
+        "unchanged_assets": counts["unchanged"],
+        "deactivated_assets": deactivated,
         "total_received": total_received
     }
+
+@router.post("/cmdb/import")
+async def import_from_glpi_endpoint(full: bool = False, db: Session = Depends(get_db)):
+    return await run_glpi_import(db, full=full)
+
+# Синхронная обёртка для фоновых задач, которые выполняются вне event loop
+def import_from_glpi(db: Session, full: bool = False):
+    return asyncio.run(run_glpi_import(db, full=full))
+
+# Задание планировщика: ошибка импорта должна попасть в job_runs как неуспешный запуск
+def cmdb_import_job(db: Session) -> int:
+    result = import_from_glpi(db)
+    if "error" in result:
+        raise GLPIError(result["error"], result.get("details", ""))
+    return result["new_assets"] + result["updated_assets"] + result["deactivated_assets"]
@@ -1,16 +1,21 @@
 from fastapi import APIRouter, Depends, Form, UploadFile, File, Request, FastAPI, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
-from db import get_db
+from db import get_async_db, get_db
 from models.measure import Measure, Notification
-from models.schemas import MeasureOut, RiskTypeOut, NotificationBase, NotificationOut, MeasureCreate, MeasureUpdateSchema
+from models.schemas import MeasureOut, RiskTypeOut, NotificationBase, NotificationOut, NotificationPage, UnreadCountOut, MeasureCreate, MeasureUpdateSchema
 from datetime import date, datetime, timedelta
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import StreamingResponse
 from dependencies.lang import get_lang
 from models.risk_map import RiskListEntry
-import pandas as pd
-from io import BytesIO
+from services.export import DB_FETCH_SIZE, XLSX_MEDIA_TYPE, cached_export_response, xlsx_response
+from services.export_cache import export_cache_key
+from services.data_versions import data_versions
+from services.risk_types import get_risk_type_catalogue
+from services.notification_feed import notification_events, notification_page, unread_count
 
 
 app = FastAPI()
@@ -24,50 +29,41 @@ def measure_page(request: Request,
     db: Session = Depends(get_db),
     lang: str = Depends(get_lang)
     ):
-    user = request.session.get("user")
-    if not user:
-        return RedirectResponse("/login", status_code=303)
+    user = request.state.user
 
-    if isinstance(user, str):
-        user = {"username": user}
-
-    all_risks = db.query(RiskListEntry).all()
-    seen_titles = set()
-    unique_risk_types = []
-    for rt in all_risks:
-        if rt.title not in seen_titles:
-            seen_titles.add(rt.title)
-            unique_risk_types.append(rt)
-
-    measures = db.query(Measure).all()
+    measures = db.execute(measure_rows_query()).all()
 
     return templates.TemplateResponse("measure.html", {
         "request": request,
         "user": user,
-        "risk_types": unique_risk_types,
+        "risk_types": get_risk_type_catalogue(db),
         "measures": measures,  
         "lang": lang 
         })
 app.include_router(router)
 
+# Меры вместе с названием типа риска одним запросом: только нужные колонки, без ленивых загрузок
+def measure_rows_query():
+    return (
+        select(
+            Measure.id,
+            Measure.title,
+            Measure.title_kz,
+            Measure.risk_type_id,
+            RiskListEntry.title.label("risk_type_name"),
+            RiskListEntry.title_kz.label("risk_type_name_kz"),
+            Measure.responsible,
+            Measure.due_date,
+            Measure.description,
+            Measure.status,
+        )
+        .outerjoin(RiskListEntry, Measure.risk_type_id == RiskListEntry.id)
+        .order_by(Measure.id)
+    )
+
 @router.get("/measure/list", response_model=List[MeasureOut])
 def list_measures(db: Session = Depends(get_db)):
-    measures = db.query(Measure).all()
-    return [
-        MeasureOut(
-            id=m.id,
-            title=m.title,
-            title_kz=m.title_kz,
-            risk_type_id=m.risk_type_id,
-            risk_type_name=m.risk_type.title if m.risk_type else None,
-            risk_type_name_kz=m.risk_type.title_kz if m.risk_type_kz else None,
-            responsible=m.responsible,
-            due_date=m.due_date,
-            description=m.description,
-            status=m.status
-        )
-        for m in measures
-    ]
+    return [MeasureOut(**row._mapping) for row in db.execute(measure_rows_query())]
 
 @router.post("/measure/create")
 def create_measure(data: MeasureCreate, db: Session = Depends(get_db)):   
@@ -86,8 +82,8 @@ def create_measure(data: MeasureCreate, db: Session = Depends(get_db)):
     return {"message": "Создано"}
 
 @router.put("/measure/update/{id}")
-async def update_measure(id: int, measure_data: MeasureUpdateSchema, db: Session = Depends(get_db)):
-    measure = db.query(Measure).filter_by(id=id).first()
+async def update_measure(id: int, measure_data: MeasureUpdateSchema, db: AsyncSession = Depends(get_async_db)):
+    measure = await db.get(Measure, id)
     if not measure:
         raise HTTPException(status_code=404, detail="Мера не найдена")
 
@@ -103,12 +99,12 @@ async def update_measure(id: int, measure_data: MeasureUpdateSchema, db: Session
     if measure_data.description is not None:
         measure.description = measure_data.description
 
-    db.commit()
+    await db.commit()
     return {"message": "Мера успешно обновлена"}
     
 @router.get("/risk-types/list", response_model=List[RiskTypeOut])
 def get_risk_types(db: Session = Depends(get_db)):
-    return db.query(RiskType).all()
+    return get_risk_type_catalogue(db)
 
 @router.delete("/measure/delete/{id}")
 def delete_measure(id: int, db: Session = Depends(get_db)):
@@ -129,158 +125,92 @@ def export_measures_excel(
     date_to: Optional[str] = Query(None),
     db: Session = Depends(get_db),
     ):
-    query = db.query(Measure).options(joinedload(Measure.risk_type))
+    filters = {"search": search, "status": status, "risk_type_id": risk_type_id, "date_from": date_from, "date_to": date_to}
+    versions = data_versions(db, [Measure.__tablename__, RiskListEntry.__tablename__])
+    cache_key = export_cache_key("measures.xlsx", filters, "", versions)
+    filename = f"measures_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    if cached := cached_export_response(cache_key, ".xlsx", XLSX_MEDIA_TYPE, filename):
+        return cached
+
+    stmt = (
+        select(
+            Measure.title,
+            Measure.title_kz,
+            RiskListEntry.title.label("risk_type_title"),
+            RiskListEntry.title_kz.label("risk_type_title_kz"),
+            Measure.responsible,
+            Measure.status,
+            Measure.due_date,
+        )
+        .outerjoin(RiskListEntry, Measure.risk_type_id == RiskListEntry.id)
+    )
 
     if search:
         search_lower = f"%{search.lower()}%"
-        query = query.filter(
+        stmt = stmt.where(
             (Measure.title.ilike(search_lower)) |
             (Measure.title_kz.ilike(search_lower)) |
             (Measure.responsible.ilike(search_lower))
         )
     if status:
-        query = query.filter(Measure.status.ilike(status))
+        stmt = stmt.where(Measure.status.ilike(status))
     if risk_type_id:
-        query = query.filter(Measure.risk_type_id == risk_type_id)
+        stmt = stmt.where(Measure.risk_type_id == risk_type_id)
     if date_from:
-        query = query.filter(Measure.due_date >= date_from)
+        stmt = stmt.where(Measure.due_date >= date_from)
     if date_to:
-        query = query.filter(Measure.due_date <= date_to)
-
-    measures = query.all()
-
-    data = [{
-        "Название": m.title,
-        "Название (каз)": m.title_kz,
-        "Тип риска": m.risk_type.title if m.risk_type else "",
-        "Тип риска (каз)": m.risk_type.title_kz if m.risk_type else "",
-        "Ответственный": m.responsible,
-        "Статус": m.status,
-        "Срок": m.due_date.strftime("%Y-%m-%d") if m.due_date else ""
-    } for m in measures]
-
-    df = pd.DataFrame(data)
-
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name="Measures")
+        stmt = stmt.where(Measure.due_date <= date_to)
+
+    result = db.execute(stmt.execution_options(yield_per=DB_FETCH_SIZE))
+
+    rows = (
+        (
+            m.title,
+            m.title_kz,
+            m.risk_type_title or "",
+            m.risk_type_title_kz or "",
+            m.responsible,
+            m.status,
+            m.due_date.strftime("%Y-%m-%d") if m.due_date else ""
+        )
+        for m in result
+    )
 
-    output.seek(0)
-    filename = f"measures_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )    
+    return xlsx_response(
+        rows,
+        ["Название", "Название (каз)", "Тип риска", "Тип риска (каз)", "Ответственный", "Статус", "Срок"],
+        sheet_name="Measures",
+        filename=filename,
+        cache_key=cache_key
+    )
 
-@router.get("/measure/notifications", response_model=List[NotificationOut])
+@router.get("/measure/notifications", response_model=NotificationPage)
 def get_notifications(
     db: Session = Depends(get_db),
-    lang: str = Query("ru", regex="^(ru|kz)$")
+    lang: str = Query("ru", regex="^(ru|kz)$"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100)
     ):
-    current_date = datetime.utcnow().date()
-    seven_days_ago = current_date - timedelta(days=7)
-    three_days_later = current_date + timedelta(days=3)
-
-    all_notifications = db.query(Notification).order_by(Notification.created_at.desc()).all()
-
-    def to_output(notification: Notification):
-        return {
-            "id": notification.id,
-            "type": notification.type,
-            "measure_id": notification.measure_id,
-            "title": {"ru": notification.title_ru, "kz": notification.title_kz},
-            "message": {"ru": notification.message_ru, "kz": notification.message_kz},
-            "created_at": notification.created_at,
-            "read": notification.read
-        }
-
-    return [to_output(n) for n in all_notifications]
-
-
-    new_notifications = []
-
-    overdue_measures = db.query(Measure).filter(
-        Measure.due_date < current_date,
-        ~Measure.status.in_(["завершена", "completed", "аяқталған"])
-    ).all()
-    for measure in overdue_measures:
-        new_notifications.append(Notification(
-            type="overdue",
-            measure_id=measure.id,
-            title_ru="Просроченная мера",
-            title_kz="Кешіктірілген шара",
-            message_ru=f'Мера "{measure.title}" просрочена (до {measure.due_date})',
-            message_kz=f'"{measure.title_kz or measure.title}" шарасы кешіктірілді ({measure.due_date} дейін)',
-            read=False
-        ))
-
-    upcoming_measures = db.query(Measure).filter(
-        Measure.due_date >= current_date,
-        Measure.due_date <= three_days_later,
-        ~Measure.status.in_(["завершена", "completed", "аяқталған"])
-    ).all()
-    for measure in upcoming_measures:
-        days_left = (measure.due_date - current_date).days
-        new_notifications.append(Notification(
-            type="upcoming",
-            measure_id=measure.id,
-            title_ru="Приближается срок",
-            title_kz="Мерзім жақындап жатыр",
-            message_ru=f'Мера "{measure.title}" истекает через {days_left} {get_day_word(days_left, "ru")} (до {measure.due_date})',
-            message_kz=f'"{measure.title_kz or measure.title}" шарасы {days_left} {get_day_word(days_left, "kz")} ішінде аяқталуы керек ({measure.due_date} дейін)',
-            read=False
-        ))
-
-    new_measures_count = db.query(Measure).filter(
-        Measure.created_at >= seven_days_ago
-    ).count()
-    if new_measures_count > 0:
-        new_notifications.append(Notification(
-            type="new",
-            measure_id=None,
-            title_ru="Новые меры",
-            title_kz="Жаңа шаралар",
-            message_ru=f"За последние 7 дней добавлено {new_measures_count} новых мер",
-            message_kz=f"Соңғы 7 күнде {new_measures_count} жаңа шара қосылды",
-            read=False
-        ))
-
-    no_responsible_measures = db.query(Measure).filter(
-        Measure.responsible == None
-    ).all()
-    for measure in no_responsible_measures:
-        new_notifications.append(Notification(
-            type="no_responsible",
-            measure_id=measure.id,
-            title_ru="Нет ответственного",
-            title_kz="Жауапты жоқ",
-            message_ru=f'Мера "{measure.title}" не имеет назначенного ответственного',
-            message_kz=f'"{measure.title_kz or measure.title}" шарасына жауапты тағайындалмаған',
-            read=False
-        ))
-
-    stale_measures = db.query(Measure).filter(
-        Measure.status.in_(["новая", "new", "жаңа"]),
-        Measure.created_at <= seven_days_ago
-    ).all()
-    for measure in stale_measures:
-        days_in_status = (current_date - measure.created_at.date()).days
-        new_notifications.append(Notification(
-            type="stale",
-            measure_id=measure.id,
-            title_ru="Долго в статусе 'Новая'",
-            title_kz="'Жаңа' статусында ұзақ уақыт",
-            message_ru=f'Мера "{measure.title}" уже {days_in_status} дней в статусе "Новая"',
-            message_kz=f'"{measure.title_kz or measure.title}" шарасы "Жаңа" статусында {days_in_status} күн болды',
-            read=False
-        ))
-
-    for n in new_notifications:
-        db.add(n)
-    db.commit()
-
-    return [to_output(n) for n in new_notifications]
+    try:
+        items, next_cursor = notification_page(db, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/measure/notifications/unread-count", response_model=UnreadCountOut)
+def get_unread_notifications_count(db: Session = Depends(get_db)):
+    return {"unread": unread_count(db)}
+
+@router.get("/measure/notifications/stream")
+async def stream_notifications(request: Request):
+    # После переподключения EventSource присылает id последнего полученного события
+    last_event_id = request.headers.get("last-event-id")
+    after_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    return StreamingResponse(
+        notification_events(request, after_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.post("/measure/notifications/{notification_id}/read")
 def mark_notification_as_read(notification_id: int, db: Session = Depends(get_db)):
@@ -299,17 +229,3 @@ def mark_all_notifications_as_read(db: Session = Depends(get_db)):
     db.commit()
     
     return {"message": "Все уведомления помечены как прочитанные"}
-
-def get_day_word(n, lang):
-    if lang == "ru":
-        if 11 <= n % 100 <= 14:
-            return "дней"
-        elif n % 10 == 1:
-            return "день"
-        elif 2 <= n % 10 <= 4:
-            return "дня"
-        else:
-            return "дней"
-    elif lang == "kz":
-        return "күн"  
-    return "дней"
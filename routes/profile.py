@@ -14,22 +14,19 @@ def get_db():
     finally:
         db.close()
 
+# Профиль берётся из request.state.user, который AuthMiddleware получает из кэша пользователей
 @profile_router.get("/profile/data")
-def get_profile_data(request: Request, db: Session = Depends(get_db)):
-    email = request.session.get("user")
-    if not email:
-        return JSONResponse(status_code=401, content={"error": "Не авторизован"})
-
-    user = db.query(User).filter(User.email == email).first()
+def get_profile_data(request: Request):
+    user = request.state.user
     if not user:
-        return JSONResponse(status_code=404, content={"error": "Пользователь не найден"})
+        return JSONResponse(status_code=401, content={"error": "Не авторизован"})
 
     return JSONResponse(status_code=200, content={
-        "email": user.email,
-        "full_name": user.full_name,
-        "phone": user.phone,
-        "position": user.position,
-        "created_at": str(user.created_at) if user.created_at else None
+        "email": user["email"],
+        "full_name": user["full_name"],
+        "phone": user["phone"],
+        "position": user["position"],
+        "created_at": user["created_at"]
     })
 
 @profile_router.post("/profile/update")
@@ -40,17 +37,17 @@ def update_profile(
     position: str = Form(...),
     db: Session = Depends(get_db)
     ):
-    email = request.session.get("user")
-    if not email:
+    identity = request.state.user
+    if not identity:
         return JSONResponse(status_code=401, content={"error": "Неавторизован"})
 
-    user = db.query(User).filter(User.email == email).first()
+    user = db.get(User, identity["id"])
     if not user:
         return JSONResponse(status_code=404, content={"error": "Пользователь не найден"})
 
     user.full_name = full_name
     user.phone = phone
     user.position = position
+    # commit в users сбрасывает кэш пользователей (services/user_cache)
     db.commit()
-    db.refresh(user)
-    return JSONResponse(status_code=200, content={"message": "Профиль обновлён"})
\ No newline at end of file
+    return JSONResponse(status_code=200, content={"message": "Профиль обновлён"})
@@ -1,52 +1,44 @@
 from fastapi import APIRouter, Request, Form, Depends
-from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, RedirectResponse, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
 from datetime import datetime
-import pandas as pd
-import io
-from reportlab.pdfgen import canvas
-from db import get_db
+from db import get_async_db, get_db
 from models.asset import Asset
 from models.risk_assessment import RiskAssessment, ThreatLibrary
 from fastapi.templating import Jinja2Templates
 from dependencies.lang import get_lang
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.units import cm
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase import pdfmetrics
+from services.export import DB_FETCH_SIZE, PDF_MEDIA_TYPE, XLSX_MEDIA_TYPE, cached_export_response, xlsx_response
+from services.export_cache import export_cache_key, store_export_bytes
+from services.data_versions import data_versions
+from services.pdf_reports import render_risk_assessments_pdf
+from services.render_pool import render
+from services.threat_import import import_threats
 from pytz import timezone
 from pathlib import Path
 import os
-import json
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
-pdfmetrics.registerFont(TTFont('Arial', 'C:/Windows/Fonts/arial.ttf')) 
 KZ_TIMEZONE = timezone("Asia/Almaty")  
+THREAT_LIBRARY_FILE = os.getenv("THREAT_LIBRARY_FILE", "enterprise-attack_translated.json")
 
 
 @router.get("/risk-assessment", response_class=HTMLResponse)
 async def risk_assessment_page(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     lang: str = Depends(get_lang)
     ):
-    user = request.session.get("user")
-    if not user:
-        return RedirectResponse("/login", status_code=303)
+    user = request.state.user
 
-    if isinstance(user, str):
-        user = {"username": user}
-
-    assets = db.query(Asset).all()
+    assets = (await db.scalars(select(Asset))).all()
     methods = ["ISO/IEC 27005", "NIST SP 800-30", "OCTAVE"]
     
-    threats = db.query(ThreatLibrary).all()
+    threats = (await db.scalars(select(ThreatLibrary))).all()
 
     return templates.TemplateResponse(
         "risk_assessment.html",
@@ -68,7 +60,7 @@ async def calculate_risk(
     vulnerability: str = Form(...),
     likelihood: int = Form(...),
     impact: int = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
     ):
     score = likelihood * impact
     
@@ -102,8 +94,7 @@ async def calculate_risk(
     )
     
     db.add(assessment)
-    db.commit()
-    db.refresh(assessment)
+    await db.commit()
 
     return {
         "score": score,
@@ -131,155 +122,112 @@ def risk_history(request: Request, lang: str = "ru", db: Session = Depends(get_d
     })
 
 @router.get("/risk-assessment/export/excel")
-async def export_excel(db: Session = Depends(get_db)):
-    assessments = (
-        db.query(RiskAssessment)
-        .options(joinedload(RiskAssessment.asset))
+def export_excel(db: Session = Depends(get_db)):
+    cache_key = export_cache_key("risk_assessments.xlsx", {}, "", data_versions(db, [RiskAssessment.__tablename__, Asset.__tablename__]))
+    if cached := cached_export_response(cache_key, ".xlsx", XLSX_MEDIA_TYPE, "risk_history.xlsx"):
+        return cached
+
+    result = db.execute(
+        select(
+            RiskAssessment.id,
+            RiskAssessment.method,
+            Asset.name.label("asset_name"),
+            RiskAssessment.threat,
+            RiskAssessment.vulnerability,
+            RiskAssessment.likelihood,
+            RiskAssessment.impact,
+            RiskAssessment.score,
+            RiskAssessment.level,
+            RiskAssessment.created_at,
+        )
+        .join(Asset, RiskAssessment.asset_id == Asset.id)
         .order_by(RiskAssessment.created_at.desc())
-        .all()
+        .execution_options(yield_per=DB_FETCH_SIZE)
     )
 
-    data = [
-        {
-            "ID": a.id,
-            "Method": a.method,
-            "Asset": a.asset.name,
-            "Threat": a.threat,
-            "Vulnerability": a.vulnerability,
-            "Likelihood": a.likelihood,
-            "Impact": a.impact,
-            "Score": a.score,
-            "Level": a.level,
-            "Date": a.created_at.strftime("%Y-%m-%d %H:%M")
-        } for a in assessments
-    ]
-
-    df = pd.DataFrame(data)
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, sheet_name='Risk History', index=False)
+    rows = (
+        (
+            a.id,
+            a.method,
+            a.asset_name,
+            a.threat,
+            a.vulnerability,
+            a.likelihood,
+            a.impact,
+            a.score,
+            a.level,
+            a.created_at.strftime("%Y-%m-%d %H:%M")
+        ) for a in result
+    )
 
-    output.seek(0)
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=risk_history.xlsx"}
+    return xlsx_response(
+        rows,
+        ["ID", "Method", "Asset", "Threat", "Vulnerability", "Likelihood", "Impact", "Score", "Level", "Date"],
+        sheet_name="Risk History",
+        filename="risk_history.xlsx",
+        cache_key=cache_key
     )
 
 @router.get("/risk-assessment/export/pdf")
-async def export_pdf(lang: str = "ru", db: Session = Depends(get_db)):
-    assessments = db.query(RiskAssessment).options(joinedload(RiskAssessment.asset)).all()
-
-    output = io.BytesIO()
-    doc = SimpleDocTemplate(output, pagesize=landscape(A4), leftMargin=20, rightMargin=20, topMargin=20, bottomMargin=20)
+async def export_pdf(lang: str = "ru", db: AsyncSession = Depends(get_async_db)):
+    versions = await db.run_sync(data_versions, [RiskAssessment.__tablename__, Asset.__tablename__])
+    cache_key = export_cache_key("risk_assessments.pdf", {}, lang, versions)
+    filename = f"risk_assessments_{lang}.pdf"
+    if cached := cached_export_response(cache_key, ".pdf", PDF_MEDIA_TYPE, filename):
+        return cached
 
-    style = ParagraphStyle(
-        name='Normal',
-        fontName='Arial',
-        fontSize=8,
-        leading=10
-    )
+    assessments = (await db.scalars(select(RiskAssessment).options(joinedload(RiskAssessment.asset)))).all()
 
     headings = {
         "ru": ["ID", "Метод", "Актив", "Угроза", "Уязвимость", "Вероятность", "Воздействие", "Баллы", "Уровень", "Дата"],
         "kz": ["ID", "Әдіс", "Актив", "Қауіп", "Әлсіздік", "Ықтималдық", "Әсер ету", "Ұпай", "Деңгейі", "Күні"]
     }
 
-    data = [headings.get(lang, headings["ru"])]
-    for a in assessments:
-        row = [
+    rows = [
+        [
             a.id,
             a.method,
-            Paragraph(a.asset.name, style),
-            Paragraph(a.threat, style),
-            Paragraph(a.vulnerability, style),
+            a.asset.name,
+            a.threat,
+            a.vulnerability,
             a.likelihood,
             a.impact,
             a.score,
             {"Низкий": "Төмен", "Средний": "Орташа", "Высокий": "Жоғары", "Критический": "Сындарлы"}.get(a.level, a.level) if lang == "kz" else a.level,
             a.created_at.strftime('%Y-%m-%d %H:%M')
         ]
-        data.append(row)
-
-    col_widths = [25, 60, 80, 100, 100, 60, 60, 40, 60, 75]
-
-    table = Table(data, colWidths=col_widths, repeatRows=1)
-    table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Arial'),
-        ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('GRID', (0, 0), (-1, -1), 0.3, colors.grey),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-    ]))
+        for a in assessments
+    ]
 
-    doc.build([table])
-    output.seek(0)
+    pdf = await render(render_risk_assessments_pdf, headings.get(lang, headings["ru"]), rows)
+    store_export_bytes(cache_key, ".pdf", pdf)
 
-    return StreamingResponse(output, media_type="application/pdf", headers={
-        "Content-Disposition": f"attachment; filename=risk_assessments_{lang}.pdf"
+    return Response(content=pdf, media_type=PDF_MEDIA_TYPE, headers={
+        "Content-Disposition": f"attachment; filename={filename}"
     })
 
 @router.post("/threats/import")
-async def import_threats_from_local_json(
+def import_threats_from_local_json(
     request: Request,
+    update: bool = False,
     db: Session = Depends(get_db)
     ):
-    BASE_DIR = Path(os.getcwd())
-    file_path = BASE_DIR / "enterprise-attack_translated.json"
-    print("📂 BASE_DIR:", BASE_DIR)
-    print("📄 Ожидаемый путь файла:", file_path)
-    print("✅ Файл существует?", file_path.exists())
+    file_path = Path(os.getcwd()) / THREAT_LIBRARY_FILE
 
     if not file_path.exists():
-        return {"error": "Файл enterprise-attack_translated.json не найден"}
+        return {"error": f"Файл {THREAT_LIBRARY_FILE} не найден"}
 
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            threats = json.load(f)
-
-        imported = 0
-
-        for threat in threats:
-            name = threat.get("name")
-            name_ru = threat.get("name_ru", name)
-            name_kz = threat.get("name_kz", name)
-            description = threat.get("description")
-            description_ru = threat.get("description_ru", description)
-            description_kz = threat.get("description_kz", description)
-            external_refs = threat.get("external_references", [])
-            mitre_id = ""
-
-            for ref in external_refs:
-                if ref.get("source_name") == "mitre-attack":
-                    mitre_id = ref.get("external_id", "")
-                    break
-
-
-            if not name or not mitre_id:
-                continue
-
-            exists = db.query(ThreatLibrary).filter(ThreatLibrary.name == name).first()
-            if exists:
-                continue
-
-            new_threat = ThreatLibrary(
-                name=name,
-                name_ru=name_ru,
-                name_kz=name_kz,
-                description=description,
-                description_ru=description_ru,
-                description_kz=description_kz,
-                category="MITRE ATT&CK",
-                severity="medium",
-                common_controls=[]
-            )
-            db.add(new_threat)
-            imported += 1
-
+        with open(file_path, "rb") as f:
+            counts = import_threats(db, f, update=update)
         db.commit()
-        print(f"✅ Импортировано {imported} угроз.")
-        return RedirectResponse(url="/risk-assessment", status_code=303)
-
     except Exception as e:
-        return {"error": "Импорт из attack_patterns_slim_translated.json не удался", "details": str(e)}
+        db.rollback()
+        logger.exception("Импорт угроз из %s не удался", file_path)
+        return {"error": f"Импорт из {THREAT_LIBRARY_FILE} не удался", "details": str(e)}
+
+    logger.info("Импорт угроз: %s", counts)
+    # Форма на странице оценки ждёт редирект, API-клиенты получают счётчики
+    if "application/json" in request.headers.get("accept", ""):
+        return counts
+    return RedirectResponse(url="/risk-assessment", status_code=303)
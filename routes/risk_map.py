@@ -1,23 +1,25 @@
-from fastapi import FastAPI, Request, APIRouter, Depends, Query
+from fastapi import FastAPI, Request, APIRouter, Depends, Query, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, RedirectResponse, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
-from reportlab.pdfbase import pdfmetrics
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.lib import colors
-import pandas as pd
-from reportlab.pdfbase.ttfonts import TTFont
-import io
-from reportlab.pdfgen import canvas
-from db import get_db
+from db import get_async_db, get_db
 from models.risk_map import RiskListEntry
 from models.schemas import RiskListEntryOut, RiskCreateSchema, RiskUpdateSchema  
-from typing import List
+from typing import List, Optional
 from dependencies.lang import get_lang
+from services.export import DB_FETCH_SIZE, PDF_MEDIA_TYPE, XLSX_MEDIA_TYPE, cached_export_response, xlsx_response
+from services.export_cache import export_cache_key, store_export_bytes
+from services.data_versions import data_versions
+from services.pagination import keyset_page
+from services.pdf_reports import render_risk_map_pdf
+from services.render_pool import render
+from services.risk_map_filters import (
+    DEPARTMENT_MAP, STATUS_MAP, PRIORITY_MAP,
+    compile_export_filters, date_range_clauses, folded, localize_label
+)
 
 
 app = FastAPI()
@@ -25,22 +27,16 @@ app = FastAPI()
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
 templates = Jinja2Templates(directory="templates")
-pdfmetrics.registerFont(TTFont('Arial', 'C:/Windows/Fonts/arial.ttf')) 
 router = APIRouter()
 
 @router.get("/risk_map", response_class=HTMLResponse)
 async def risk_map(request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     lang: str = Depends(get_lang)
     ):
-    user = request.session.get("user")
-    if not user:
-        return RedirectResponse("/login", status_code=303)
-
-    if isinstance(user, str):
-        user = {"username": user}
+    user = request.state.user
             
-    risks = db.query(RiskListEntry).all()
+    risks = (await db.scalars(select(RiskListEntry))).all()
     return templates.TemplateResponse("risk_map.html", {
         "request": request,
         "user": user,
@@ -50,22 +46,65 @@ async def risk_map(request: Request,
 
 app.include_router(router)
 
+RISK_LIST_SORT_COLUMNS = {
+    "created_at": RiskListEntry.created_at,
+    "title": RiskListEntry.title,
+    "priority": RiskListEntry.priority,
+    "status": RiskListEntry.status,
+    "likelihood": RiskListEntry.likelihood,
+    "impact": RiskListEntry.impact,
+}
+
 @router.get("/api/risk-list")
 async def get_risk_list(
     lang: str = Query("ru", enum=["ru", "kz"]),
-    status: str = Query(None),
-    department: str = Query(None),
-    db: Session = Depends(get_db)
+    type: str = Query(""),
+    status: str = Query(""),
+    priority: str = Query(""),
+    department: str = Query(""),
+    dateFrom: str = Query(""),
+    dateTo: str = Query(""),
+    sort: str = Query("-created_at"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db)
     ):
-    query = db.query(RiskListEntry)
-
-    if status:
-        query = query.filter(RiskListEntry.status == status)
-
-    if department:
-        query = query.filter(RiskListEntry.department == department)
-
-    risks = query.order_by(RiskListEntry.created_at.desc()).all()
+    title_column = RiskListEntry.title_kz if lang == "kz" else RiskListEntry.title
+    filters = []
+
+    # Регистр складывается через lower() и в Postgres, и в SQLite (db.use_unicode_lower)
+    if type:
+        filters.append(func.lower(title_column).contains(type.strip().lower(), autoescape=True))
+    for column, value in (
+        (RiskListEntry.status, status),
+        (RiskListEntry.priority, priority),
+        (RiskListEntry.department, department),
+    ):
+        if value:
+            filters.append(folded(column) == value.strip().lower())
+
+    try:
+        filters.extend(date_range_clauses(RiskListEntry.created_at, dateFrom, dateTo))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    descending = sort.startswith("-")
+    sort_column = RISK_LIST_SORT_COLUMNS.get(sort.lstrip("-"))
+    if sort_column is None:
+        raise HTTPException(status_code=422, detail=f"Неизвестное поле сортировки: {sort}")
+
+    try:
+        risks, next_cursor = await db.run_sync(
+            keyset_page,
+            select(RiskListEntry).where(*filters),
+            sort_column,
+            RiskListEntry.id,
+            cursor=cursor,
+            limit=limit,
+            descending=descending,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
     def localize(risk):
         return {
@@ -80,7 +119,25 @@ async def get_risk_list(
             "created_at": risk.created_at,
         }
 
-    return [localize(r) for r in risks]
+    response = {
+        "items": [localize(r) for r in risks],
+        "next_cursor": next_cursor,
+    }
+
+    # Матрица строится по всей выборке, а не по странице, поэтому считаем её агрегатом
+    # и только для первой страницы.
+    if not cursor:
+        matrix = (await db.execute(
+            select(RiskListEntry.likelihood, RiskListEntry.impact, func.count())
+            .where(*filters)
+            .group_by(RiskListEntry.likelihood, RiskListEntry.impact)
+        )).all()
+        response["matrix"] = [
+            {"likelihood": likelihood, "impact": impact, "count": count}
+            for likelihood, impact, count in matrix
+        ]
+
+    return response
 
 
 @router.post("/api/risk-list")
@@ -146,8 +203,20 @@ def update_risk(risk_id: int, updated: RiskUpdateSchema, db: Session = Depends(g
 
     return {"id": risk.id}
 
+def export_risks_query(lang, type, department, status, priority, date_from, date_to):
+    try:
+        filters = compile_export_filters(lang, type, department, status, priority, date_from, date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    return (
+        select(RiskListEntry)
+        .where(*filters)
+        .order_by(RiskListEntry.created_at.desc())
+    )
+
 @router.get("/risk_map/export/excel")
-async def export_risk_map_excel(
+def export_risk_map_excel(
     lang: str = "ru",
     type: str = "",
     department: str = "",
@@ -157,138 +226,38 @@ async def export_risk_map_excel(
     dateTo: str = "",
     db: Session = Depends(get_db)
     ):
-    risks = db.query(RiskListEntry).order_by(RiskListEntry.created_at.desc()).all()
-
-    headers = {
-        "ru": {
-            "department": "Подразделение",
-            "title": "Название",
-            "likelihood": "Вероятность",
-            "impact": "Влияние",
-            "priority": "Приоритет",
-            "status": "Статус",
-            "date": "Дата",
-        },
-        "kz": {
-            "department": "Бөлімше",
-            "title": "Атауы",
-            "likelihood": "Ықтималдық",
-            "impact": "Әсері",
-            "priority": "Басымдық",
-            "status": "Статус",
-            "date": "Күні",
-        }
-    }
+    filters = {"type": type, "department": department, "status": status, "priority": priority, "dateFrom": dateFrom, "dateTo": dateTo}
+    cache_key = export_cache_key("risk_map.xlsx", filters, lang, data_versions(db, [RiskListEntry.__tablename__]))
+    if cached := cached_export_response(cache_key, ".xlsx", XLSX_MEDIA_TYPE, "risk_map_export.xlsx"):
+        return cached
 
-    department_map = {
-        'it отдел': {'ru': 'IT отдел', 'kz': 'IT бөлімі'},
-        'it бөлімі': {'ru': 'IT отдел', 'kz': 'IT бөлімі'},
-        'бухгалтерия': {'ru': 'Бухгалтерия', 'kz': 'Бухгалтерия'},
-        'отдел продаж': {'ru': 'Отдел продаж', 'kz': 'Сату бөлімі'},
-        'сату бөлімі': {'ru': 'Отдел продаж', 'kz': 'Сату бөлімі'},
-        'финансовый отдел': {'ru': 'Финансовый отдел', 'kz': 'Қаржы бөлімі'},
-        'қаржы бөлімі': {'ru': 'Финансовый отдел', 'kz': 'Қаржы бөлімі'},
-        'администрация': {'ru': 'Администрация', 'kz': 'Әкімшілік'},
-        'әкімшілік': {'ru': 'Администрация', 'kz': 'Әкімшілік'},
-        'служба поддержка': {'ru': 'Служба поддержка', 'kz': 'Қолдау қызметі'},
-        'қолдау қызметі': {'ru': 'Служба поддержка', 'kz': 'Қолдау қызметі'},
-    }
+    stmt = export_risks_query(lang, type, department, status, priority, dateFrom, dateTo)
+    risks = db.scalars(stmt.execution_options(yield_per=DB_FETCH_SIZE))
 
-    status_map = {
-        'новый': {'ru': 'Новый', 'kz': 'Жаңа'},
-        'жаңа': {'ru': 'Новый', 'kz': 'Жаңа'},
-        'в работе': {'ru': 'В работе', 'kz': 'Жұмыс барысында'},
-        'жұмыс барысында': {'ru': 'В работе', 'kz': 'Жұмыс барысында'},
-        'снижен': {'ru': 'Снижен', 'kz': 'Азайтылған'},
-        'азайтылған': {'ru': 'Снижен', 'kz': 'Азайтылған'},
-        'закрыт': {'ru': 'Закрыт', 'kz': 'Жабық'},
-        'жабық': {'ru': 'Закрыт', 'kz': 'Жабық'},
-    }
-
-    priority_map = {
-        'низкий': {'ru': 'Низкий', 'kz': 'Төмен'},
-        'төмен': {'ru': 'Низкий', 'kz': 'Төмен'},
-        'средний': {'ru': 'Средний', 'kz': 'Орташа'},
-        'орташа': {'ru': 'Средний', 'kz': 'Орташа'},
-        'высокий': {'ru': 'Высокий', 'kz': 'Жоғары'},
-        'жоғары': {'ru': 'Высокий', 'kz': 'Жоғары'},
-        'критический': {'ru': 'Критический', 'kz': 'Шұғыл'},
-        'шұғыл': {'ru': 'Критический', 'kz': 'Шұғыл'},
+    headings = {
+        "ru": ["ID", "Подразделение", "Название", "Вероятность", "Влияние", "Приоритет", "Статус", "Дата"],
+        "kz": ["ID", "Бөлімше", "Атауы", "Ықтималдық", "Әсері", "Басымдық", "Статус", "Күні"]
     }
 
-    def match(risk):
-        title_check = (risk.title_kz or risk.title or '').lower()
-        if type and type not in title_check:
-            return False
-
-        dept_key = (risk.department or '').strip().lower()
-        if department:
-            for key, val in department_map.items():
-                if key == dept_key:
-                    if department.lower() != val.get(lang, '').lower():
-                        return False
-                    break
-            else:
-                return False
-
-        status_key = (risk.status or '').strip().lower()
-        if status:
-            for key, val in status_map.items():
-                if key == status_key:
-                    if status.lower() != val.get(lang, '').lower():
-                        return False
-                    break
-            else:
-                return False
-
-        priority_key = (risk.priority or '').strip().lower()
-        if priority:
-            for key, val in priority_map.items():
-                if key == priority_key:
-                    if priority.lower() != val.get(lang, '').lower():
-                        return False
-                    break
-            else:
-                return False
-
-        if dateFrom and risk.created_at.strftime('%Y-%m-%d') < dateFrom:
-            return False
-        if dateTo and risk.created_at.strftime('%Y-%m-%d') > dateTo:
-            return False
-
-        return True
-
-    filtered_risks = list(filter(match, risks))
-    export_data = filtered_risks if any([type, department, status, priority, dateFrom, dateTo]) else risks
-
-    data = []
-    for risk in export_data:
-        priority_key = (risk.priority or '').strip().lower()
-        status_key = (risk.status or '').strip().lower()
-        dept_key = (risk.department or '').strip().lower()
-
-        row = {
-            "ID": f"RISK-{risk.id:03d}",
-            headers[lang]["department"]: department_map.get(dept_key, {}).get(lang, risk.department),
-            headers[lang]["title"]: risk.title if lang == "ru" else risk.title_kz,
-            headers[lang]["likelihood"]: risk.likelihood,
-            headers[lang]["impact"]: risk.impact,
-            headers[lang]["priority"]: priority_map.get(priority_key, {}).get(lang, risk.priority),
-            headers[lang]["status"]: status_map.get(status_key, {}).get(lang, risk.status),
-            headers[lang]["date"]: risk.created_at.strftime("%Y-%m-%d %H:%M"),
-        }
-        data.append(row)
-
-    df = pd.DataFrame(data)
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, sheet_name='Risk Map', index=False)
-    output.seek(0)
-
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=risk_map_export.xlsx"}
+    def rows():
+        for risk in risks:
+            yield [
+                f"RISK-{risk.id:03d}",
+                localize_label(DEPARTMENT_MAP, risk.department, lang),
+                risk.title if lang == "ru" else risk.title_kz,
+                risk.likelihood,
+                risk.impact,
+                localize_label(PRIORITY_MAP, risk.priority, lang),
+                localize_label(STATUS_MAP, risk.status, lang),
+                risk.created_at.strftime("%Y-%m-%d %H:%M"),
+            ]
+
+    return xlsx_response(
+        rows(),
+        headings[lang],
+        sheet_name="Risk Map",
+        filename="risk_map_export.xlsx",
+        cache_key=cache_key
     )
 
 @router.get("/risk_map/export/pdf")
@@ -300,151 +269,53 @@ async def export_risk_map_pdf(
     priority: str = "",
     dateFrom: str = "",
     dateTo: str = "",
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
     ):
-    risks = db.query(RiskListEntry).order_by(RiskListEntry.created_at.desc()).all()
+    filters = {"type": type, "department": department, "status": status, "priority": priority, "dateFrom": dateFrom, "dateTo": dateTo}
+    versions = await db.run_sync(data_versions, [RiskListEntry.__tablename__])
+    cache_key = export_cache_key("risk_map.pdf", filters, lang, versions)
+    filename = f"risk_map_{lang}.pdf"
+    if cached := cached_export_response(cache_key, ".pdf", PDF_MEDIA_TYPE, filename):
+        return cached
+
+    stmt = export_risks_query(lang, type, department, status, priority, dateFrom, dateTo)
+    risks = (await db.scalars(stmt)).all()
 
     headings = {
         "ru": ["ID", "Подразделение", "Название", "Вероятность", "Влияние", "Приоритет", "Статус", "Дата"],
         "kz": ["ID", "Бөлімше", "Атауы", "Ықтималдық", "Әсері", "Басымдық", "Статус", "Күні"]
     }
 
-    department_map = {
-        'it отдел': {'ru': 'IT отдел', 'kz': 'IT бөлімі'},
-        'it бөлімі': {'ru': 'IT отдел', 'kz': 'IT бөлімі'},
-        'бухгалтерия': {'ru': 'Бухгалтерия', 'kz': 'Бухгалтерия'},
-        'отдел продаж': {'ru': 'Отдел продаж', 'kz': 'Сату бөлімі'},
-        'сату бөлімі': {'ru': 'Отдел продаж', 'kz': 'Сату бөлімі'},
-        'финансовый отдел': {'ru': 'Финансовый отдел', 'kz': 'Қаржы бөлімі'},
-        'қаржы бөлімі': {'ru': 'Финансовый отдел', 'kz': 'Қаржы бөлімі'},
-        'администрация': {'ru': 'Администрация', 'kz': 'Әкімшілік'},
-        'әкімшілік': {'ru': 'Администрация', 'kz': 'Әкімшілік'},
-        'служба поддержка': {'ru': 'Служба поддержка', 'kz': 'Қолдау қызметі'},
-        'қолдау қызметі': {'ru': 'Служба поддержка', 'kz': 'Қолдау қызметі'},
-    }
-
-    status_map = {
-        'новый': {'ru': 'Новый', 'kz': 'Жаңа'},
-        'жаңа': {'ru': 'Новый', 'kz': 'Жаңа'},
-        'в работе': {'ru': 'В работе', 'kz': 'Жұмыс барысында'},
-        'жұмыс барысында': {'ru': 'В работе', 'kz': 'Жұмыс барысында'},
-        'снижен': {'ru': 'Снижен', 'kz': 'Азайтылған'},
-        'азайтылған': {'ru': 'Снижен', 'kz': 'Азайтылған'},
-        'закрыт': {'ru': 'Закрыт', 'kz': 'Жабық'},
-        'жабық': {'ru': 'Закрыт', 'kz': 'Жабық'},
-    }
-
-    priority_map = {
-        'низкий': {'ru': 'Низкий', 'kz': 'Төмен'},
-        'төмен': {'ru': 'Низкий', 'kz': 'Төмен'},
-        'средний': {'ru': 'Средний', 'kz': 'Орташа'},
-        'орташа': {'ru': 'Средний', 'kz': 'Орташа'},
-        'высокий': {'ru': 'Высокий', 'kz': 'Жоғары'},
-        'жоғары': {'ru': 'Высокий', 'kz': 'Жоғары'},
-        'критический': {'ru': 'Критический', 'kz': 'Шұғыл'},
-        'шұғыл': {'ru': 'Критический', 'kz': 'Шұғыл'},
-    }
-
-    def match(risk):
-        title_check = (risk.title_kz or risk.title or '').lower()
-        if type and type not in title_check:
-            return False
-
-        dept_key = (risk.department or '').strip().lower()
-        if department:
-            for key, val in department_map.items():
-                if key == dept_key:
-                    if department.lower() != val.get(lang, '').lower():
-                        return False
-                    break
-            else:
-                return False
-
-        status_key = (risk.status or '').strip().lower()
-        if status:
-            for key, val in status_map.items():
-                if key == status_key:
-                    if status.lower() != val.get(lang, '').lower():
-                        return False
-                    break
-            else:
-                return False
-
-        priority_key = (risk.priority or '').strip().lower()
-        if priority:
-            for key, val in priority_map.items():
-                if key == priority_key:
-                    if priority.lower() != val.get(lang, '').lower():
-                        return False
-                    break
-            else:
-                return False
-
-        if dateFrom and risk.created_at.strftime('%Y-%m-%d') < dateFrom:
-            return False
-        if dateTo and risk.created_at.strftime('%Y-%m-%d') > dateTo:
-            return False
-
-        return True
-
-    filtered_risks = list(filter(match, risks))
-    export_data = filtered_risks if any([type, department, status, priority, dateFrom, dateTo]) else risks
-
-    output = io.BytesIO()
-    doc = SimpleDocTemplate(output, pagesize=landscape(A4), leftMargin=20, rightMargin=20, topMargin=20, bottomMargin=20)
-
-    style = ParagraphStyle(name='Normal', fontName='Arial', fontSize=8, leading=10)
-
-    data = [headings[lang]]
-    for risk in export_data:
-        priority_key = (risk.priority or '').strip().lower()
-        status_key = (risk.status or '').strip().lower()
-        dept_key = (risk.department or '').strip().lower()
-
-        row = [
+    rows = [
+        [
             f"RISK-{risk.id:03d}",
-            department_map.get(dept_key, {}).get(lang, risk.department),
+            localize_label(DEPARTMENT_MAP, risk.department, lang),
             risk.title_kz if lang == "kz" else risk.title,
             risk.likelihood,
             risk.impact,
-            priority_map.get(priority_key, {}).get(lang, risk.priority),
-            status_map.get(status_key, {}).get(lang, risk.status),
+            localize_label(PRIORITY_MAP, risk.priority, lang),
+            localize_label(STATUS_MAP, risk.status, lang),
             risk.created_at.strftime("%Y-%m-%d %H:%M")
         ]
-        data.append(row)
-
-    wrapped_data = []
-    for row in data:
-        wrapped_row = [Paragraph(str(cell), style) for cell in row]
-        wrapped_data.append(wrapped_row)
-
-    table = Table(wrapped_data, colWidths=[50, 100, 120, 60, 60, 80, 80, 80], repeatRows=1)
-    table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Arial'),
-        ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'), 
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('GRID', (0, 0), (-1, -1), 0.3, colors.grey),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-        ('WORDWRAP', (0, 0), (-1, -1), 'CJK'), 
-    ]))
-
-    doc.build([table])
-    output.seek(0)
-
-    return StreamingResponse(
-        output,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=risk_map_{lang}.pdf"}
+        for risk in risks
+    ]
+
+    pdf = await render(render_risk_map_pdf, headings[lang], rows)
+    store_export_bytes(cache_key, ".pdf", pdf)
+
+    return Response(
+        content=pdf,
+        media_type=PDF_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 def normalize_department(value):
     key = value.lower().strip()
-    return department_map.get(key, {}).get('ru', key)
+    return DEPARTMENT_MAP.get(key, {}).get('ru', key)
 
 def normalize_status(value):
     key = value.lower().strip()
-    return status_map.get(key, {}).get('ru', key)
+    return STATUS_MAP.get(key, {}).get('ru', key)
 
 
 
@@ -0,0 +1,45 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from db import get_db, pool_status
+from models.job_run import JobRun
+from services.password_hashing import password_pool_status
+from services.scheduler import is_leader
+
+router = APIRouter()
+
+
+@router.get("/system/jobs")
+def list_job_runs(
+    job: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    stmt = select(JobRun).order_by(JobRun.started_at.desc(), JobRun.id.desc()).limit(limit)
+    if job:
+        stmt = stmt.where(JobRun.job_name == job)
+
+    return {
+        "leader": is_leader(),
+        "runs": [
+            {
+                "id": run.id,
+                "job_name": run.job_name,
+                "status": run.status,
+                "started_at": run.started_at,
+                "finished_at": run.finished_at,
+                "duration_ms": run.duration_ms,
+                "rows": run.rows,
+                "error": run.error,
+            }
+            for run in db.scalars(stmt)
+        ]
+    }
+
+
+@router.get("/system/metrics")
+def get_metrics():
+    return {"db_pool": pool_status(), "password_hashing": password_pool_status()}
@@ -0,0 +1,167 @@
+"""Сравнение sync Session внутри async def и AsyncSession под конкурентной нагрузкой.
+
+Оба эндпоинта выполняют то же, что list_assets без поиска: подсчёт и страница keyset.
+Параллельно идут запросы к /ping — по их задержке видно, блокируется ли event loop.
+Сервер (uvicorn, один воркер) запускается отдельным процессом, нагрузка идёт по HTTP.
+
+    python scripts/bench_async_db.py --rows 50000 --concurrency 1 8 32
+    DATABASE_URL=postgresql://... python scripts/bench_async_db.py
+
+Без DATABASE_URL используется временная SQLite-база.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='irmap_bench_')}/bench.db"
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from sqlalchemy import delete, insert, select
+
+import db
+from models.asset import Asset
+import models.risk_map  # noqa: F401 — models.risk_assessment создаёт таблицы при импорте
+import models.risk_assessment  # noqa: F401 — цель relationship Asset.risk_assessments
+from services.pagination import exact_count, keyset_window
+
+app = FastAPI()
+
+
+def assets_page(session):
+    stmt = select(Asset).where(Asset.type == "Computer")
+    total = exact_count(session, stmt)
+    items, _, _ = keyset_window(session, stmt, Asset.created_at, Asset.id, limit=50)
+    return total, len(items)
+
+
+# Как было до перехода: async def с синхронной сессией блокирует event loop на время запроса
+@app.get("/sync")
+async def sync_in_async():
+    with db.SessionLocal() as session:
+        total, count = assets_page(session)
+    return {"total": total, "count": count}
+
+
+@app.get("/async")
+async def with_async_session():
+    async with db.AsyncSessionLocal() as session:
+        total, count = await session.run_sync(assets_page)
+    return {"total": total, "count": count}
+
+
+@app.get("/ping")
+async def ping():
+    return {}
+
+
+def seed(rows: int):
+    db.Base.metadata.create_all(db.engine, tables=[Asset.__table__])
+    with db.engine.begin() as conn:
+        conn.execute(delete(Asset.__table__))
+        for start in range(0, rows, 5000):
+            conn.execute(insert(Asset.__table__), [
+                {"name": f"asset-{i}", "type": "Computer" if i % 3 else "Server", "source": "bench"}
+                for i in range(start, min(start + 5000, rows))
+            ])
+
+
+async def timed(client, path, latencies):
+    started = time.perf_counter()
+    response = await client.get(path)
+    response.raise_for_status()
+    latencies.append(time.perf_counter() - started)
+
+
+async def run(base_url: str, path: str, concurrency: int, requests: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        await timed(client, path, [])  # прогрев пула соединений
+
+        latencies, ping_latencies = [], []
+        queue = iter(range(requests))
+
+        async def worker():
+            for _ in queue:
+                await timed(client, path, latencies)
+
+        async def pinger(done):
+            while not done.is_set():
+                await timed(client, "/ping", ping_latencies)
+                await asyncio.sleep(0.005)
+
+        done = asyncio.Event()
+        ping_task = asyncio.create_task(pinger(done))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await ping_task
+
+    def p95(values):
+        return statistics.quantiles(values, n=20)[-1] * 1000 if len(values) >= 2 else values[0] * 1000
+
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": p95(latencies),
+        "ping_p95_ms": p95(ping_latencies),
+    }
+
+
+async def wait_ready(base_url: str, server: subprocess.Popen):
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError("Сервер бенчмарка не запустился")
+            try:
+                await client.get("/ping")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+
+
+async def bench(args):
+    seed(args.rows)
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen([sys.executable, __file__, "--serve", "--port", str(args.port)], env=os.environ)
+    try:
+        await wait_ready(base_url, server)
+        print(f"{db.engine.url.get_backend_name()}, {args.rows} активов, {args.requests} запросов на прогон")
+        print(f"{'path':<8}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'ping p95 ms':>14}")
+        for concurrency in args.concurrency:
+            for path in ("/sync", "/async"):
+                result = await run(base_url, path, concurrency, args.requests)
+                print(f"{path:<8}{concurrency:>6}{result['rps']:>10.1f}{result['p50_ms']:>10.1f}"
+                      f"{result['p95_ms']:>10.1f}{result['ping_p95_ms']:>14.1f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+    else:
+        asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Пропускная способность /login при разной конкурентности.
+
+Сравниваются два варианта:
+  /login        — текущий обработчик (routes/auth.py): bcrypt в ограниченном пуле
+                  services/password_hashing, при переполнении — 503;
+  /login-inline — как было раньше: bcrypt.verify прямо в синхронном обработчике,
+                  то есть в общем пуле потоков FastAPI.
+Параллельно идут запросы к синхронному /ping — по их задержке видно,
+забит ли общий пул потоков, которым пользуются остальные синхронные маршруты.
+
+    python scripts/bench_login.py --rounds 12 --queue-limit 32 --concurrency 1 8 32
+
+Сервер (uvicorn, один воркер) запускается отдельным процессом.
+Без DATABASE_URL используется временная SQLite-база.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)  # шаблоны ищутся относительно корня проекта
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='irmap_bench_')}/bench.db"
+
+EMAIL = "bench@example.com"
+PASSWORD = "bench-password"
+
+
+def build_app():
+    from fastapi import Depends, FastAPI, Form
+    from fastapi.responses import JSONResponse
+    from passlib.hash import bcrypt
+    from sqlalchemy.orm import Session
+    from starlette.middleware.sessions import SessionMiddleware
+
+    from db import get_db
+    from models.user import User
+    from routes.auth import router as auth_router
+
+    app = FastAPI()
+    app.add_middleware(SessionMiddleware, secret_key="bench")
+    app.include_router(auth_router)
+
+    # Прежний вариант: синхронный обработчик с bcrypt.verify в общем пуле потоков
+    @app.post("/login-inline")
+    def login_inline(email: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
+        user = db.query(User).filter(User.email == email).first()
+        if not user or not bcrypt.verify(password, user.password):
+            return JSONResponse({"error": "invalid"}, status_code=401)
+        return JSONResponse({}, status_code=303)
+
+    @app.get("/ping")
+    def ping():
+        return {}
+
+    return app
+
+
+def seed(rounds: int):
+    from passlib.hash import bcrypt
+    from sqlalchemy import delete
+
+    import db
+    from models.user import User
+
+    db.Base.metadata.create_all(db.engine, tables=[User.__table__])
+    with db.SessionLocal() as session:
+        session.execute(delete(User).where(User.email == EMAIL))
+        # Стоимость совпадает с PASSWORD_BCRYPT_ROUNDS, чтобы вход не перехэшировал пароль
+        session.add(User(username="bench", email=EMAIL, password=bcrypt.using(rounds=rounds).hash(PASSWORD)))
+        session.commit()
+
+
+async def run(base_url: str, path: str, concurrency: int, requests: int, ping_interval: float) -> dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300) as client:
+        statuses, latencies, ping_latencies = {}, [], []
+        queue = iter(range(requests))
+
+        async def worker():
+            for _ in queue:
+                started = time.perf_counter()
+                response = await client.post(path, data={"email": EMAIL, "password": PASSWORD})
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def pinger(done):
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/ping")
+                ping_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(ping_interval)
+
+        done = asyncio.Event()
+        ping_task = asyncio.create_task(pinger(done))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await ping_task
+
+    def p95(values):
+        return statistics.quantiles(values, n=20)[-1] * 1000 if len(values) >= 2 else values[0] * 1000
+
+    return {
+        "ok_per_s": statuses.get(303, 0) / elapsed,
+        "rejected": statuses.get(503, 0),
+        "p95_ms": p95(latencies),
+        "ping_p95_ms": p95(ping_latencies),
+    }
+
+
+async def wait_ready(base_url: str, server: subprocess.Popen):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError("Сервер бенчмарка не запустился")
+            try:
+                await client.get("/ping")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+
+
+async def bench(args):
+    seed(args.rounds)
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen([sys.executable, __file__, "--serve", "--port", str(args.port)], env=os.environ)
+    try:
+        await wait_ready(base_url, server)
+        print(f"bcrypt rounds={args.rounds}, queue limit={args.queue_limit}, "
+              f"workers={os.environ.get('PASSWORD_HASH_WORKERS', 'по умолчанию')}, {args.requests} входов на прогон")
+        print(f"{'path':<14}{'conc':>6}{'ok/s':>8}{'503':>6}{'p95 ms':>10}{'ping p95 ms':>14}")
+        for concurrency in args.concurrency:
+            for path in ("/login-inline", "/login"):
+                result = await run(base_url, path, concurrency, args.requests, args.ping_interval)
+                print(f"{path:<14}{concurrency:>6}{result['ok_per_s']:>8.1f}{result['rejected']:>6}"
+                      f"{result['p95_ms']:>10.1f}{result['ping_p95_ms']:>14.1f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--queue-limit", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--ping-interval", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        import uvicorn
+        uvicorn.run(build_app(), host="127.0.0.1", port=args.port, log_level="warning")
+    else:
+        # Пул хэширования читает настройки при импорте, поэтому они передаются серверу через окружение
+        os.environ["PASSWORD_BCRYPT_ROUNDS"] = str(args.rounds)
+        os.environ["PASSWORD_HASH_QUEUE_LIMIT"] = str(args.queue_limit)
+        asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+from sqlalchemy.orm import Session
+
+from models.asset import Asset
+from services.asset_search import search_clause, search_rank
+
+
+# Фильтры списка /assets; используются страницей, статистикой для графиков и экспортом
+def asset_filter_clauses(db: Session, search: str = "", type: str = "", criticality: str = "") -> list:
+    clauses = []
+    if search and (clause := search_clause(db.get_bind().dialect.name, search)) is not None:
+        clauses.append(clause)
+    if type:
+        clauses.append(Asset.type == type)
+    if criticality:
+        clauses.append(Asset.criticality == criticality)
+    return clauses
+
+
+# При поиске сначала идут самые релевантные активы
+def order_by_relevance(stmt, db: Session, search: str = ""):
+    if not search.strip():
+        return stmt
+    rank = search_rank(db.get_bind().dialect.name, search)
+    return stmt.order_by(rank.desc(), Asset.id.desc())
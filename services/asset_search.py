@@ -0,0 +1,133 @@
+import logging
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import Text, cast, column, func, literal, literal_column, or_, select, table, text
+from sqlalchemy.exc import OperationalError
+
+from models.asset import Asset
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Сколько совпадений досчитывать точно; дальше итог показывается как «N+»
+ASSET_SEARCH_COUNT_CAP = int(os.getenv("ASSET_SEARCH_COUNT_CAP", "1000"))
+
+# Поле -> вес в ранжировании
+SEARCH_FIELDS = {
+    "name": 1.0,
+    "inventory_number": 1.0,
+    "owner": 0.7,
+    "description": 0.4,
+}
+
+# Триграммы: меньше трёх символов индекс не использует
+MIN_INDEXED_LENGTH = 3
+
+_fts = table("assets_fts", column("rowid"))
+_fts_available = False
+
+_PG_INDEX_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_assets_name_trgm ON assets USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_assets_inventory_number_trgm ON assets USING gin ((inventory_number::text) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_assets_owner_trgm ON assets USING gin (owner gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_assets_description_trgm ON assets USING gin (description gin_trgm_ops)",
+]
+
+# Встроенный режим: внешняя FTS5-таблица поверх assets, синхронизируемая триггерами
+_FTS_COLUMNS = ", ".join(SEARCH_FIELDS)
+_FTS_NEW = ", ".join(f"new.{field}" for field in SEARCH_FIELDS)
+_FTS_OLD = ", ".join(f"old.{field}" for field in SEARCH_FIELDS)
+_SQLITE_INDEX_DDL = [
+    f"CREATE VIRTUAL TABLE assets_fts USING fts5({_FTS_COLUMNS}, content='assets', content_rowid='id', tokenize='trigram')",
+    f"""CREATE TRIGGER IF NOT EXISTS assets_fts_ai AFTER INSERT ON assets BEGIN
+        INSERT INTO assets_fts(rowid, {_FTS_COLUMNS}) VALUES (new.id, {_FTS_NEW});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS assets_fts_ad AFTER DELETE ON assets BEGIN
+        INSERT INTO assets_fts(assets_fts, rowid, {_FTS_COLUMNS}) VALUES ('delete', old.id, {_FTS_OLD});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS assets_fts_au AFTER UPDATE ON assets BEGIN
+        INSERT INTO assets_fts(assets_fts, rowid, {_FTS_COLUMNS}) VALUES ('delete', old.id, {_FTS_OLD});
+        INSERT INTO assets_fts(rowid, {_FTS_COLUMNS}) VALUES (new.id, {_FTS_NEW});
+    END""",
+    "INSERT INTO assets_fts(assets_fts) VALUES ('rebuild')",
+]
+
+
+def ensure_asset_search_index(engine):
+    global _fts_available
+    dialect = engine.dialect.name
+
+    if dialect == "postgresql":
+        with engine.begin() as conn:
+            for ddl in _PG_INDEX_DDL:
+                conn.execute(text(ddl))
+
+    elif dialect == "sqlite":
+        try:
+            with engine.begin() as conn:
+                exists = conn.scalar(text("SELECT 1 FROM sqlite_master WHERE name = 'assets_fts'"))
+                if not exists:
+                    for ddl in _SQLITE_INDEX_DDL:
+                        conn.execute(text(ddl))
+            _fts_available = True
+        except OperationalError:
+            # SQLite без FTS5 или без триграммного токенизатора (< 3.34)
+            logger.warning("FTS5 trigram недоступен, поиск по активам работает через LIKE", exc_info=True)
+
+
+def _search_columns():
+    return [
+        cast(Asset.inventory_number, Text) if field == "inventory_number" else getattr(Asset, field)
+        for field in SEARCH_FIELDS
+    ]
+
+
+def _like_pattern(search: str) -> str:
+    escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _fts_query(search: str) -> str:
+    return '"' + search.replace('"', '""') + '"'
+
+
+def _use_fts(dialect: str, search: str) -> bool:
+    return dialect == "sqlite" and _fts_available and len(search) >= MIN_INDEXED_LENGTH
+
+
+def search_clause(dialect: str, search: str):
+    search = search.strip()
+    if not search:
+        return None
+
+    if _use_fts(dialect, search):
+        return Asset.id.in_(
+            select(_fts.c.rowid).where(literal_column("assets_fts").op("MATCH")(_fts_query(search)))
+        )
+
+    # На Postgres ILIKE по этим колонкам обслуживают GIN-индексы gin_trgm_ops
+    pattern = _like_pattern(search)
+    return or_(*(col.ilike(pattern, escape="\\") for col in _search_columns()))
+
+
+# Релевантность совпадения: чем больше, тем выше в выдаче
+def search_rank(dialect: str, search: str):
+    search = search.strip()
+
+    if dialect == "postgresql" and search:
+        return func.greatest(*(
+            func.coalesce(func.word_similarity(search, col), 0) * weight
+            for col, weight in zip(_search_columns(), SEARCH_FIELDS.values())
+        ))
+
+    if _use_fts(dialect, search):
+        return -(
+            select(func.bm25(literal_column("assets_fts"), *SEARCH_FIELDS.values()))
+            .where(_fts.c.rowid == Asset.id, literal_column("assets_fts").op("MATCH")(_fts_query(search)))
+            .scalar_subquery()
+        )
+
+    return literal(0)
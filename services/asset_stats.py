@@ -0,0 +1,57 @@
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from models.asset import Asset
+from services.asset_filters import asset_filter_clauses
+from services.cache import TTLCache, invalidate_on
+
+load_dotenv()
+
+# Кэш сбрасывается при любом изменении assets (включая синхронизацию с CMDB),
+# TTL лишь ограничивает расхождение между воркерами
+ASSET_STATS_CACHE_TTL = float(os.getenv("ASSET_STATS_CACHE_TTL", "300"))
+
+UNSPECIFIED = "Не указано"
+
+# ключ ответа -> колонка, по которой группируем
+DISTRIBUTIONS = {
+    "types": Asset.type,
+    "criticalities": Asset.criticality,
+    "statuses": Asset.status,
+    "departments": Asset.department,
+}
+
+_cache = TTLCache(ASSET_STATS_CACHE_TTL)
+invalidate_on(_cache, Asset.__tablename__)
+
+
+def _distributions_query(clauses: list):
+    # Все четыре группировки одним запросом
+    return union_all(*(
+        select(
+            literal(key).label("dimension"),
+            column.label("value"),
+            func.count().label("count"),
+        ).where(*clauses).group_by(column)
+        for key, column in DISTRIBUTIONS.items()
+    ))
+
+
+def _load_distributions(db: Session, clauses: list) -> dict:
+    stats = {key: {} for key in DISTRIBUTIONS}
+    for row in db.execute(_distributions_query(clauses)):
+        label = row.value or UNSPECIFIED
+        bucket = stats[row.dimension]
+        bucket[label] = bucket.get(label, 0) + row.count
+    return stats
+
+
+def get_asset_distributions(db: Session, search: str = "", type: str = "", criticality: str = "") -> dict:
+    clauses = asset_filter_clauses(db, search, type, criticality)
+    # Поисковые строки не кэшируем: их слишком много, а тип и критичность дают немного комбинаций
+    if search:
+        return _load_distributions(db, clauses)
+    return _cache.get_or_set((type, criticality), lambda: _load_distributions(db, clauses))
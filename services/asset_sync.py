@@ -0,0 +1,116 @@
+import os
+from datetime import datetime, timezone
+from typing import Iterable
+
+from dotenv import load_dotenv
+from sqlalchemy import and_, case, or_, select, update
+from sqlalchemy.orm import Session
+
+from db import add_missing_columns
+from models.asset import Asset
+from services.bulk import batches, dialect_insert
+
+load_dotenv()
+
+CMDB_UPSERT_BATCH_SIZE = int(os.getenv("CMDB_UPSERT_BATCH_SIZE", "1000"))
+
+# Поля, которые синхронизируются из CMDB; остальные (критичность, владелец и т.д.) ведутся вручную
+SYNC_FIELDS = ("name", "type")
+# Статус актива, который пропал из CMDB при полной сверке. Его же пользователь может выбрать
+# вручную, поэтому снятие сверкой отмечается отдельно — в removed_from_cmdb_at.
+REMOVED_STATUS = "Inactive"
+# Статус, который возвращается активу, снова появившемуся в CMDB
+RESTORED_STATUS = "Active"
+
+
+def ensure_asset_sync_schema():
+    add_missing_columns(Asset.__table__)
+
+
+def _upsert(db: Session, rows: list):
+    insert = dialect_insert(db)
+    stmt = insert(Asset).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Asset.external_id],
+        set_={
+            **{field: stmt.excluded[field] for field in SYNC_FIELDS},
+            # Возвращаем только то, что выключила сама сверка и пользователь с тех пор не менял
+            "status": case(
+                (and_(Asset.removed_from_cmdb_at.is_not(None), Asset.status == REMOVED_STATUS), RESTORED_STATUS),
+                else_=Asset.status,
+            ),
+            "removed_from_cmdb_at": None,
+        },
+        where=or_(
+            Asset.removed_from_cmdb_at.is_not(None),
+            *(getattr(Asset, field).is_distinct_from(stmt.excluded[field]) for field in SYNC_FIELDS),
+        ),
+    )
+    db.execute(stmt)
+
+
+# items: словари с ключами external_id, type и (необязательно) name.
+# Коммит остаётся за вызывающим кодом.
+def sync_external_assets(db: Session, items: Iterable[dict], batch_size: int = CMDB_UPSERT_BATCH_SIZE) -> dict:
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    for batch in batches(items, batch_size):
+        incoming = {item["external_id"]: item for item in batch}
+
+        existing = {
+            row.external_id: row
+            for row in db.execute(
+                select(Asset.external_id, Asset.name, Asset.type, Asset.removed_from_cmdb_at)
+                .where(Asset.external_id.in_(list(incoming)))
+            )
+        }
+
+        rows = []
+        for external_id, item in incoming.items():
+            current = existing.get(external_id)
+            if current is None:
+                counts["inserted"] += 1
+                name = item.get("name", "Unnamed")
+            else:
+                name = item.get("name", current.name)
+                returned = current.removed_from_cmdb_at is not None
+                if name == current.name and item["type"] == current.type and not returned:
+                    counts["unchanged"] += 1
+                    continue
+                counts["updated"] += 1
+
+            rows.append({
+                "external_id": external_id,
+                "name": name,
+                "type": item["type"],
+                "criticality": "medium",
+                "is_external": True,
+                "source": "GLPI",
+            })
+
+        if rows:
+            _upsert(db, rows)
+
+    return counts
+
+
+# Полная сверка: внешние активы типа asset_type, которых больше нет в CMDB, помечаются неактивными.
+# Активы, которые пользователь уже сделал неактивными, сверка не трогает и потом не «возвращает».
+def deactivate_missing_assets(db: Session, asset_type: str, seen_external_ids: set, batch_size: int = CMDB_UPSERT_BATCH_SIZE) -> int:
+    current = db.scalars(
+        select(Asset.external_id).where(
+            Asset.is_external.is_(True),
+            Asset.type == asset_type,
+            Asset.removed_from_cmdb_at.is_(None),
+            or_(Asset.status.is_(None), Asset.status != REMOVED_STATUS),
+        )
+    )
+    missing = [external_id for external_id in current if external_id not in seen_external_ids]
+
+    for batch in batches(missing, batch_size):
+        db.execute(
+            update(Asset)
+            .where(Asset.external_id.in_(batch))
+            .values(status=REMOVED_STATUS, removed_from_cmdb_at=datetime.now(timezone.utc))
+        )
+    return len(missing)
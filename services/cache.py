@@ -0,0 +1,107 @@
+import threading
+import time
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class TTLCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+
+    def get_or_set(self, key, loader):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            if self.ttl > 0:
+                self.set(key, value)
+        return value
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_MISSING = object()
+
+# table name -> список колбэков, вызываемых после commit, затронувшего таблицу
+_listeners = {}
+
+
+def on_tables_changed(tables, callback):
+    for table in tables:
+        _listeners.setdefault(table, []).append(callback)
+
+
+def invalidate_on(cache: TTLCache, *tables):
+    on_tables_changed(tables, lambda changed: cache.clear())
+
+
+def mark_changed(session: Session, *tables):
+    session.info.setdefault("changed_tables", set()).update(tables)
+
+
+def changed_tables(session: Session) -> set:
+    return session.info.get("changed_tables", set())
+
+
+def notify_tables_changed(tables):
+    callbacks = []
+    for table in tables:
+        for callback in _listeners.get(table, []):
+            if callback not in callbacks:
+                callbacks.append(callback)
+    for callback in callbacks:
+        callback(set(tables))
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session, flush_context):
+    mark_changed(session, *{
+        obj.__table__.name
+        for obj in chain(session.new, session.dirty, session.deleted)
+        if hasattr(obj, "__table__")
+    })
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_tables(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    if table is not None and getattr(table, "name", None):
+        mark_changed(orm_execute_state.session, table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _fire_commit_listeners(session):
+    tables = session.info.pop("changed_tables", None)
+    if tables:
+        notify_tables_changed(tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _reset_changed_tables(session):
+    session.info.pop("changed_tables", None)
@@ -0,0 +1,62 @@
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import func, select, true
+from sqlalchemy.orm import Session
+
+from models.asset import Asset
+from models.measure import Measure, Notification
+from models.risk_map import RiskListEntry
+from models.risk_assessment import RiskAssessment
+from services.cache import TTLCache, invalidate_on
+
+load_dotenv()
+
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "30"))
+
+_cache = TTLCache(DASHBOARD_CACHE_TTL)
+invalidate_on(
+    _cache,
+    Asset.__tablename__,
+    RiskAssessment.__tablename__,
+    RiskListEntry.__tablename__,
+    Measure.__tablename__,
+    Notification.__tablename__,
+)
+
+
+def _dashboard_stats_query():
+    assets = select(
+        func.count().label("total_assets"),
+        func.count().filter(Asset.criticality == "High").label("high_critical_count"),
+    ).select_from(Asset).subquery()
+
+    assessments = select(
+        func.count().label("total_risks"),
+        func.count().filter(RiskAssessment.level.in_(["Высокий", "Критический"])).label("high_risks"),
+    ).select_from(RiskAssessment).subquery()
+
+    entries = select(
+        func.count().filter(RiskListEntry.priority == "Критический").label("critical_priority_count"),
+        func.count().filter(RiskListEntry.status == "Новый").label("new_status_count"),
+        func.count().filter(RiskListEntry.status == "В работе").label("in_progress_count"),
+    ).select_from(RiskListEntry).subquery()
+
+    measures = select(func.count().label("total_measures")).select_from(Measure).subquery()
+    notifications = select(func.count().label("total_notifications")).select_from(Notification).subquery()
+
+    # каждый подзапрос возвращает ровно одну строку, поэтому соединяем их по true
+    return select(assets, assessments, entries, measures, notifications).select_from(
+        assets
+        .join(assessments, true())
+        .join(entries, true())
+        .join(measures, true())
+        .join(notifications, true())
+    )
+
+
+def get_dashboard_stats(db: Session) -> dict:
+    return _cache.get_or_set(
+        "stats",
+        lambda: dict(db.execute(_dashboard_stats_query()).mappings().one())
+    )
@@ -0,0 +1,61 @@
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from models.data_version import DataVersion
+from services.bulk import dialect_insert
+from services.cache import TTLCache, changed_tables, on_tables_changed
+
+load_dotenv()
+
+# Таблицы, из которых строятся выгрузки; изменения остальных таблиц версии не трогают
+VERSIONED_TABLES = frozenset({"assets", "risk_list_entries", "measures", "risk_assessments"})
+# Сколько процесс доверяет прочитанной версии; свои коммиты сбрасывают её сразу,
+# коммиты других процессов становятся видны не позже чем через этот срок
+DATA_VERSION_CACHE_TTL = float(os.getenv("DATA_VERSION_CACHE_TTL", "5"))
+
+_versions = TTLCache(DATA_VERSION_CACHE_TTL)
+on_tables_changed(VERSIONED_TABLES, lambda tables: [_versions.pop(table) for table in tables])
+
+
+# Версии увеличиваются в той же транзакции, что и изменение данных. Явный flush нужен,
+# чтобы after_flush успел записать изменённые таблицы до того, как мы их прочитаем.
+@event.listens_for(Session, "before_commit")
+def _bump_data_versions(session):
+    session.flush()
+    tables = sorted(changed_tables(session) & VERSIONED_TABLES)
+    if not tables:
+        return
+
+    insert = dialect_insert(session)
+    stmt = insert(DataVersion.__table__).values([{"table_name": table, "version": 1} for table in tables])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DataVersion.table_name],
+        set_={"version": DataVersion.__table__.c.version + 1},
+    )
+    # Через connection, а не session.execute: запись счётчика сама не должна считаться изменением
+    session.connection().execute(stmt)
+
+
+def data_versions(db: Session, tables) -> dict:
+    versions = {}
+    missing = []
+    for table in tables:
+        version = _versions.get(table)
+        if version is None:
+            missing.append(table)
+        else:
+            versions[table] = version
+
+    if missing:
+        stored = dict(db.execute(
+            select(DataVersion.table_name, DataVersion.version)
+            .where(DataVersion.table_name.in_(missing))
+        ).all())
+        for table in missing:
+            versions[table] = stored.get(table, 0)
+            if DATA_VERSION_CACHE_TTL > 0:
+                _versions.set(table, versions[table])
+    return versions
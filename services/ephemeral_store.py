@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from db import SessionLocal
+from models.ephemeral import EphemeralEntry
+from services.bulk import dialect_insert
+
+load_dotenv()
+
+# memory — только для одного процесса; sql и redis разделяются всеми воркерами
+EPHEMERAL_STORE = os.getenv("EPHEMERAL_STORE", "sql")
+EPHEMERAL_REDIS_URL = os.getenv("EPHEMERAL_REDIS_URL", "redis://localhost:6379/0")
+EPHEMERAL_KEY_PREFIX = os.getenv("EPHEMERAL_KEY_PREFIX", "irmap:")
+# Как часто in-process backend вычищает просроченные ключи
+MEMORY_SWEEP_SECONDS = 60
+
+
+# Хранилище строк с TTL. Ключ после истечения срока не виден, даже если ещё не удалён.
+class MemoryStore:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def set(self, key: str, value: str, ttl: float):
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (value, now + ttl)
+            if now - self._last_sweep >= MEMORY_SWEEP_SECONDS:
+                self._sweep(now)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def sweep(self) -> int:
+        with self._lock:
+            return self._sweep(time.monotonic())
+
+    def _sweep(self, now) -> int:
+        expired = [key for key, (_, expires_at) in self._data.items() if expires_at <= now]
+        for key in expired:
+            del self._data[key]
+        self._last_sweep = now
+        return len(expired)
+
+
+# Таблица ephemeral_entries в основной БД; просроченные строки удаляет задание ephemeral_sweep.
+# Каждая операция выполняется в своей короткой транзакции, независимо от сессии запроса.
+class SQLStore:
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+
+    def set(self, key: str, value: str, ttl: float):
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        with self._session_factory() as db:
+            insert = dialect_insert(db)
+            stmt = insert(EphemeralEntry).values(key=key, value=value, expires_at=expires_at)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[EphemeralEntry.key],
+                set_={"value": stmt.excluded.value, "expires_at": stmt.excluded.expires_at},
+            ))
+            db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._session_factory() as db:
+            return db.scalar(
+                select(EphemeralEntry.value)
+                .where(EphemeralEntry.key == key, EphemeralEntry.expires_at > datetime.utcnow())
+            )
+
+    def delete(self, key: str):
+        with self._session_factory() as db:
+            db.execute(delete(EphemeralEntry).where(EphemeralEntry.key == key))
+            db.commit()
+
+    def sweep(self) -> int:
+        with self._session_factory() as db:
+            result = db.execute(delete(EphemeralEntry).where(EphemeralEntry.expires_at <= datetime.utcnow()))
+            db.commit()
+            return result.rowcount
+
+
+# Любой сервер с протоколом Redis (Redis, Valkey, KeyDB); срок жизни задаёт сам сервер (PX)
+class RedisStore:
+    def __init__(self, url: str = EPHEMERAL_REDIS_URL, prefix: str = EPHEMERAL_KEY_PREFIX, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self._client = client
+        self._prefix = prefix
+
+    def set(self, key: str, value: str, ttl: float):
+        self._client.set(self._prefix + key, value, px=max(int(ttl * 1000), 1))
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(self._prefix + key)
+
+    def delete(self, key: str):
+        self._client.delete(self._prefix + key)
+
+    def sweep(self) -> int:
+        return 0
+
+
+STORE_BACKENDS = {
+    "memory": MemoryStore,
+    "sql": SQLStore,
+    "redis": RedisStore,
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_ephemeral_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = STORE_BACKENDS.get(EPHEMERAL_STORE)
+            if backend is None:
+                raise ValueError(f"Неизвестный EPHEMERAL_STORE: {EPHEMERAL_STORE}")
+            _store = backend()
+        return _store
+
+
+# Задание планировщика: удаляет просроченные записи (для redis ничего не делает)
+def ephemeral_sweep_job(db: Session) -> int:
+    return get_ephemeral_store().sweep()
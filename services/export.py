@@ -0,0 +1,115 @@
+import os
+import tempfile
+from contextlib import suppress
+from itertools import chain, islice
+from typing import Iterable, Sequence
+
+import xlsxwriter
+from fastapi.responses import StreamingResponse
+
+from services.export_cache import open_cached_export, store_export_file
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PDF_MEDIA_TYPE = "application/pdf"
+
+# Сколько строк берём для оценки ширины колонок и сколько строк тянем из курсора за раз
+WIDTH_SAMPLE_ROWS = 500
+MAX_COLUMN_WIDTH = 60
+DB_FETCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+
+def estimate_column_widths(headers: Sequence[str], sample: Sequence[Sequence]) -> list:
+    widths = [len(str(h)) for h in headers]
+    for row in sample:
+        for i, value in enumerate(row):
+            if value is not None:
+                widths[i] = max(widths[i], len(str(value)))
+    return [min(w + 2, MAX_COLUMN_WIDTH) for w in widths]
+
+
+# constant_memory: xlsxwriter сбрасывает каждую строку во временный файл сразу после записи,
+# поэтому память не зависит от числа строк. Ширины колонок нужно задать до первой строки.
+def write_xlsx(rows: Iterable[Sequence], headers: Sequence[str], sheet_name: str) -> str:
+    fd, path = tempfile.mkstemp(prefix="irmap_export_", suffix=".xlsx")
+    os.close(fd)
+
+    try:
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        worksheet = workbook.add_worksheet(sheet_name)
+        header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+
+        rows = iter(rows)
+        sample = list(islice(rows, WIDTH_SAMPLE_ROWS))
+        for col, width in enumerate(estimate_column_widths(headers, sample)):
+            worksheet.set_column(col, col, width)
+
+        worksheet.write_row(0, 0, headers, header_format)
+        for row_num, row in enumerate(chain(sample, rows), start=1):
+            worksheet.write_row(row_num, 0, row)
+
+        workbook.close()
+    except Exception:
+        with suppress(OSError):
+            os.remove(path)
+        raise
+
+    return path
+
+
+def iter_file_chunks(path: str, chunk_size: int = CHUNK_SIZE):
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+    finally:
+        with suppress(OSError):
+            os.remove(path)
+
+
+def iter_open_file(f, chunk_size: int = CHUNK_SIZE):
+    try:
+        while chunk := f.read(chunk_size):
+            yield chunk
+    finally:
+        f.close()
+
+
+def file_stream_response(f, media_type: str, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        iter_open_file(f),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(os.fstat(f.fileno()).st_size),
+        }
+    )
+
+
+# Готовая выгрузка из кэша (services/export_cache) или None, если её там нет
+def cached_export_response(cache_key: str, suffix: str, media_type: str, filename: str):
+    f = open_cached_export(cache_key, suffix)
+    if f is None:
+        return None
+    return file_stream_response(f, media_type, filename)
+
+
+# rows читаются из курсора и пишутся в xlsx синхронно, поэтому обработчики выгрузок —
+# обычные def: FastAPI выполняет их в пуле потоков, не блокируя event loop.
+# С cache_key готовый файл сохраняется в кэше выгрузок и отдаётся оттуда
+def xlsx_response(rows: Iterable[Sequence], headers: Sequence[str], sheet_name: str, filename: str, cache_key: str = None):
+    path = write_xlsx(rows, headers, sheet_name)
+    if cache_key:
+        # Файл открыт до переноса в кэш: дескриптор остаётся рабочим, даже если файл тут же вытеснят
+        f = open(path, "rb")
+        if store_export_file(cache_key, ".xlsx", path):
+            return file_stream_response(f, XLSX_MEDIA_TYPE, filename)
+        f.close()
+    return StreamingResponse(
+        iter_file_chunks(path),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(os.path.getsize(path)),
+        }
+    )
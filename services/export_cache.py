@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import suppress
+from typing import BinaryIO, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "irmap_export_cache"))
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_MB", "512")) * 1024 * 1024
+EXPORT_CACHE_ENABLED = os.getenv("EXPORT_CACHE_ENABLED", "1") == "1" and EXPORT_CACHE_MAX_BYTES > 0
+
+_evict_lock = threading.Lock()
+
+
+def _normalize_filters(filters: dict) -> dict:
+    normalized = {}
+    for name, value in sorted(filters.items()):
+        if isinstance(value, str):
+            value = value.strip()
+        if value not in (None, ""):
+            normalized[name] = value
+    return normalized
+
+
+# Ключ: тип выгрузки, фильтры без пустых значений, язык и версии таблиц, из которых она строится
+def export_cache_key(export: str, filters: dict, lang: str, versions: dict) -> str:
+    payload = json.dumps(
+        [export, _normalize_filters(filters), lang, sorted(versions.items())],
+        ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _path(key: str, suffix: str) -> str:
+    return os.path.join(EXPORT_CACHE_DIR, key + suffix)
+
+
+# Открывает готовый файл и отмечает его как недавно использованный (mtime).
+# Открытый файл можно дочитать, даже если его тут же вытеснит другой воркер.
+def open_cached_export(key: str, suffix: str) -> Optional[BinaryIO]:
+    if not EXPORT_CACHE_ENABLED:
+        return None
+    path = _path(key, suffix)
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return None
+    with suppress(OSError):
+        os.utime(path)
+    return f
+
+
+# Переносит готовый файл в кэш (атомарно). False — файл остался на месте и не закэширован.
+def store_export_file(key: str, suffix: str, src_path: str) -> bool:
+    if not EXPORT_CACHE_ENABLED:
+        return False
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    path = _path(key, suffix)
+    try:
+        os.replace(src_path, path)
+    except OSError:
+        # Например, каталог кэша на другой файловой системе: файл отдаётся без кэширования
+        return False
+    _evict(keep=path)
+    return True
+
+
+def store_export_bytes(key: str, suffix: str, data: bytes):
+    if not EXPORT_CACHE_ENABLED:
+        return
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=EXPORT_CACHE_DIR, suffix=".tmp")
+    path = _path(key, suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        with suppress(OSError):
+            os.remove(tmp_path)
+        return
+    _evict(keep=path)
+
+
+# LRU по mtime: самые давно запрошенные файлы удаляются, пока кэш не уложится в лимит.
+# Каталог общий для всех воркеров, поэтому состояние берётся с диска, а не из памяти процесса.
+def _evict(keep: str = None):
+    with _evict_lock:
+        entries = []
+        total = 0
+        with os.scandir(EXPORT_CACHE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith(".tmp") or not entry.is_file():
+                    continue
+                with suppress(OSError):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= EXPORT_CACHE_MAX_BYTES:
+                break
+            if path == keep:
+                continue
+            # Файл, который сейчас отдаётся, на Windows удалить нельзя — уберём в следующий раз
+            with suppress(OSError):
+                os.remove(path)
+                total -= size
+
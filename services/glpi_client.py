@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import os
+import re
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+GLPI_PAGE_SIZE = int(os.getenv("GLPI_PAGE_SIZE", "500"))
+GLPI_CONCURRENCY = int(os.getenv("GLPI_CONCURRENCY", "4"))
+GLPI_TIMEOUT = float(os.getenv("GLPI_TIMEOUT", "30"))
+
+_CONTENT_RANGE = re.compile(r"(\d+)-(\d+)/(\d+)")
+_DONE = object()
+
+
+class GLPIError(Exception):
+    def __init__(self, message, details=""):
+        super().__init__(message)
+        self.details = details
+
+
+class GLPIClient:
+    def __init__(
+        self,
+        base_url: str,
+        app_token: str,
+        user_token: str,
+        page_size: int = GLPI_PAGE_SIZE,
+        concurrency: int = GLPI_CONCURRENCY,
+        transport: httpx.AsyncBaseTransport = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.app_token = app_token
+        self.user_token = user_token
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self._transport = transport
+        self._client = None
+        self._session_headers = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(timeout=GLPI_TIMEOUT, transport=self._transport)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            await self._init_session()
+        except BaseException:
+            await self._client.aclose()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if self._session_headers:
+                await self._client.get(f"{self.base_url}/killSession", headers=self._session_headers)
+        except httpx.HTTPError:
+            logger.warning("GLPI killSession failed", exc_info=True)
+        finally:
+            await self._client.aclose()
+
+    async def _init_session(self):
+        response = await self._client.get(
+            f"{self.base_url}/initSession",
+            headers={"App-Token": self.app_token, "Authorization": f"user_token {self.user_token}"},
+        )
+        if response.status_code != 200:
+            raise GLPIError("GLPI session init failed", response.text)
+
+        session_token = response.json().get("session_token")
+        if not session_token:
+            raise GLPIError("No session token returned from GLPI")
+
+        self._session_headers = {"App-Token": self.app_token, "Session-Token": session_token}
+
+    async def get_page(self, path: str, start: int, params: dict = None):
+        end = start + self.page_size - 1
+        async with self._semaphore:
+            response = await self._client.get(
+                f"{self.base_url}/{path}",
+                params={**(params or {}), "range": f"{start}-{end}"},
+                headers=self._session_headers,
+            )
+
+        if response.status_code not in (200, 206):
+            raise GLPIError(f"GLPI request {path} [{start}-{end}] failed", response.text)
+
+        payload = response.json()
+        # /search/<type> возвращает объект с data, обычные списки — массив
+        items = payload.get("data", []) if isinstance(payload, dict) else payload
+
+        match = _CONTENT_RANGE.search(response.headers.get("Content-Range", ""))
+        total = int(match.group(3)) if match else len(items)
+        return items, total
+
+    # requests: key -> (path, params). Отдаёт страницы (key, items) по мере получения:
+    # первая страница каждого запроса определяет общее число записей, остальные
+    # запрашиваются параллельно (не более concurrency запросов одновременно).
+    async def iter_pages(self, requests: dict):
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        tasks = []
+
+        def spawn(coro):
+            task = asyncio.create_task(coro)
+            tasks.append(task)
+            return task
+
+        async def fetch_page(key, path, params, start):
+            items, _ = await self.get_page(path, start, params)
+            await queue.put((key, items))
+
+        async def fetch_path(key, path, params):
+            try:
+                items, total = await self.get_page(path, 0, params)
+            except GLPIError as e:
+                # как и раньше: тип, который GLPI не отдаёт, пропускаем
+                logger.warning("%s: %s", e, e.details)
+                return
+            await queue.put((key, items))
+            await asyncio.gather(*(
+                spawn(fetch_page(key, path, params, start))
+                for start in range(self.page_size, total, self.page_size)
+            ))
+
+        async def produce():
+            try:
+                await asyncio.gather(*(
+                    spawn(fetch_path(key, path, params))
+                    for key, (path, params) in requests.items()
+                ))
+            except Exception as e:
+                await queue.put(e)
+            else:
+                await queue.put(_DONE)
+
+        producer = spawn(produce())
+        try:
+            while (page := await queue.get()) is not _DONE:
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from db import AsyncSessionLocal
+from models.measure import Notification
+from services.cache import on_tables_changed
+from services.pagination import keyset_page
+
+load_dotenv()
+
+# Как часто поток перепроверяет БД, если изменение пришло из другого процесса (например, от планировщика)
+NOTIFICATION_STREAM_POLL_SECONDS = float(os.getenv("NOTIFICATION_STREAM_POLL_SECONDS", "5"))
+NOTIFICATION_STREAM_BATCH = 50
+
+_waiters = set()
+
+
+def _wake_waiters(tables):
+    for loop, event in list(_waiters):
+        loop.call_soon_threadsafe(event.set)
+
+
+# Коммит, затронувший notifications в этом процессе, будит открытые потоки сразу
+on_tables_changed([Notification.__tablename__], _wake_waiters)
+
+
+async def wait_for_change(timeout: float):
+    waiter = (asyncio.get_running_loop(), asyncio.Event())
+    _waiters.add(waiter)
+    try:
+        await asyncio.wait_for(waiter[1].wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        _waiters.discard(waiter)
+
+
+def notification_to_output(notification: Notification) -> dict:
+    return {
+        "id": notification.id,
+        "type": notification.type,
+        "measure_id": notification.measure_id,
+        "title": {"ru": notification.title_ru, "kz": notification.title_kz},
+        "message": {"ru": notification.message_ru, "kz": notification.message_kz},
+        "created_at": notification.created_at,
+        "read": notification.read
+    }
+
+
+def notification_page(db: Session, cursor=None, limit: int = 20):
+    items, next_cursor = keyset_page(
+        db, select(Notification), Notification.created_at, Notification.id,
+        cursor=cursor, limit=limit, descending=True
+    )
+    return [notification_to_output(n) for n in items], next_cursor
+
+
+def unread_count(db: Session) -> int:
+    # условие совпадает с предикатом частичного индекса ix_notifications_unread
+    return db.scalar(select(func.count(Notification.id)).where(Notification.read == False))
+
+
+def _latest_id(db: Session) -> int:
+    return db.scalar(select(func.max(Notification.id))) or 0
+
+
+async def _snapshot(after_id):
+    async with AsyncSessionLocal() as db:
+        if after_id is None:
+            return await db.run_sync(_latest_id), [], await db.run_sync(unread_count)
+        new = (await db.scalars(
+            select(Notification)
+            .where(Notification.id > after_id)
+            .order_by(Notification.id)
+            .limit(NOTIFICATION_STREAM_BATCH)
+        )).all()
+        last_id = new[-1].id if new else after_id
+        return last_id, [notification_to_output(n) for n in new], await db.run_sync(unread_count)
+
+
+def _sse(event: str, data, id=None) -> str:
+    lines = [f"event: {event}"]
+    if id is not None:
+        lines.append(f"id: {id}")
+    lines.append(f"data: {json.dumps(data, default=str, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+# Server-sent events: "notification" на каждое новое уведомление и "count" при изменении
+# числа непрочитанных. Соединение с БД берётся только на время проверки.
+async def notification_events(request, last_event_id=None):
+    last_id = last_event_id
+    last_count = None
+
+    while not await request.is_disconnected():
+        last_id, new, count = await _snapshot(last_id)
+
+        sent = False
+        for item in new:
+            yield _sse("notification", item, id=item["id"])
+            sent = True
+        if count != last_count:
+            last_count = count
+            yield _sse("count", {"unread": count})
+            sent = True
+        if not sent:
+            # комментарий-пинг не даёт прокси закрыть простаивающее соединение
+            yield ": ping\n\n"
+
+        # Пачка была неполной — ждём изменений, иначе сразу дочитываем остаток
+        if len(new) < NOTIFICATION_STREAM_BATCH:
+            await wait_for_change(NOTIFICATION_STREAM_POLL_SECONDS)
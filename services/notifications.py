@@ -0,0 +1,189 @@
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import Date, Integer, String, and_, case, cast, func, literal, or_, select
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+from db import add_missing_columns
+from models.measure import Measure, Notification
+from services.bulk import dialect_insert
+from services.sync_state import get_sync_state
+
+COMPLETED_STATUSES = ["завершена", "completed", "аяқталған"]
+NEW_STATUSES = ["новая", "new", "жаңа"]
+
+UPCOMING_DAYS = 3
+STALE_DAYS = 7
+NEW_MEASURES_DAYS = 7
+# Запас назад от прошлого запуска на случай транзакций, закоммиченных чуть позже своей метки времени;
+# повторно найденные меры отсекает уникальный индекс
+CHANGE_OVERLAP = timedelta(minutes=5)
+
+NOTIFICATION_COLUMNS = [
+    "type", "measure_id", "title_ru", "title_kz", "message_ru", "message_kz", "read", "created_at", "day",
+]
+
+
+def ensure_notification_schema(engine):
+    add_missing_columns(Measure.__table__)
+    add_missing_columns(Notification.__table__)
+    # Рефлексия не видит индексы по выражениям, поэтому IF NOT EXISTS вместо checkfirst
+    with engine.begin() as conn:
+        for table in (Measure.__table__, Notification.__table__):
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _text(value):
+    return cast(value, String)
+
+
+def _title_kz():
+    return func.coalesce(func.nullif(Measure.title_kz, ""), Measure.title)
+
+
+def _days_between(dialect: str, later, earlier):
+    if dialect == "postgresql":
+        return later - earlier
+    return cast(func.julianday(later) - func.julianday(earlier), Integer)
+
+
+def _as_date(dialect: str, value):
+    # В SQLite CAST(... AS DATE) даёт число, дату из даты-времени выделяет date()
+    if dialect == "sqlite":
+        return func.date(value)
+    return cast(value, Date)
+
+
+def _day_word_ru(n):
+    return case(
+        (and_(n % 100 >= 11, n % 100 <= 14), "дней"),
+        (n % 10 == 1, "день"),
+        (and_(n % 10 >= 2, n % 10 <= 4), "дня"),
+        else_="дней",
+    )
+
+
+def _measure_rule(type, title_ru, title_kz, message_ru, message_kz, where, now: datetime):
+    return select(
+        literal(type),
+        Measure.id,
+        literal(title_ru),
+        literal(title_kz),
+        message_ru,
+        message_kz,
+        literal(False),
+        literal(now),
+        literal(now.date(), Date),
+    ).where(*where)
+
+
+# Правила в виде INSERT ... SELECT. since — время прошлого запуска: если он был,
+# рассматриваются только меры, изменённые после него, или пересёкшие границу дат.
+def _rules(dialect: str, now: datetime, since):
+    today = now.date()
+    due = _text(Measure.due_date)
+    open_measure = ~Measure.status.in_(COMPLETED_STATUSES)
+
+    changed = func.coalesce(Measure.updated_at, Measure.created_at) >= since - CHANGE_OVERLAP if since else None
+    last_day = since.date() if since else None
+
+    def incremental(boundary=None):
+        if since is None:
+            return []
+        return [or_(changed, boundary) if boundary is not None else changed]
+
+    yield _measure_rule(
+        "overdue", "Просроченная мера", "Кешіктірілген шара",
+        'Мера "' + Measure.title + '" просрочена (до ' + due + ")",
+        '"' + _title_kz() + '" шарасы кешіктірілді (' + due + " дейін)",
+        [
+            Measure.due_date < today,
+            open_measure,
+            # стала просроченной с прошлого запуска
+            *incremental(Measure.due_date >= last_day if since else None),
+        ],
+        now,
+    )
+
+    days_left = _days_between(dialect, Measure.due_date, literal(today, Date))
+    yield _measure_rule(
+        "upcoming", "Приближается срок", "Мерзім жақындап жатыр",
+        'Мера "' + Measure.title + '" истекает через ' + _text(days_left) + " " + _day_word_ru(days_left)
+        + " (до " + due + ")",
+        '"' + _title_kz() + '" шарасы ' + _text(days_left) + " күн ішінде аяқталуы керек (" + due + " дейін)",
+        [
+            Measure.due_date >= today,
+            Measure.due_date <= today + timedelta(days=UPCOMING_DAYS),
+            open_measure,
+            # срок вошёл в окно UPCOMING_DAYS с прошлого запуска
+            *incremental(Measure.due_date > last_day + timedelta(days=UPCOMING_DAYS) if since else None),
+        ],
+        now,
+    )
+
+    yield _measure_rule(
+        "no_responsible", "Нет ответственного", "Жауапты жоқ",
+        'Мера "' + Measure.title + '" не имеет назначенного ответственного',
+        '"' + _title_kz() + '" шарасына жауапты тағайындалмаған',
+        [Measure.responsible.is_(None), *incremental()],
+        now,
+    )
+
+    stale_before = datetime.combine(today - timedelta(days=STALE_DAYS), time.min)
+    days_in_status = _days_between(dialect, literal(today, Date), _as_date(dialect, Measure.created_at))
+    yield _measure_rule(
+        "stale", "Долго в статусе 'Новая'", "'Жаңа' статусында ұзақ уақыт",
+        'Мера "' + Measure.title + '" уже ' + _text(days_in_status) + ' дней в статусе "Новая"',
+        '"' + _title_kz() + '" шарасы "Жаңа" статусында ' + _text(days_in_status) + " күн болды",
+        [
+            Measure.status.in_(NEW_STATUSES),
+            Measure.created_at <= stale_before,
+            # мера «состарилась» с прошлого запуска
+            *incremental(
+                Measure.created_at > datetime.combine(last_day - timedelta(days=STALE_DAYS), time.min)
+                if since else None
+            ),
+        ],
+        now,
+    )
+
+    # Сводка по новым мерам: одна на день, пересчитывается только при смене дня или новых мерах
+    new_since = datetime.combine(today - timedelta(days=NEW_MEASURES_DAYS), time.min)
+    count = func.count(Measure.id)
+    new_measures = select(
+        literal("new"),
+        literal(None, Integer),
+        literal("Новые меры"),
+        literal("Жаңа шаралар"),
+        "За последние 7 дней добавлено " + _text(count) + " новых мер",
+        "Соңғы 7 күнде " + _text(count) + " жаңа шара қосылды",
+        literal(False),
+        literal(now),
+        literal(today, Date),
+    ).where(Measure.created_at >= new_since).having(count > 0)
+    if since is not None and last_day == today:
+        new_measures = new_measures.having(func.max(Measure.created_at) >= since - CHANGE_OVERLAP)
+    yield new_measures
+
+
+# Возвращает число созданных уведомлений. Коммит остаётся за вызывающим кодом.
+def evaluate_notifications(db: Session, now: datetime = None) -> int:
+    now = now or datetime.utcnow()
+    dialect = db.get_bind().dialect.name
+    insert = dialect_insert(db)
+    state = get_sync_state(db, "notifications")
+
+    created = 0
+    for rule in _rules(dialect, now, state.watermark):
+        stmt = insert(Notification).from_select(NOTIFICATION_COLUMNS, rule).on_conflict_do_nothing()
+        created += db.execute(stmt).rowcount
+
+    state.watermark = now
+    return created
+
+
+def notifications_job(db: Session) -> int:
+    created = evaluate_notifications(db)
+    db.commit()
+    return created
@@ -0,0 +1,293 @@
+import asyncio
+import logging
+import os
+import smtplib
+from datetime import datetime, timedelta
+
+import httpx
+from dotenv import load_dotenv
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from config.mail import SMTP_FROM, SMTP_HOST, SMTP_PASSWORD, SMTP_PORT, SMTP_STARTTLS, build_message
+from config.sms import TELEGRAM_API_URL
+from db import AsyncSessionLocal
+from models.outbox import OutboxMessage
+from services.cache import on_tables_changed
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_WORKER_ENABLED = os.getenv("OUTBOX_WORKER_ENABLED", "1") == "1"
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+# Сколько Telegram-запросов отправляется одновременно через общий HTTP-клиент
+OUTBOX_TELEGRAM_CONCURRENCY = int(os.getenv("OUTBOX_TELEGRAM_CONCURRENCY", "8"))
+# Как часто воркер перепроверяет очередь без сигнала (повторы, сообщения из других процессов)
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "10"))
+OUTBOX_RETRY_MAX_SECONDS = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "3600"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+OUTBOX_SEND_TIMEOUT = float(os.getenv("OUTBOX_SEND_TIMEOUT", "15"))
+# Худший случай для пачки: письма идут по одному SMTP-соединению друг за другом,
+# и каждое может занять две попытки (отправка и повтор после переподключения)
+OUTBOX_BATCH_WORST_SECONDS = OUTBOX_BATCH_SIZE * 2 * OUTBOX_SEND_TIMEOUT
+# Захваченное сообщение снова становится доступным, если воркер упал, не отчитавшись.
+# Аренда не короче худшего времени пачки, иначе живую пачку заберёт другой воркер.
+OUTBOX_LEASE = timedelta(seconds=max(float(os.getenv("OUTBOX_LEASE_SECONDS", "0")), OUTBOX_BATCH_WORST_SECONDS + 60))
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+
+class PermanentDeliveryError(Exception):
+    pass
+
+
+# --- Постановка в очередь (вызывается из обработчиков; коммит остаётся за вызывающим кодом) ---
+
+def enqueue_telegram(db: Session, chat_id: str, text: str) -> OutboxMessage:
+    message = OutboxMessage(channel="telegram", recipient=str(chat_id), body=text)
+    db.add(message)
+    return message
+
+
+def enqueue_email(db: Session, to_email: str, subject: str, body: str) -> OutboxMessage:
+    message = OutboxMessage(channel="email", recipient=to_email, subject=subject, body=body)
+    db.add(message)
+    return message
+
+
+# --- Отправители: одно соединение на весь срок жизни воркера ---
+
+class TelegramSender:
+    def __init__(self, api_url: str = TELEGRAM_API_URL, transport: httpx.AsyncBaseTransport = None):
+        self.api_url = api_url
+        self._transport = transport
+        self._client = None
+        self._semaphore = asyncio.Semaphore(OUTBOX_TELEGRAM_CONCURRENCY)
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(timeout=OUTBOX_SEND_TIMEOUT, transport=self._transport)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._client.aclose()
+
+    async def send(self, message: OutboxMessage):
+        async with self._semaphore:
+            response = await self._client.post(
+                self.api_url,
+                data={"chat_id": message.recipient, "text": message.body, "parse_mode": "HTML"},
+            )
+        if response.status_code == 200:
+            return
+        error = f"Telegram {response.status_code}: {response.text[:500]}"
+        # 429 и 5xx — временные ошибки, остальные 4xx (неверный chat_id и т.п.) повторять бессмысленно
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            raise PermanentDeliveryError(error)
+        raise RuntimeError(error)
+
+
+# smtplib блокирующий, поэтому работа с соединением идёт в отдельном потоке.
+# STARTTLS и вход выполняются один раз; при обрыве соединение открывается заново.
+class EmailSender:
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, starttls: bool = SMTP_STARTTLS,
+                 user: str = SMTP_FROM, password: str = SMTP_PASSWORD):
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.user = user
+        self.password = password
+        self._smtp = None
+        # Одно соединение — письма пачки уходят по нему по очереди
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.to_thread(self._close)
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=OUTBOX_SEND_TIMEOUT)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.password:
+                smtp.login(self.user, self.password)
+        except BaseException:
+            smtp.close()
+            raise
+        self._smtp = smtp
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                self._smtp.close()
+            except OSError:
+                pass
+            self._smtp = None
+
+    def _send(self, message: OutboxMessage):
+        msg = build_message(message.recipient, message.subject or "", message.body)
+        for attempt in range(2):
+            if self._smtp is None:
+                self._connect()
+            try:
+                self._smtp.sendmail(self.user, [message.recipient], msg.as_string())
+                return
+            except smtplib.SMTPRecipientsRefused as e:
+                raise PermanentDeliveryError(str(e))
+            except OSError:
+                # Сервер закрыл простаивающее соединение — переподключаемся один раз
+                self._smtp.close()
+                self._smtp = None
+                if attempt:
+                    raise
+
+    async def send(self, message: OutboxMessage):
+        async with self._lock:
+            await asyncio.to_thread(self._send, message)
+
+
+# --- Воркер ---
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(OUTBOX_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), OUTBOX_RETRY_MAX_SECONDS))
+
+
+# Захват пачки: FOR UPDATE SKIP LOCKED на Postgres не даёт двум воркерам взять одно сообщение,
+# а сдвиг next_attempt_at на OUTBOX_LEASE прячет его от остальных до отчёта о доставке.
+async def claim_batch(db, now: datetime, limit: int = OUTBOX_BATCH_SIZE) -> list:
+    messages = (await db.scalars(
+        select(OutboxMessage)
+        .where(OutboxMessage.status == PENDING, OutboxMessage.next_attempt_at <= now)
+        .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )).all()
+    for message in messages:
+        message.attempts += 1
+        message.next_attempt_at = now + OUTBOX_LEASE
+    await db.commit()
+    return messages
+
+
+async def _deliver(senders: dict, message: OutboxMessage):
+    sender = senders.get(message.channel)
+    if sender is None:
+        raise PermanentDeliveryError(f"Неизвестный канал: {message.channel}")
+    await sender.send(message)
+
+
+# Тексты содержат коды подтверждения: после окончательного статуса они больше не нужны,
+# в строке остаются только канал, получатель, статус и ошибка
+def _clear_payload(message: OutboxMessage):
+    message.subject = None
+    message.body = ""
+
+
+def _record_result(message: OutboxMessage, error, now: datetime):
+    if error is None:
+        message.status = SENT
+        message.sent_at = now
+        message.last_error = None
+        _clear_payload(message)
+        return
+
+    message.last_error = str(error)[:2000]
+    if isinstance(error, PermanentDeliveryError) or message.attempts >= OUTBOX_MAX_ATTEMPTS:
+        message.status = FAILED
+        _clear_payload(message)
+        logger.warning("Сообщение outbox %s не доставлено: %s", message.id, error)
+    else:
+        message.next_attempt_at = now + retry_delay(message.attempts)
+
+
+# Одна итерация: захват, параллельная отправка, запись результатов. Возвращает размер пачки.
+async def deliver_batch(senders: dict, limit: int = OUTBOX_BATCH_SIZE) -> int:
+    async with AsyncSessionLocal() as db:
+        messages = await claim_batch(db, datetime.utcnow(), limit)
+        if not messages:
+            return 0
+
+        results = await asyncio.gather(
+            *(_deliver(senders, message) for message in messages),
+            return_exceptions=True,
+        )
+        now = datetime.utcnow()
+        for message, error in zip(messages, results):
+            _record_result(message, error, now)
+        await db.commit()
+        return len(messages)
+
+
+_wake = None
+_loop = None
+_task = None
+
+
+def _wake_worker(tables):
+    if _loop is not None and _wake is not None:
+        _loop.call_soon_threadsafe(_wake.set)
+
+
+# Коммит с новым сообщением в этом процессе будит воркер сразу
+on_tables_changed([OutboxMessage.__tablename__], _wake_worker)
+
+
+async def run_outbox_worker(senders: dict = None):
+    global _wake, _loop
+    _loop = asyncio.get_running_loop()
+    _wake = asyncio.Event()
+
+    async with TelegramSender() as telegram, EmailSender() as email:
+        senders = senders or {"telegram": telegram, "email": email}
+        while True:
+            _wake.clear()
+            try:
+                delivered = await deliver_batch(senders)
+            except Exception:
+                logger.exception("Ошибка воркера outbox")
+                delivered = 0
+            # Пачка была полной — сразу берём следующую
+            if delivered < OUTBOX_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(_wake.wait(), OUTBOX_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+
+def start_outbox_worker():
+    global _task
+    if OUTBOX_WORKER_ENABLED and _task is None:
+        _task = asyncio.create_task(run_outbox_worker())
+
+
+async def stop_outbox_worker():
+    global _task, _wake, _loop
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    _wake = _loop = None
+
+
+# Задание планировщика: удаляет доставленные и окончательно недоставленные сообщения старше срока хранения
+def outbox_cleanup_job(db: Session) -> int:
+    result = db.execute(
+        delete(OutboxMessage).where(
+            OutboxMessage.status.in_([SENT, FAILED]),
+            OutboxMessage.created_at < datetime.utcnow() - timedelta(days=OUTBOX_RETENTION_DAYS),
+        )
+    )
+    db.commit()
+    return result.rowcount
@@ -0,0 +1,133 @@
+import base64
+import json
+from datetime import date, datetime
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+
+def encode_cursor(values) -> str:
+    payload = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    raw = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, columns) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Некорректный курсор") from e
+
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("Некорректный курсор")
+
+    decoded = []
+    for value, column in zip(values, columns):
+        python_type = column.type.python_type
+        if value is not None and python_type is datetime:
+            value = datetime.fromisoformat(value)
+        elif value is not None and python_type is date:
+            value = date.fromisoformat(value)
+        decoded.append(value)
+    return decoded
+
+
+# Сортировка по (sort_column, id_column) и условие «строго после курсора».
+# NULL в sort_column стоят в конце выдачи (NULLS LAST); nulls_last=False — обратный порядок
+# для движения назад. Без явной ветки для NULL такие строки выпадали бы при переходе через них.
+def apply_keyset(stmt: Select, sort_column, id_column, after=None, descending=True, nulls_last=True) -> Select:
+    if after is not None:
+        sort_value, id_value = after
+        id_after = id_column < id_value if descending else id_column > id_value
+
+        if sort_value is None:
+            # Курсор внутри NULL-хвоста (или перед ним, если NULL идут первыми)
+            clause = and_(sort_column.is_(None), id_after)
+            if not nulls_last:
+                clause = or_(clause, sort_column.is_not(None))
+        else:
+            sort_after = sort_column < sort_value if descending else sort_column > sort_value
+            clause = or_(sort_after, and_(sort_column == sort_value, id_after))
+            if nulls_last:
+                clause = or_(clause, sort_column.is_(None))
+        stmt = stmt.where(clause)
+
+    order = sort_column.desc() if descending else sort_column.asc()
+    order = order.nulls_last() if nulls_last else order.nulls_first()
+    return stmt.order_by(order, id_column.desc() if descending else id_column.asc())
+
+
+def _cursor_of(item, sort_column, id_column) -> str:
+    return encode_cursor([getattr(item, sort_column.key), getattr(item, id_column.key)])
+
+
+# Возвращает (items, next_cursor) для запроса, выбирающего ORM-сущности.
+def keyset_page(db: Session, stmt: Select, sort_column, id_column, cursor=None, limit=50, descending=True):
+    after = decode_cursor(cursor, [sort_column, id_column]) if cursor else None
+    stmt = apply_keyset(stmt, sort_column, id_column, after, descending).limit(limit + 1)
+    items = db.scalars(stmt).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = _cursor_of(items[-1], sort_column, id_column)
+    return items, next_cursor
+
+
+# Страница в обе стороны: после cursor или до before. Возвращает (items, prev_cursor, next_cursor).
+# Стоимость не зависит от глубины страницы — только от limit.
+def keyset_window(db: Session, stmt: Select, sort_column, id_column, cursor=None, before=None, limit=50, descending=True):
+    columns = [sort_column, id_column]
+    if before:
+        # Идём назад: обратный порядок от before, затем разворачиваем
+        stmt = apply_keyset(stmt, sort_column, id_column, decode_cursor(before, columns), not descending, nulls_last=False)
+        items = db.scalars(stmt.limit(limit + 1)).all()
+        has_prev = len(items) > limit
+        items = list(reversed(items[:limit]))
+        has_next = True
+    else:
+        after = decode_cursor(cursor, columns) if cursor else None
+        stmt = apply_keyset(stmt, sort_column, id_column, after, descending)
+        items = db.scalars(stmt.limit(limit + 1)).all()
+        has_next = len(items) > limit
+        items = items[:limit]
+        has_prev = after is not None
+
+    if not items:
+        return items, None, None
+    prev_cursor = _cursor_of(items[0], sort_column, id_column) if has_prev else None
+    next_cursor = _cursor_of(items[-1], sort_column, id_column) if has_next else None
+    return items, prev_cursor, next_cursor
+
+
+# Считает не больше cap строк: возвращает (count, exact). Если совпадений больше cap,
+# возвращается (cap, False) — для поиска точное число на глубоких выборках не нужно.
+def capped_count(db: Session, stmt: Select, cap: int):
+    subquery = stmt.order_by(None).limit(cap + 1).subquery()
+    count = db.scalar(select(func.count()).select_from(subquery))
+    if count > cap:
+        return cap, False
+    return count, True
+
+
+def exact_count(db: Session, stmt: Select) -> int:
+    return db.scalar(select(func.count()).select_from(stmt.order_by(None).subquery()))
+
+
+# Оценка числа строк по статистике планировщика Postgres (EXPLAIN), без обхода таблицы.
+# На других СУБД статистики нет — считаем точно. Возвращает (count, exact).
+def estimated_count(db: Session, stmt: Select, exact_below: int = 0):
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return exact_count(db, stmt), True
+
+    compiled = stmt.order_by(None).compile(dialect=bind.dialect, compile_kwargs={"literal_binds": True})
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}").scalar()
+    estimate = int(plan[0]["Plan"]["Plan Rows"])
+
+    # На малых выборках оценка неточна, а точный подсчёт и так дешёв
+    if estimate < exact_below:
+        return exact_count(db, stmt), True
+    return estimate, False
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from passlib.hash import bcrypt
+
+load_dotenv()
+
+# Стоимость bcrypt для новых хэшей; пароли со старой стоимостью перехэшируются при входе
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+# bcrypt отпускает GIL, поэтому потоков хватает; число потоков — сколько ядер отдаём под хэширование
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(os.cpu_count() or 2, 4))))
+# Сколько операций может одновременно находиться в пуле (в работе и в очереди)
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+
+_hasher = bcrypt.using(rounds=PASSWORD_BCRYPT_ROUNDS)
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_QUEUE_LIMIT)
+_stats_lock = threading.Lock()
+_in_flight = 0
+_rejected = 0
+
+
+def get_password_pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+        return _executor
+
+
+def shutdown_password_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def password_pool_status() -> dict:
+    with _stats_lock:
+        return {
+            "workers": PASSWORD_HASH_WORKERS,
+            "queue_limit": PASSWORD_HASH_QUEUE_LIMIT,
+            "in_flight": _in_flight,
+            "rejected": _rejected,
+            "bcrypt_rounds": PASSWORD_BCRYPT_ROUNDS,
+        }
+
+
+def _release(future):
+    global _in_flight
+    with _stats_lock:
+        _in_flight -= 1
+    _slots.release()
+
+
+def _submit(fn, *args):
+    global _in_flight, _rejected
+    if not _slots.acquire(blocking=False):
+        with _stats_lock:
+            _rejected += 1
+        raise HTTPException(status_code=503, detail="Сервер перегружен запросами входа, попробуйте позже")
+
+    with _stats_lock:
+        _in_flight += 1
+    try:
+        future = get_password_pool().submit(fn, *args)
+    except Exception:
+        _release(None)
+        raise
+    future.add_done_callback(_release)
+    return future
+
+
+def _verify_and_update(password: str, hashed: str):
+    if not bcrypt.verify(password, hashed):
+        return False, None
+    if bcrypt.from_string(hashed).rounds != PASSWORD_BCRYPT_ROUNDS:
+        return True, _hasher.hash(password)
+    return True, None
+
+
+# Возвращает (valid, new_hash): new_hash не None, если хэш нужно сохранить с текущей стоимостью
+async def verify_password(password: str, hashed: str) -> tuple[bool, Optional[str]]:
+    return await asyncio.wrap_future(_submit(_verify_and_update, password, hashed))
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.wrap_future(_submit(_hasher.hash, password))
+
+
+# Для синхронных обработчиков: поток обработчика ждёт результат, а считает пул
+def hash_password_sync(password: str) -> str:
+    return _submit(_hasher.hash, password).result()
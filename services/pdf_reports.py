@@ -0,0 +1,113 @@
+# Функции этого модуля выполняются в процессах пула рендеринга (services/render_pool.py),
+# поэтому принимают только простые сериализуемые данные и возвращают готовые байты PDF.
+from io import BytesIO
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape, letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Table, TableStyle
+
+pdfmetrics.registerFont(TTFont('Arial', 'C:/Windows/Fonts/arial.ttf'))
+
+
+def render_risk_map_pdf(headings: list, rows: list) -> bytes:
+    output = BytesIO()
+    doc = SimpleDocTemplate(output, pagesize=landscape(A4), leftMargin=20, rightMargin=20, topMargin=20, bottomMargin=20)
+
+    style = ParagraphStyle(name='Normal', fontName='Arial', fontSize=8, leading=10)
+
+    wrapped_data = [[Paragraph(str(cell), style) for cell in row] for row in [headings] + rows]
+
+    table = Table(wrapped_data, colWidths=[50, 100, 120, 60, 60, 80, 80, 80], repeatRows=1)
+    table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Arial'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('GRID', (0, 0), (-1, -1), 0.3, colors.grey),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+        ('WORDWRAP', (0, 0), (-1, -1), 'CJK'),
+    ]))
+
+    doc.build([table])
+    return output.getvalue()
+
+
+def render_assets_pdf(headings: list, rows: list, types: list) -> bytes:
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter))
+
+    styles = getSampleStyleSheet()
+    styles['Title'].fontName = 'Arial'
+    styles['Normal'].fontName = 'Arial'
+
+    elements = [Paragraph("Отчет по IT активам", styles['Title'])]
+
+    table = Table([headings] + rows)
+    table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Arial'),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+    elements.append(table)
+
+    fig, ax = plt.subplots()
+    ax.hist(types, bins=max(len(set(types)), 1))
+    ax.set_title("Распределение по типам")
+    img_buffer = BytesIO()
+    fig.savefig(img_buffer, format='png')
+    plt.close(fig)
+    img_buffer.seek(0)
+    elements.append(Image(img_buffer, width=500, height=250))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+# Колонки 2-4 (актив, угроза, уязвимость) переносятся по словам
+RISK_ASSESSMENT_WRAPPED_COLUMNS = (2, 3, 4)
+
+
+def render_risk_assessments_pdf(headings: list, rows: list) -> bytes:
+    output = BytesIO()
+    doc = SimpleDocTemplate(output, pagesize=landscape(A4), leftMargin=20, rightMargin=20, topMargin=20, bottomMargin=20)
+
+    style = ParagraphStyle(
+        name='Normal',
+        fontName='Arial',
+        fontSize=8,
+        leading=10
+    )
+
+    data = [headings]
+    for row in rows:
+        data.append([
+            Paragraph(str(cell), style) if i in RISK_ASSESSMENT_WRAPPED_COLUMNS else cell
+            for i, cell in enumerate(row)
+        ])
+
+    col_widths = [25, 60, 80, 100, 100, 60, 60, 40, 60, 75]
+
+    table = Table(data, colWidths=col_widths, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Arial'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('GRID', (0, 0), (-1, -1), 0.3, colors.grey),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+    ]))
+
+    doc.build([table])
+    return output.getvalue()
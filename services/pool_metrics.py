@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+
+# По скольким последним выдачам соединения считаются перцентили ожидания
+POOL_METRICS_WINDOW = 1000
+
+
+class PoolMetrics:
+    def __init__(self, window: int = POOL_METRICS_WINDOW):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.checkouts = 0
+        self.checkins = 0
+        self.in_use_max = 0
+        self.overflow_max = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    # Вызывается из события checkout: соединение уже выдано и учтено в pool.checkedout()
+    def record_checkout(self, pool):
+        in_use, overflow = pool.checkedout(), pool.overflow()
+        with self._lock:
+            self.checkouts += 1
+            self.in_use_max = max(self.in_use_max, in_use)
+            self.overflow_max = max(self.overflow_max, overflow)
+
+    def record_checkin(self):
+        with self._lock:
+            self.checkins += 1
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.waits += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self._recent.append(seconds)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def record_invalidation(self):
+        with self._lock:
+            self.invalidations += 1
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            data = {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "in_use_max": self.in_use_max,
+                "overflow_max": self.overflow_max,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                # Среднее и максимум — за всё время, перцентили — по последним POOL_METRICS_WINDOW выдачам
+                "wait_avg_ms": round(self.wait_total / self.waits * 1000, 3) if self.waits else 0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+                "wait_p50_ms": _percentile_ms(recent, 0.5),
+                "wait_p95_ms": _percentile_ms(recent, 0.95),
+            }
+
+        # Текущее состояние берём у самого пула: после dispose() это уже новый экземпляр
+        for key, attr in (("size", "size"), ("checked_in", "checkedin"), ("in_use", "checkedout"), ("overflow", "overflow")):
+            if hasattr(pool, attr):
+                data[key] = getattr(pool, attr)()
+        return data
+
+
+def _percentile_ms(values: list, q: float) -> float:
+    if not values:
+        return 0
+    return round(values[min(int(len(values) * q), len(values) - 1)] * 1000, 3)
+
+
+# Ожидание соединения и таймауты измеряются вокруг публичного Pool.connect(): события пула
+# срабатывают уже после выдачи соединения. В ожидание входят и pool_pre_ping, и открытие
+# нового соединения сверх пула. metrics хранится в атрибуте класса и переживает engine.dispose().
+def instrumented_pool_class(base, metrics: PoolMetrics):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = base.connect(self)
+        except sa_exc.TimeoutError:
+            metrics.record_timeout()
+            raise
+        metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+    return type(f"Instrumented{base.__name__}", (base,), {"connect": connect, "metrics": metrics})
+
+
+# Счётчики выдач, занятых и overflow-соединений, новых и признанных мёртвыми (в т.ч. pool_pre_ping)
+# соединений. Слушатели на engine переносятся и на пул, пересозданный engine.dispose().
+def listen_pool_events(engine, metrics: PoolMetrics):
+    event.listen(engine, "checkout", lambda dbapi_connection, record, proxy: metrics.record_checkout(engine.pool))
+    event.listen(engine, "checkin", lambda dbapi_connection, record: metrics.record_checkin())
+    event.listen(engine, "connect", lambda dbapi_connection, record: metrics.record_connect())
+    event.listen(engine, "invalidate", lambda dbapi_connection, record, exception: metrics.record_invalidation())
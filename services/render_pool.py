@@ -0,0 +1,142 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+load_dotenv()
+
+RENDER_POOL_SIZE = int(os.getenv("RENDER_POOL_SIZE", "2"))
+# Сколько заданий может одновременно находиться в пуле (в работе и в очереди)
+RENDER_QUEUE_LIMIT = int(os.getenv("RENDER_QUEUE_LIMIT", "8"))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "120"))
+
+_slots = threading.BoundedSemaphore(RENDER_QUEUE_LIMIT)
+# Свободные места для рабочих процессов
+_capacity = threading.BoundedSemaphore(RENDER_POOL_SIZE)
+_workers_lock = threading.Lock()
+_idle = []
+_busy = set()
+# Потоки, которые ждут ответа от рабочих процессов, не занимая event loop
+_waiters = ThreadPoolExecutor(max_workers=RENDER_QUEUE_LIMIT, thread_name_prefix="render-wait")
+
+
+class _RenderTimeout(Exception):
+    pass
+
+
+def _worker_main(conn):
+    while True:
+        try:
+            fn, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            reply = (True, fn(*args))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # Результат или исключение не сериализуются
+            conn.send((False, RuntimeError(repr(e))))
+
+
+# Рабочий процесс со своим каналом. ProcessPoolExecutor не умеет останавливать
+# уже запущенное задание, а отдельный процесс можно убить по таймауту и заменить.
+class _Worker:
+    def __init__(self):
+        # spawn: рабочие процессы не наследуют соединения с БД и состояние приложения
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def _acquire_worker(deadline: float) -> _Worker:
+    if not _capacity.acquire(timeout=max(deadline - time.monotonic(), 0)):
+        raise _RenderTimeout()
+    with _workers_lock:
+        worker = _idle.pop() if _idle else None
+    try:
+        if worker is not None and not worker.process.is_alive():
+            worker.kill()
+            worker = None
+        if worker is None:
+            worker = _Worker()
+    except BaseException:
+        _capacity.release()
+        raise
+    with _workers_lock:
+        _busy.add(worker)
+    return worker
+
+
+def _release_worker(worker: _Worker, reuse: bool):
+    with _workers_lock:
+        _busy.discard(worker)
+        if reuse:
+            _idle.append(worker)
+    if not reuse:
+        worker.kill()
+    _capacity.release()
+
+
+def _run(fn, args, deadline: float):
+    worker = _acquire_worker(deadline)
+    reuse = False
+    try:
+        worker.conn.send((fn, args))
+        if not worker.conn.poll(max(deadline - time.monotonic(), 0)):
+            # Задание ещё выполняется — процесс убивается вместе с ним
+            raise _RenderTimeout()
+        ok, value = worker.conn.recv()
+        reuse = True
+    except (EOFError, OSError) as e:
+        raise BrokenProcessPool("Процесс рендеринга завершился аварийно") from e
+    finally:
+        _release_worker(worker, reuse)
+    if ok:
+        return value
+    raise value
+
+
+def shutdown_render_pool():
+    with _workers_lock:
+        workers = _idle + list(_busy)
+        _idle.clear()
+    for worker in workers:
+        worker.kill()
+
+
+# fn должна быть функцией уровня модуля, а args — сериализуемыми (pickle)
+async def render(fn, *args) -> bytes:
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(status_code=503, detail="Сервер формирует слишком много отчётов, попробуйте позже")
+
+    # Таймаут считается с постановки в очередь, как и раньше
+    deadline = time.monotonic() + RENDER_TIMEOUT
+    try:
+        future = _waiters.submit(_run, fn, args, deadline)
+    except Exception:
+        _slots.release()
+        raise
+    # Слот освобождается, только когда процесс закончил работу или убит,
+    # даже если клиент уже ушёл.
+    future.add_done_callback(lambda f: _slots.release())
+
+    try:
+        return await asyncio.wrap_future(future)
+    except _RenderTimeout:
+        raise HTTPException(status_code=504, detail="Превышено время формирования отчёта")
@@ -0,0 +1,131 @@
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import false, func, text
+
+from models.risk_map import RiskListEntry
+
+DEPARTMENT_MAP = {
+    'it отдел': {'ru': 'IT отдел', 'kz': 'IT бөлімі'},
+    'it бөлімі': {'ru': 'IT отдел', 'kz': 'IT бөлімі'},
+    'бухгалтерия': {'ru': 'Бухгалтерия', 'kz': 'Бухгалтерия'},
+    'отдел продаж': {'ru': 'Отдел продаж', 'kz': 'Сату бөлімі'},
+    'сату бөлімі': {'ru': 'Отдел продаж', 'kz': 'Сату бөлімі'},
+    'финансовый отдел': {'ru': 'Финансовый отдел', 'kz': 'Қаржы бөлімі'},
+    'қаржы бөлімі': {'ru': 'Финансовый отдел', 'kz': 'Қаржы бөлімі'},
+    'администрация': {'ru': 'Администрация', 'kz': 'Әкімшілік'},
+    'әкімшілік': {'ru': 'Администрация', 'kz': 'Әкімшілік'},
+    'служба поддержка': {'ru': 'Служба поддержка', 'kz': 'Қолдау қызметі'},
+    'қолдау қызметі': {'ru': 'Служба поддержка', 'kz': 'Қолдау қызметі'},
+}
+
+STATUS_MAP = {
+    'новый': {'ru': 'Новый', 'kz': 'Жаңа'},
+    'жаңа': {'ru': 'Новый', 'kz': 'Жаңа'},
+    'в работе': {'ru': 'В работе', 'kz': 'Жұмыс барысында'},
+    'жұмыс барысында': {'ru': 'В работе', 'kz': 'Жұмыс барысында'},
+    'снижен': {'ru': 'Снижен', 'kz': 'Азайтылған'},
+    'азайтылған': {'ru': 'Снижен', 'kz': 'Азайтылған'},
+    'закрыт': {'ru': 'Закрыт', 'kz': 'Жабық'},
+    'жабық': {'ru': 'Закрыт', 'kz': 'Жабық'},
+}
+
+PRIORITY_MAP = {
+    'низкий': {'ru': 'Низкий', 'kz': 'Төмен'},
+    'төмен': {'ru': 'Низкий', 'kz': 'Төмен'},
+    'средний': {'ru': 'Средний', 'kz': 'Орташа'},
+    'орташа': {'ru': 'Средний', 'kz': 'Орташа'},
+    'высокий': {'ru': 'Высокий', 'kz': 'Жоғары'},
+    'жоғары': {'ru': 'Высокий', 'kz': 'Жоғары'},
+    'критический': {'ru': 'Критический', 'kz': 'Шұғыл'},
+    'шұғыл': {'ru': 'Критический', 'kz': 'Шұғыл'},
+}
+
+
+def localize_label(mapping: dict, value, lang: str):
+    key = (value or '').strip().lower()
+    return mapping.get(key, {}).get(lang, value)
+
+
+# Значение фильтра может быть ключом из справочника или подписью на языке lang.
+# Возвращает все хранимые варианты (ru и kz) того же значения.
+def resolve_stored_values(mapping: dict, value: str, lang: str) -> list:
+    needle = value.strip().lower()
+    canonical = {
+        entry['ru'] for key, entry in mapping.items()
+        if key == needle or entry.get(lang, '').lower() == needle
+    }
+    return [key for key, entry in mapping.items() if entry['ru'] in canonical]
+
+
+# Регистронезависимое сравнение строковой колонки. В SQLite lower() юникодная (db.use_unicode_lower),
+# на Postgres по этим выражениям построены индексы (ensure_risk_list_indexes).
+def folded(column):
+    return func.lower(func.trim(column))
+
+
+_PG_INDEX_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_risk_list_entries_{name}_folded ON risk_list_entries (lower(trim({name})))"
+    for name in ("status", "priority", "department")
+]
+
+
+# Только Postgres: индекс по lower() в SQLite зависел бы от подменённой функции соединения
+def ensure_risk_list_indexes(engine):
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for ddl in _PG_INDEX_DDL:
+            conn.execute(text(ddl))
+
+
+def parse_date(value: str):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Некорректная дата: {value}")
+
+
+def date_range_clauses(column, date_from: str = "", date_to: str = "") -> list:
+    clauses = []
+    start, end = parse_date(date_from), parse_date(date_to)
+    if start:
+        clauses.append(column >= datetime.combine(start, time.min))
+    if end:
+        clauses.append(column < datetime.combine(end + timedelta(days=1), time.min))
+    return clauses
+
+
+# Все хранимые написания значения перечислены в справочнике (ключи в нижнем регистре),
+# поэтому таблицу для подбора значений не сканируем
+def _mapped_column_clause(column, mapping: dict, value: str, lang: str):
+    stored = resolve_stored_values(mapping, value, lang)
+    if not stored:
+        return false()
+    return folded(column).in_(stored)
+
+
+def compile_export_filters(
+    lang: str = "ru",
+    type: str = "",
+    department: str = "",
+    status: str = "",
+    priority: str = "",
+    date_from: str = "",
+    date_to: str = "",
+) -> list:
+    clauses = []
+
+    if type:
+        title = func.coalesce(func.nullif(RiskListEntry.title_kz, ''), RiskListEntry.title)
+        clauses.append(func.lower(title).contains(type.lower(), autoescape=True))
+    if department:
+        clauses.append(_mapped_column_clause(RiskListEntry.department, DEPARTMENT_MAP, department, lang))
+    if status:
+        clauses.append(_mapped_column_clause(RiskListEntry.status, STATUS_MAP, status, lang))
+    if priority:
+        clauses.append(_mapped_column_clause(RiskListEntry.priority, PRIORITY_MAP, priority, lang))
+
+    clauses.extend(date_range_clauses(RiskListEntry.created_at, date_from, date_to))
+    return clauses
@@ -0,0 +1,32 @@
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models.risk_map import RiskListEntry
+from services.cache import TTLCache, invalidate_on
+
+load_dotenv()
+
+RISK_TYPE_CACHE_TTL = float(os.getenv("RISK_TYPE_CACHE_TTL", "300"))
+
+_cache = TTLCache(RISK_TYPE_CACHE_TTL)
+invalidate_on(_cache, RiskListEntry.__tablename__)
+
+
+# Каталог типов риска: по одной записи на каждое название (самая ранняя по id)
+def _risk_type_catalogue_query():
+    first_ids = select(func.min(RiskListEntry.id)).group_by(RiskListEntry.title)
+    return (
+        select(RiskListEntry.id, RiskListEntry.title, RiskListEntry.title_kz)
+        .where(RiskListEntry.id.in_(first_ids))
+        .order_by(RiskListEntry.id)
+    )
+
+
+def get_risk_type_catalogue(db: Session) -> list:
+    return _cache.get_or_set(
+        "catalogue",
+        lambda: [dict(row) for row in db.execute(_risk_type_catalogue_query()).mappings()]
+    )
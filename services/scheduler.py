@@ -0,0 +1,239 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from db import SessionLocal, engine
+from models.job_run import JobRun
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+# Ключ advisory-блокировки Postgres; у всех воркеров приложения он должен совпадать
+SCHEDULER_LOCK_KEY = int(os.getenv("SCHEDULER_LOCK_KEY", "724101"))
+SCHEDULER_LOCK_FILE = os.getenv(
+    "SCHEDULER_LOCK_FILE", os.path.join(tempfile.gettempdir(), "irmap_scheduler.lock")
+)
+# Как часто не-лидеры пытаются перехватить лидерство
+SCHEDULER_LEADER_RETRY_SECONDS = int(os.getenv("SCHEDULER_LEADER_RETRY_SECONDS", "60"))
+
+_jobs = {}
+_scheduler = None
+_leader = None
+
+
+# job(db) -> число обработанных строк (или None). Исключение записывается как неуспешный запуск.
+def register_job(name: str, func, **trigger):
+    _jobs[name] = (func, trigger)
+
+
+class _AdvisoryLock:
+    # Сессионная блокировка держится, пока живо соединение, поэтому соединение
+    # выделяется отдельно и не возвращается в пул. Транзакция блокировке не нужна:
+    # в AUTOCOMMIT проверка соединения не оставляет его в состоянии «idle in transaction».
+    def __init__(self, key: int):
+        self.key = key
+        self._conn = None
+
+    def acquire(self) -> bool:
+        if self._conn is not None:
+            try:
+                self._conn.execute(text("SELECT 1"))
+                return True
+            except Exception:
+                logger.warning("Соединение с блокировкой планировщика потеряно", exc_info=True)
+                self.release()
+
+        conn = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}).scalar()
+        except Exception:
+            conn.close()
+            raise
+        if not acquired:
+            conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    def release(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+        except Exception:
+            pass
+        finally:
+            self._conn.close()
+            self._conn = None
+
+
+class _FileLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        if self._file is not None:
+            return True
+        f = open(self.path, "a+")
+        try:
+            _lock_file(f)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            _unlock_file(self._file)
+        except OSError:
+            pass
+        finally:
+            self._file.close()
+            self._file = None
+
+
+try:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock_file(f):
+        fcntl.flock(f, fcntl.LOCK_UN)
+except ImportError:
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _make_leader_lock():
+    if engine.dialect.name == "postgresql":
+        return _AdvisoryLock(SCHEDULER_LOCK_KEY)
+    return _FileLock(SCHEDULER_LOCK_FILE)
+
+
+def is_leader() -> bool:
+    return _leader is not None and _leader.locked
+
+
+class _Leader:
+    def __init__(self, lock):
+        self.lock = lock
+        self.locked = False
+        self._mutex = threading.Lock()
+
+    def check(self) -> bool:
+        with self._mutex:
+            try:
+                locked = self.lock.acquire()
+            except Exception:
+                logger.warning("Не удалось проверить лидерство планировщика", exc_info=True)
+                locked = False
+            if locked and not self.locked:
+                logger.info("Этот процесс стал лидером планировщика")
+            self.locked = locked
+            return locked
+
+    def release(self):
+        with self._mutex:
+            self.lock.release()
+            self.locked = False
+
+
+def _record_start(name: str, started_at: datetime) -> int:
+    db = SessionLocal()
+    try:
+        run = JobRun(job_name=name, status="running", started_at=started_at)
+        db.add(run)
+        db.commit()
+        return run.id
+    finally:
+        db.close()
+
+
+def _record_finish(run_id: int, status: str, duration_ms: int, rows=None, error=None):
+    db = SessionLocal()
+    try:
+        run = db.get(JobRun, run_id)
+        run.status = status
+        run.finished_at = datetime.utcnow()
+        run.duration_ms = duration_ms
+        run.rows = rows
+        run.error = error
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_job(name: str):
+    func, _ = _jobs[name]
+    run_id = _record_start(name, datetime.utcnow())
+    started = time.monotonic()
+
+    # Телеметрия пишется отдельными сессиями, чтобы откат задания её не затронул
+    db = SessionLocal()
+    try:
+        rows = func(db)
+    except Exception:
+        db.rollback()
+        logger.exception("Задание %s завершилось с ошибкой", name)
+        _record_finish(run_id, "failed", int((time.monotonic() - started) * 1000),
+                       error=traceback.format_exc())
+        return
+    finally:
+        db.close()
+
+    _record_finish(run_id, "success", int((time.monotonic() - started) * 1000), rows=rows)
+
+
+def _run_if_leader(name: str):
+    if _leader.check():
+        run_job(name)
+
+
+def start_scheduler():
+    global _scheduler, _leader
+    if not SCHEDULER_ENABLED or _scheduler is not None:
+        return
+
+    _leader = _Leader(_make_leader_lock())
+    _leader.check()
+
+    # Планировщик запускается в каждом воркере, но задания выполняет только держатель
+    # блокировки. Если лидер упадёт, блокировку при следующей проверке заберёт другой воркер.
+    _scheduler = BackgroundScheduler(job_defaults={"coalesce": True, "max_instances": 1})
+    _scheduler.add_job(_leader.check, "interval", seconds=SCHEDULER_LEADER_RETRY_SECONDS,
+                       id="_leader_check")
+    for name, (_, trigger) in _jobs.items():
+        _scheduler.add_job(_run_if_leader, "interval", args=[name], id=name, **trigger)
+    _scheduler.start()
+
+
+def shutdown_scheduler():
+    global _scheduler, _leader
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
+    if _leader is not None:
+        _leader.release()
+        _leader = None
@@ -0,0 +1,11 @@
+from sqlalchemy.orm import Session
+
+from models.sync_state import SyncWatermark
+
+
+def get_sync_state(db: Session, name: str) -> SyncWatermark:
+    state = db.get(SyncWatermark, name)
+    if state is None:
+        state = SyncWatermark(name=name)
+        db.add(state)
+    return state
@@ -0,0 +1,111 @@
+import os
+from typing import BinaryIO, Iterator
+
+import ijson
+from dotenv import load_dotenv
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from models.risk_assessment import ThreatLibrary
+from services.bulk import batches, dialect_insert
+
+load_dotenv()
+
+THREAT_IMPORT_BATCH_SIZE = int(os.getenv("THREAT_IMPORT_BATCH_SIZE", "500"))
+
+# Поля, которые обновляются при повторном импорте; категория, критичность и меры ведутся вручную
+UPDATE_FIELDS = ("name_ru", "name_kz", "description", "description_ru", "description_kz")
+
+_UTF8_BOM = b"\xef\xbb\xbf"
+
+
+# Переведённый файл — JSON-массив объектов, полный STIX-бандл ATT&CK — {"objects": [...]}.
+# Объекты разбираются по одному, поэтому память не зависит от размера файла.
+def iter_attack_objects(f: BinaryIO) -> Iterator[dict]:
+    head = f.read(64)
+    start = len(_UTF8_BOM) if head.startswith(_UTF8_BOM) else 0
+    first = head[start:].lstrip()[:1]
+    f.seek(start)
+
+    prefix = "item" if first == b"[" else "objects.item"
+    return ijson.items(f, prefix, use_float=True)
+
+
+def mitre_id(obj: dict) -> str:
+    for ref in obj.get("external_references", []):
+        if ref.get("source_name") == "mitre-attack":
+            return ref.get("external_id", "")
+    return ""
+
+
+def threat_row(obj: dict):
+    name = obj.get("name")
+    if not name or not mitre_id(obj):
+        return None
+
+    description = obj.get("description")
+    return {
+        "name": name,
+        "name_ru": obj.get("name_ru", name),
+        "name_kz": obj.get("name_kz", name),
+        "description": description,
+        "description_ru": obj.get("description_ru", description),
+        "description_kz": obj.get("description_kz", description),
+        "category": "MITRE ATT&CK",
+        "severity": "medium",
+        "common_controls": [],
+    }
+
+
+def _write_batch(db: Session, rows: list, update: bool) -> int:
+    insert = dialect_insert(db)
+    stmt = insert(ThreatLibrary).values(rows)
+    if update:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ThreatLibrary.name],
+            set_={field: stmt.excluded[field] for field in UPDATE_FIELDS},
+            where=or_(*(
+                getattr(ThreatLibrary, field).is_distinct_from(stmt.excluded[field])
+                for field in UPDATE_FIELDS
+            )),
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[ThreatLibrary.name])
+    return db.execute(stmt).rowcount
+
+
+# update=False: существующие угрозы не трогаем; update=True: обновляем переводы и описания.
+# Коммит остаётся за вызывающим кодом.
+def import_threats(db: Session, f: BinaryIO, update: bool = False, batch_size: int = THREAT_IMPORT_BATCH_SIZE) -> dict:
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "invalid": 0}
+    known = set(db.scalars(select(ThreatLibrary.name)))
+
+    def rows():
+        for obj in iter_attack_objects(f):
+            row = threat_row(obj)
+            if row is None:
+                counts["invalid"] += 1
+            elif row["name"] in known and not update:
+                counts["unchanged"] += 1
+            else:
+                yield row
+
+    for batch in batches(rows(), batch_size):
+        # В одном INSERT ... ON CONFLICT имя не может встречаться дважды
+        by_name = {row["name"]: row for row in batch}
+        new = sum(1 for name in by_name if name not in known)
+        existing = len(by_name) - new
+        counts["unchanged"] += len(batch) - len(by_name)
+
+        written = _write_batch(db, list(by_name.values()), update)
+        known.update(by_name)
+
+        if update:
+            counts["inserted"] += new
+            counts["updated"] += written - new
+            counts["unchanged"] += existing - (written - new)
+        else:
+            counts["inserted"] += written
+            counts["unchanged"] += len(by_name) - written
+
+    return counts
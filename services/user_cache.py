@@ -0,0 +1,48 @@
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from db import AsyncSessionLocal
+from models.user import User
+from services.cache import TTLCache, invalidate_on
+
+load_dotenv()
+
+# Изменения профиля, сделанные другим процессом, станут видны не позже чем через USER_CACHE_TTL секунд
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+_identities = TTLCache(USER_CACHE_TTL)
+# Любой commit в users (профиль, пароль, 2FA) сбрасывает кэш этого процесса
+invalidate_on(_identities, User.__tablename__)
+
+
+# username — субъект сессии (email), его показывает шапка base.html
+def user_identity(subject: str, user: User) -> dict:
+    return {
+        "username": subject,
+        "id": user.id,
+        "email": user.email,
+        "full_name": user.full_name,
+        "phone": user.phone,
+        "position": user.position,
+        "two_fa_method": user.two_fa_method,
+        "created_at": str(user.created_at) if user.created_at else None,
+    }
+
+
+async def resolve_user(subject: str) -> Optional[dict]:
+    identity = _identities.get(subject)
+    if identity is not None:
+        return identity
+
+    async with AsyncSessionLocal() as db:
+        user = await db.scalar(select(User).where(User.email == subject))
+    if user is None:
+        return None
+
+    identity = user_identity(subject, user)
+    if USER_CACHE_TTL > 0:
+        _identities.set(subject, identity)
+    return identity
@@ -0,0 +1,50 @@
+import importlib
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# db.py создаёт движки при импорте: тесты работают с SQLite, а не с боевым Postgres
+_tmp = tempfile.mkdtemp(prefix="irmap_tests_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/irmap.db")
+os.environ.setdefault("EXPORT_CACHE_DIR", os.path.join(_tmp, "export_cache"))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from db import Base, use_unicode_lower
+
+# Все модели должны быть зарегистрированы в Base.metadata до create_all.
+# risk_assessment вызывает create_all при импорте, поэтому таблицы, на которые ссылаются
+# внешние ключи, импортируются раньше.
+MODELS = [
+    "user", "asset", "risk_map", "measure", "risk_assessment",
+    "data_version", "ephemeral", "job_run", "outbox", "sync_state",
+]
+for _module in MODELS:
+    importlib.import_module(f"models.{_module}")
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    use_unicode_lower(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    with Session(engine) as session:
+        yield session
@@ -0,0 +1,92 @@
+from sqlalchemy import select
+
+from models.asset import Asset
+from services.asset_sync import REMOVED_STATUS, RESTORED_STATUS, deactivate_missing_assets, sync_external_assets
+
+
+def glpi(*ids):
+    return [{"external_id": f"glpi-computer-{i}", "name": f"PC-{i}", "type": "Computer"} for i in ids]
+
+
+def status_of(db, external_id):
+    return db.scalar(select(Asset.status).where(Asset.external_id == external_id))
+
+
+def full_sync(db, items):
+    counts = sync_external_assets(db, items)
+    deactivate_missing_assets(db, "Computer", {item["external_id"] for item in items})
+    db.commit()
+    return counts
+
+
+def test_asset_missing_from_full_sync_is_deactivated(db):
+    full_sync(db, glpi(1, 2, 3))
+    full_sync(db, glpi(1, 3))
+
+    assert status_of(db, "glpi-computer-2") == REMOVED_STATUS
+    assert status_of(db, "glpi-computer-1") != REMOVED_STATUS
+
+
+def test_asset_reappearing_in_cmdb_is_reactivated(db):
+    full_sync(db, glpi(1, 2, 3))
+    full_sync(db, glpi(1, 3))
+
+    # Устройство вернулось без изменений имени и типа — при инкрементальной синхронизации
+    counts = sync_external_assets(db, glpi(2))
+    db.commit()
+    db.expire_all()
+
+    assert counts == {"inserted": 0, "updated": 1, "unchanged": 0}
+    assert status_of(db, "glpi-computer-2") == RESTORED_STATUS
+
+
+def test_manual_status_is_kept_on_sync(db):
+    full_sync(db, glpi(1))
+    db.execute(Asset.__table__.update().values(status="Maintenance"))
+    db.commit()
+
+    counts = sync_external_assets(db, [{**glpi(1)[0], "name": "PC-1-renamed"}])
+    db.commit()
+    db.expire_all()
+
+    assert counts["updated"] == 1
+    assert status_of(db, "glpi-computer-1") == "Maintenance"
+
+
+def test_manually_inactivated_asset_stays_inactive(db):
+    full_sync(db, glpi(1, 2))
+    # Пользователь выключил актив в интерфейсе; в CMDB устройство по-прежнему есть
+    db.execute(Asset.__table__.update().where(Asset.external_id == "glpi-computer-1").values(status="Inactive"))
+    db.commit()
+
+    full_sync(db, glpi(1, 2))
+    sync_external_assets(db, [{**glpi(1)[0], "name": "PC-1-renamed"}])
+    db.commit()
+    db.expire_all()
+
+    assert status_of(db, "glpi-computer-1") == "Inactive"
+
+
+def test_manually_inactivated_asset_removed_and_returned_stays_inactive(db):
+    full_sync(db, glpi(1, 2))
+    db.execute(Asset.__table__.update().where(Asset.external_id == "glpi-computer-1").values(status="Inactive"))
+    db.commit()
+
+    full_sync(db, glpi(2))
+    full_sync(db, glpi(1, 2))
+    db.expire_all()
+
+    assert status_of(db, "glpi-computer-1") == "Inactive"
+
+
+def test_returned_asset_with_status_changed_by_user_keeps_it(db):
+    full_sync(db, glpi(1))
+    full_sync(db, [])
+    db.execute(Asset.__table__.update().values(status="Maintenance"))
+    db.commit()
+
+    full_sync(db, glpi(1))
+    db.expire_all()
+
+    assert status_of(db, "glpi-computer-1") == "Maintenance"
+    assert db.scalar(select(Asset.removed_from_cmdb_at)) is None
@@ -0,0 +1,40 @@
+import asyncio
+import threading
+
+import httpx
+from sqlalchemy import event, select
+
+from models.asset import Asset
+from routes.cmdb_import import run_glpi_import
+from services.glpi_client import GLPIClient
+from tests.test_glpi_client import FakeGLPI
+
+
+def glpi_client(server):
+    return GLPIClient("http://glpi.test/apirest.php", "app", "user", page_size=2,
+                      transport=httpx.MockTransport(server))
+
+
+def test_import_keeps_all_orm_work_on_one_thread(engine, db):
+    threads = set()
+    event.listen(engine, "before_cursor_execute", lambda *args: threads.add(threading.get_ident()))
+    server = FakeGLPI({"search/Computer": 5, "search/Monitor": 3, "search/Printer": 0},
+                      first_ids={"search/Monitor": 100})
+
+    result = asyncio.run(run_glpi_import(db, glpi_client(server), full=True))
+
+    assert result["new_assets"] == 8
+    assert result["total_received"] == 8
+    assert len(threads) == 1
+    assert threading.get_ident() not in threads
+    assert db.scalar(select(Asset.name).where(Asset.external_id == "4")) == "search/Computer-4"
+
+
+def test_later_page_error_rolls_back_and_reports(engine, db):
+    server = FakeGLPI({"search/Computer": 6, "search/Monitor": 0, "search/Printer": 0},
+                      fail={("search/Computer", 4): 500})
+
+    result = asyncio.run(run_glpi_import(db, glpi_client(server), full=True))
+
+    assert "search/Computer [4-5]" in result["error"]
+    assert db.scalar(select(Asset.id)) is None
@@ -0,0 +1,182 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models.ephemeral import EphemeralEntry
+from services import ephemeral_store
+from services.ephemeral_store import MemoryStore, RedisStore, SQLStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.start = datetime(2026, 3, 10, 9, 0)
+
+    def monotonic(self):
+        return self.now
+
+    def utcnow(self):
+        return self.start + timedelta(seconds=self.now - 1000.0)
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ephemeral_store, "time", clock)
+    monkeypatch.setattr(ephemeral_store, "datetime", clock)
+    return clock
+
+
+# --- memory ---
+
+def test_memory_value_expires_after_ttl(clock):
+    store = MemoryStore()
+    store.set("code:1", "123456", ttl=30)
+
+    clock.advance(29)
+    assert store.get("code:1") == "123456"
+    clock.advance(1)
+    assert store.get("code:1") is None
+    assert "code:1" not in store._data
+
+
+def test_memory_set_overwrites_and_delete_removes(clock):
+    store = MemoryStore()
+    store.set("k", "old", ttl=10)
+    store.set("k", "new", ttl=10)
+    assert store.get("k") == "new"
+
+    store.delete("k")
+    store.delete("k")
+    assert store.get("k") is None
+
+
+def test_memory_sweep_removes_only_expired_keys(clock):
+    store = MemoryStore()
+    store.set("short", "1", ttl=5)
+    store.set("long", "2", ttl=500)
+
+    clock.advance(10)
+    assert store.sweep() == 1
+    assert list(store._data) == ["long"]
+
+
+def test_memory_set_sweeps_periodically(clock):
+    store = MemoryStore()
+    store.set("short", "1", ttl=5)
+
+    clock.advance(ephemeral_store.MEMORY_SWEEP_SECONDS - 1)
+    store.set("other", "2", ttl=500)
+    assert "short" in store._data
+
+    clock.advance(1)
+    store.set("another", "3", ttl=500)
+    assert sorted(store._data) == ["another", "other"]
+
+
+# --- sql ---
+
+@pytest.fixture
+def sql_store(engine):
+    return SQLStore(lambda: Session(engine))
+
+
+def test_sql_upsert_replaces_value_and_ttl(sql_store, db, clock):
+    sql_store.set("code:1", "111111", ttl=10)
+    clock.advance(5)
+    sql_store.set("code:1", "222222", ttl=60)
+
+    assert db.scalar(select(func.count()).select_from(EphemeralEntry)) == 1
+    clock.advance(30)
+    assert sql_store.get("code:1") == "222222"
+
+
+def test_sql_value_expires_before_sweep(sql_store, db, clock):
+    sql_store.set("code:1", "123456", ttl=30)
+
+    clock.advance(30)
+    assert sql_store.get("code:1") is None
+    # Строка ещё лежит в таблице — её удалит задание ephemeral_sweep
+    assert db.scalar(select(func.count()).select_from(EphemeralEntry)) == 1
+
+
+def test_sql_sweep_deletes_only_expired_rows(sql_store, db, clock):
+    sql_store.set("short", "1", ttl=5)
+    sql_store.set("long", "2", ttl=500)
+    sql_store.set("gone", "3", ttl=500)
+    sql_store.delete("gone")
+
+    clock.advance(10)
+    assert sql_store.sweep() == 1
+    assert db.scalars(select(EphemeralEntry.key)).all() == ["long"]
+
+
+# --- redis ---
+
+class FakeRedis:
+    """Подмножество команд redis-py с истечением по часам теста."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+
+    def set(self, key, value, px):
+        self.data[key] = (value, self.clock.monotonic() + px / 1000)
+
+    def get(self, key):
+        value, expires_at = self.data.get(key, (None, 0))
+        return value if expires_at > self.clock.monotonic() else None
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def test_redis_store_prefixes_keys_and_passes_ttl_to_server(clock):
+    client = FakeRedis(clock)
+    store = RedisStore(prefix="irmap:", client=client)
+
+    store.set("code:1", "123456", ttl=30)
+    assert list(client.data) == ["irmap:code:1"]
+    assert client.data["irmap:code:1"] == ("123456", clock.monotonic() + 30)
+
+    clock.advance(29)
+    assert store.get("code:1") == "123456"
+    clock.advance(1)
+    assert store.get("code:1") is None
+
+
+def test_redis_store_rounds_tiny_ttl_up_and_deletes(clock):
+    client = FakeRedis(clock)
+    store = RedisStore(prefix="p:", client=client)
+
+    store.set("k", "v", ttl=0.0001)
+    assert client.data["p:k"] == ("v", clock.monotonic() + 0.001)
+    store.delete("k")
+    assert client.data == {}
+    # Срок жизни ключей в Redis отслеживает сам сервер
+    assert store.sweep() == 0
+
+
+# --- выбор backend ---
+
+@pytest.mark.parametrize("name, backend", [("memory", MemoryStore), ("sql", SQLStore)])
+def test_store_backend_is_chosen_by_setting(monkeypatch, name, backend):
+    monkeypatch.setattr(ephemeral_store, "EPHEMERAL_STORE", name)
+    monkeypatch.setattr(ephemeral_store, "_store", None)
+
+    store = ephemeral_store.get_ephemeral_store()
+    assert isinstance(store, backend)
+    assert ephemeral_store.get_ephemeral_store() is store
+
+
+def test_unknown_store_backend_is_rejected(monkeypatch):
+    monkeypatch.setattr(ephemeral_store, "EPHEMERAL_STORE", "memcached")
+    monkeypatch.setattr(ephemeral_store, "_store", None)
+
+    with pytest.raises(ValueError):
+        ephemeral_store.get_ephemeral_store()
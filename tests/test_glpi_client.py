@@ -0,0 +1,110 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.glpi_client import GLPIClient, GLPIError
+
+
+class FakeGLPI:
+    """GLPI REST API в памяти: отдаёт диапазоны range с заголовком Content-Range."""
+
+    def __init__(self, totals, fail=None, delay=0, first_ids=None):
+        self.totals = totals
+        self.first_ids = first_ids or {}
+        self.fail = fail or {}
+        self.delay = delay
+        self.ranges = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.killed = False
+
+    async def __call__(self, request):
+        path = request.url.path.removeprefix("/apirest.php/")
+        if path == "initSession":
+            return httpx.Response(200, json={"session_token": "s1"})
+        if path == "killSession":
+            self.killed = True
+            return httpx.Response(200, json=[])
+
+        assert request.headers["Session-Token"] == "s1"
+        start, end = map(int, request.url.params["range"].split("-"))
+        self.ranges.append((path, start))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+
+        if (path, start) in self.fail:
+            return httpx.Response(self.fail[(path, start)], text="ERROR_RANGE_EXCEED_TOTAL")
+        total = self.totals[path]
+        end = min(end, total - 1)
+        first_id = self.first_ids.get(path, 0)
+        data = [{"2": first_id + i, "1": f"{path}-{i}"} for i in range(start, end + 1)]
+        return httpx.Response(206 if end < total - 1 else 200, json={"data": data},
+                              headers={"Content-Range": f"{start}-{end}/{total}"})
+
+
+def collect(server, requests, page_size=3, concurrency=4):
+    async def run():
+        client = GLPIClient("http://glpi.test/apirest.php", "app", "user", page_size=page_size,
+                            concurrency=concurrency, transport=httpx.MockTransport(server))
+        pages = []
+        async with client as glpi:
+            async for key, items in glpi.iter_pages(requests):
+                pages.append((key, items))
+        return pages
+
+    return asyncio.run(run())
+
+
+def ids(pages, key):
+    return sorted(item["2"] for page_key, items in pages if page_key == key for item in items)
+
+
+def test_pages_follow_content_range_total():
+    server = FakeGLPI({"search/Computer": 8, "search/Monitor": 2})
+
+    pages = collect(server, {"Computer": ("search/Computer", {}), "Monitor": ("search/Monitor", {})})
+
+    assert ids(pages, "Computer") == list(range(8))
+    assert ids(pages, "Monitor") == [0, 1]
+    assert sorted(start for path, start in server.ranges if path == "search/Computer") == [0, 3, 6]
+    assert [start for path, start in server.ranges if path == "search/Monitor"] == [0]
+    assert server.killed
+
+
+def test_remaining_pages_are_fetched_concurrently_within_limit():
+    server = FakeGLPI({"search/Computer": 30}, delay=0.02)
+
+    pages = collect(server, {"Computer": ("search/Computer", {})}, page_size=3, concurrency=3)
+
+    assert ids(pages, "Computer") == list(range(30))
+    assert server.max_in_flight == 3
+
+
+def test_first_page_error_skips_only_that_type():
+    server = FakeGLPI({"search/Computer": 4, "search/Printer": 4}, fail={("search/Printer", 0): 400})
+
+    pages = collect(server, {"Computer": ("search/Computer", {}), "Printer": ("search/Printer", {})})
+
+    assert ids(pages, "Computer") == [0, 1, 2, 3]
+    assert ids(pages, "Printer") == []
+
+
+def test_later_page_error_fails_the_whole_import():
+    server = FakeGLPI({"search/Computer": 9}, fail={("search/Computer", 3): 500})
+
+    with pytest.raises(GLPIError, match=r"search/Computer \[3-5\]"):
+        collect(server, {"Computer": ("search/Computer", {})})
+    assert server.killed
+
+
+def test_failed_session_init_raises():
+    def server(request):
+        return httpx.Response(401, text="ERROR_GLPI_LOGIN_USER_TOKEN")
+
+    with pytest.raises(GLPIError, match="session init"):
+        collect(server, {"Computer": ("search/Computer", {})})
@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import event
+
+from models.measure import Measure
+from models.risk_map import RiskListEntry
+from routes.measure import list_measures
+
+
+def add_measures(db, count, risk_types=4):
+    types = [
+        RiskListEntry(title=f"Тип {i}", title_kz=f"Түрі {i}", likelihood=1, impact=1, priority="Низкий", status="Новый")
+        for i in range(risk_types)
+    ]
+    db.add_all(types)
+    db.flush()
+    db.add_all([
+        Measure(title=f"Мера {i}", title_kz=f"Шара {i}", description="",
+                status="Новая", risk_type_id=types[i % risk_types].id if i % 5 else None)
+        for i in range(count)
+    ])
+    db.commit()
+    db.expunge_all()
+
+
+def count_statements(engine, fn):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return result, len(statements)
+
+
+@pytest.mark.parametrize("count", [3, 60])
+def test_measure_list_runs_one_statement_regardless_of_row_count(engine, db, count):
+    add_measures(db, count)
+
+    measures, statements = count_statements(engine, lambda: list_measures(db))
+
+    assert len(measures) == count
+    assert statements == 1
+
+
+def test_measure_list_serializes_risk_type_titles(db):
+    add_measures(db, 10, risk_types=2)
+
+    measures = list_measures(db)
+
+    without_type = [m for m in measures if m.risk_type_id is None]
+    with_type = [m for m in measures if m.risk_type_id is not None]
+    assert {m.risk_type_name for m in without_type} == {None}
+    assert {m.risk_type_name for m in with_type} == {"Тип 0", "Тип 1"}
+    assert {m.risk_type_name_kz for m in with_type} == {"Түрі 0", "Түрі 1"}
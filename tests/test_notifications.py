@@ -0,0 +1,94 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import select
+
+from models.measure import Measure, Notification
+from services.notifications import evaluate_notifications
+
+DAY_ONE = datetime(2026, 3, 10, 9, 0)
+CREATED = datetime(2026, 3, 8, 12, 0)
+
+
+def measure(title, status="in_progress", responsible="Иванов", due_date=None, created_at=CREATED):
+    # updated_at задаётся явно: по умолчанию это текущее время, и мера выглядела бы изменённой
+    return Measure(title=title, title_kz=title, status=status, responsible=responsible,
+                   due_date=due_date, created_at=created_at, updated_at=created_at)
+
+
+@pytest.fixture
+def measures(db):
+    rows = {
+        "overdue": measure("Просроченная", due_date=date(2026, 3, 5)),
+        "upcoming": measure("Скоро срок", due_date=date(2026, 3, 12)),
+        "far": measure("Срок через 4 дня", due_date=date(2026, 3, 14)),
+        "no_responsible": measure("Без ответственного", responsible=None),
+        "stale": measure("Давно новая", status="new", created_at=datetime(2026, 3, 1, 8, 0)),
+        "done": measure("Завершённая", status="completed", due_date=date(2026, 3, 1)),
+    }
+    db.add_all(rows.values())
+    db.commit()
+    return rows
+
+
+def run(db, now):
+    created = evaluate_notifications(db, now)
+    db.commit()
+    return created
+
+
+def notifications(db, day=None):
+    stmt = select(Notification.type, Measure.title, Notification.message_ru).outerjoin(Measure)
+    if day:
+        stmt = stmt.where(Notification.day == day)
+    return sorted(db.execute(stmt).all(), key=lambda row: (row.type, row.title or ""))
+
+
+def test_first_run_creates_notifications(db, measures):
+    assert run(db, DAY_ONE) == 5
+
+    assert [(row.type, row.title) for row in notifications(db)] == [
+        ("new", None),
+        ("no_responsible", "Без ответственного"),
+        ("overdue", "Просроченная"),
+        ("stale", "Давно новая"),
+        ("upcoming", "Скоро срок"),
+    ]
+    messages = {row.type: row.message_ru for row in notifications(db)}
+    assert messages["upcoming"] == 'Мера "Скоро срок" истекает через 2 дня (до 2026-03-12)'
+    assert messages["new"] == "За последние 7 дней добавлено 5 новых мер"
+    assert messages["stale"] == 'Мера "Давно новая" уже 9 дней в статусе "Новая"'
+
+
+def test_second_run_the_same_day_inserts_nothing(db, measures):
+    run(db, DAY_ONE)
+
+    assert run(db, DAY_ONE.replace(hour=15)) == 0
+    assert len(notifications(db)) == 5
+
+
+def test_next_day_run_catches_deadline_crossing_the_threshold(db, measures):
+    run(db, DAY_ONE)
+
+    next_day = datetime(2026, 3, 11, 9, 0)
+    assert run(db, next_day) == 2
+
+    rows = notifications(db, day=next_day.date())
+    assert [(row.type, row.title) for row in rows] == [("new", None), ("upcoming", "Срок через 4 дня")]
+    assert rows[1].message_ru == 'Мера "Срок через 4 дня" истекает через 3 дня (до 2026-03-14)'
+
+
+def test_run_after_watermark_reevaluates_only_changed_measures(db, measures):
+    run(db, DAY_ONE)
+    run(db, datetime(2026, 3, 11, 9, 0))
+
+    changed_at = datetime(2026, 3, 11, 11, 0)
+    far = measures["far"]
+    far.responsible = None
+    far.updated_at = changed_at
+    db.commit()
+
+    assert run(db, datetime(2026, 3, 11, 12, 0)) == 1
+    rows = [(row.type, row.title) for row in notifications(db) if row.type == "no_responsible"]
+    # «Без ответственного» не изменилась — повторно не оценивается
+    assert rows == [("no_responsible", "Без ответственного"), ("no_responsible", "Срок через 4 дня")]
@@ -0,0 +1,237 @@
+import asyncio
+import socket
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+import db
+from models.outbox import OutboxMessage
+from services import outbox
+
+
+class FakeSender:
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+
+    async def send(self, message):
+        if self.error:
+            raise self.error
+        self.sent.append((message.recipient, message.subject, message.body))
+
+
+@pytest.fixture
+def queue():
+    # deliver_batch работает через AsyncSessionLocal приложения
+    db.Base.metadata.create_all(db.engine, tables=[OutboxMessage.__table__])
+    yield
+    with db.SessionLocal() as session:
+        session.execute(OutboxMessage.__table__.delete())
+        session.commit()
+
+
+def stored_messages():
+    with db.SessionLocal() as session:
+        return session.scalars(select(OutboxMessage).order_by(OutboxMessage.id)).all()
+
+
+def test_delivered_message_payload_is_cleared(queue):
+    with db.SessionLocal() as session:
+        outbox.enqueue_telegram(session, "42", "Ваш код: 123456")
+        outbox.enqueue_email(session, "user@example.com", "Код подтверждения", "Ваш код: 654321")
+        session.commit()
+
+    telegram, email = FakeSender(), FakeSender()
+    delivered = asyncio.run(outbox.deliver_batch({"telegram": telegram, "email": email}))
+
+    assert delivered == 2
+    assert telegram.sent == [("42", None, "Ваш код: 123456")]
+    assert email.sent == [("user@example.com", "Код подтверждения", "Ваш код: 654321")]
+    for message in stored_messages():
+        assert message.status == outbox.SENT
+        assert message.body == ""
+        assert message.subject is None
+
+
+def test_permanently_failed_message_payload_is_cleared(queue):
+    with db.SessionLocal() as session:
+        outbox.enqueue_telegram(session, "bad", "Ваш код: 123456")
+        session.commit()
+
+    asyncio.run(outbox.deliver_batch({"telegram": FakeSender(outbox.PermanentDeliveryError("chat not found"))}))
+
+    [message] = stored_messages()
+    assert message.status == outbox.FAILED
+    assert message.body == ""
+    assert message.last_error == "chat not found"
+
+
+def test_message_pending_retry_keeps_payload(queue):
+    with db.SessionLocal() as session:
+        outbox.enqueue_telegram(session, "42", "Ваш код: 123456")
+        session.commit()
+
+    asyncio.run(outbox.deliver_batch({"telegram": FakeSender(RuntimeError("Telegram 502"))}))
+
+    [message] = stored_messages()
+    assert message.status == outbox.PENDING
+    assert message.body == "Ваш код: 123456"
+
+
+def test_lease_covers_worst_case_batch():
+    assert outbox.OUTBOX_LEASE.total_seconds() >= outbox.OUTBOX_BATCH_SIZE * outbox.OUTBOX_SEND_TIMEOUT
+
+
+# --- TelegramSender поверх httpx.MockTransport ---
+
+def telegram_send(status_code, text="ok"):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(status_code, text=text)
+
+    async def run():
+        async with outbox.TelegramSender("https://telegram.test/sendMessage", transport=httpx.MockTransport(handler)) as sender:
+            await sender.send(OutboxMessage(channel="telegram", recipient="42", body="Ваш код: 123456"))
+
+    asyncio.run(run())
+    return requests
+
+
+def test_telegram_sender_posts_message():
+    [request] = telegram_send(200)
+    assert request.url == "https://telegram.test/sendMessage"
+    form = parse_qs(request.content.decode())
+    assert form == {"chat_id": ["42"], "text": ["Ваш код: 123456"], "parse_mode": ["HTML"]}
+
+
+@pytest.mark.parametrize("status_code", [429, 500, 502])
+def test_telegram_rate_limit_and_server_errors_are_retried(status_code):
+    with pytest.raises(RuntimeError) as excinfo:
+        telegram_send(status_code, "Too Many Requests")
+    assert not isinstance(excinfo.value, outbox.PermanentDeliveryError)
+    assert str(excinfo.value).startswith(f"Telegram {status_code}")
+
+
+@pytest.mark.parametrize("status_code", [400, 403, 404])
+def test_telegram_client_errors_are_permanent(status_code):
+    with pytest.raises(outbox.PermanentDeliveryError):
+        telegram_send(status_code, "Bad Request: chat not found")
+
+
+def test_telegram_status_decides_message_fate(queue):
+    with db.SessionLocal() as session:
+        outbox.enqueue_telegram(session, "1", "a")
+        outbox.enqueue_telegram(session, "2", "b")
+        session.commit()
+
+    def handler(request):
+        chat_id = parse_qs(request.content.decode())["chat_id"][0]
+        return httpx.Response(429 if chat_id == "1" else 400, text="error")
+
+    async def run():
+        async with outbox.TelegramSender("https://telegram.test/sendMessage", transport=httpx.MockTransport(handler)) as sender:
+            await outbox.deliver_batch({"telegram": sender})
+
+    asyncio.run(run())
+
+    retried, failed = stored_messages()
+    assert (retried.status, retried.body) == (outbox.PENDING, "a")
+    assert (failed.status, failed.body) == (outbox.FAILED, "")
+
+
+# --- EmailSender против настоящего SMTP-сервера (aiosmtpd в отдельном потоке) ---
+
+class SmtpSink:
+    def __init__(self):
+        self.messages = []
+        self.refused = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refused:
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.mail_from, envelope.rcpt_tos, envelope.content.decode()))
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+    sink = SmtpSink()
+    port = free_port()
+
+    def start():
+        controller = controller_module.Controller(sink, hostname="127.0.0.1", port=port)
+        controller.start()
+        return controller
+
+    server = {"sink": sink, "port": port, "start": start, "controller": start()}
+    yield server
+    server["controller"].stop()
+
+
+def email_sender(port):
+    return outbox.EmailSender(host="127.0.0.1", port=port, starttls=False, user="noreply@example.com", password="")
+
+
+def email(to, body):
+    return OutboxMessage(channel="email", recipient=to, subject="Код подтверждения", body=body)
+
+
+@pytest.fixture
+def connects(monkeypatch):
+    calls = []
+    original_connect = outbox.EmailSender._connect
+    monkeypatch.setattr(outbox.EmailSender, "_connect", lambda self: (calls.append(1), original_connect(self)))
+    return calls
+
+
+def test_email_sender_reuses_one_connection(smtp_server, connects):
+
+    async def run():
+        async with email_sender(smtp_server["port"]) as sender:
+            await asyncio.gather(sender.send(email("a@example.com", "код 1")), sender.send(email("b@example.com", "код 2")))
+
+    asyncio.run(run())
+
+    assert len(connects) == 1
+    assert sorted(rcpt for _, [rcpt], _ in smtp_server["sink"].messages) == ["a@example.com", "b@example.com"]
+
+
+def test_email_sender_reconnects_after_server_restart(smtp_server, connects):
+    async def run():
+        async with email_sender(smtp_server["port"]) as sender:
+            await sender.send(email("a@example.com", "код 1"))
+            # Сервер перезапустился — старое соединение оборвано
+            await asyncio.to_thread(smtp_server["controller"].stop)
+            smtp_server["controller"] = smtp_server["start"]()
+            await sender.send(email("b@example.com", "код 2"))
+
+    asyncio.run(run())
+
+    assert len(connects) == 2
+    assert [rcpt for _, [rcpt], _ in smtp_server["sink"].messages] == ["a@example.com", "b@example.com"]
+
+
+def test_email_sender_reports_refused_recipient_as_permanent(smtp_server):
+    smtp_server["sink"].refused.add("nobody@example.com")
+
+    async def run():
+        async with email_sender(smtp_server["port"]) as sender:
+            await sender.send(email("nobody@example.com", "код"))
+
+    with pytest.raises(outbox.PermanentDeliveryError):
+        asyncio.run(run())
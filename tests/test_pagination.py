@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import select
+
+from models.asset import Asset
+from services.pagination import keyset_page, keyset_window
+
+NAMES = ["Alpha", None, "Beta", "alpha", None, "Gamma", "Beta", None]
+TYPES = ["Server", "Computer", None, "Server", None]
+
+
+@pytest.fixture
+def assets(db):
+    db.add_all([
+        Asset(name=NAMES[i % len(NAMES)], type=TYPES[i % len(TYPES)], source="manual")
+        for i in range(30)
+    ])
+    db.commit()
+    return db.scalars(select(Asset.id)).all()
+
+
+def walk_forward(db, sort_column, descending, limit=4):
+    ids, cursor = [], None
+    while True:
+        items, _, next_cursor = keyset_window(
+            db, select(Asset), sort_column, Asset.id, cursor=cursor, limit=limit, descending=descending
+        )
+        ids += [item.id for item in items]
+        if next_cursor is None:
+            return ids
+        cursor = next_cursor
+
+
+@pytest.mark.parametrize("sort_column", [Asset.name, Asset.type])
+@pytest.mark.parametrize("descending", [True, False])
+def test_keyset_window_returns_rows_with_null_sort_values_once(db, assets, sort_column, descending):
+    ids = walk_forward(db, sort_column, descending)
+
+    assert sorted(ids) == sorted(assets)
+    assert len(ids) == len(set(ids))
+
+
+@pytest.mark.parametrize("sort_column", [Asset.name, Asset.type])
+@pytest.mark.parametrize("descending", [True, False])
+def test_keyset_window_walks_back_through_null_sort_values(db, assets, sort_column, descending):
+    forward = walk_forward(db, sort_column, descending)
+
+    # Доходим до последней страницы, затем возвращаемся по prev-курсорам
+    cursor = None
+    while True:
+        items, prev_cursor, next_cursor = keyset_window(
+            db, select(Asset), sort_column, Asset.id, cursor=cursor, limit=4, descending=descending
+        )
+        if next_cursor is None:
+            break
+        cursor = next_cursor
+
+    backward = [item.id for item in items]
+    while prev_cursor:
+        items, prev_cursor, _ = keyset_window(
+            db, select(Asset), sort_column, Asset.id, before=prev_cursor, limit=4, descending=descending
+        )
+        backward = [item.id for item in items] + backward
+
+    assert backward == forward
+
+
+def test_keyset_page_returns_rows_with_null_sort_values_once(db, assets):
+    ids, cursor = [], None
+    while True:
+        items, cursor = keyset_page(db, select(Asset), Asset.name, Asset.id, cursor=cursor, limit=7)
+        ids += [item.id for item in items]
+        if cursor is None:
+            break
+
+    assert sorted(ids) == sorted(assets)
+    assert len(ids) == len(set(ids))
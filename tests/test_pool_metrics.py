@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.pool import QueuePool
+
+from services.pool_metrics import PoolMetrics, instrumented_pool_class, listen_pool_events
+
+
+@pytest.fixture
+def metered(tmp_path):
+    metrics = PoolMetrics()
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=instrumented_pool_class(QueuePool, metrics),
+        pool_size=1,
+        max_overflow=1,
+        pool_timeout=0.05,
+    )
+    listen_pool_events(engine, metrics)
+    yield engine, metrics
+    engine.dispose()
+
+
+def test_in_use_overflow_and_timeouts(metered):
+    engine, metrics = metered
+
+    first, second = engine.connect(), engine.connect()
+    with pytest.raises(sa_exc.TimeoutError):
+        engine.connect()
+
+    busy = metrics.snapshot(engine.pool)
+    assert busy["in_use"] == 2
+    assert busy["overflow"] == 1
+    assert busy["timeouts"] == 1
+
+    first.close()
+    second.close()
+    idle = metrics.snapshot(engine.pool)
+    assert idle["in_use"] == 0
+    assert idle["in_use_max"] == 2
+    assert idle["overflow_max"] == 1
+    assert idle["checkouts"] == idle["checkins"] == 2
+    assert idle["connects"] == 2
+    assert idle["wait_max_ms"] >= idle["wait_p50_ms"] > 0
+
+
+def test_metrics_survive_dispose(metered):
+    engine, metrics = metered
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    engine.dispose()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    snapshot = metrics.snapshot(engine.pool)
+    assert snapshot["checkouts"] == 2
+    assert snapshot["connects"] == 2
+    assert snapshot["in_use"] == 0
+
+
+def test_wait_stats_past_the_window():
+    metrics = PoolMetrics(window=10)
+    for _ in range(100):
+        metrics.record_wait(0.001)
+    metrics.record_wait(0.003)
+
+    snapshot = metrics.snapshot(pool=None)
+    assert snapshot["wait_avg_ms"] == pytest.approx(1.0198, abs=1e-3)
+    assert snapshot["wait_max_ms"] == 3.0
+    assert snapshot["wait_p50_ms"] == 1.0
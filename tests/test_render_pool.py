@@ -0,0 +1,58 @@
+import asyncio
+import multiprocessing
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from services import render_pool
+
+
+@pytest.fixture
+def pool():
+    yield render_pool
+    render_pool.shutdown_render_pool()
+
+
+def test_render_returns_result_and_reraises_errors(pool):
+    assert asyncio.run(pool.render(pow, 2, 10)) == 1024
+    with pytest.raises(ValueError):
+        asyncio.run(pool.render(int, "не число"))
+    # Ошибка задания не ломает процесс — он остаётся в пуле
+    assert len(pool._idle) == 1
+
+
+def test_job_past_timeout_is_killed_and_worker_replaced(pool, monkeypatch):
+    monkeypatch.setattr(pool, "RENDER_TIMEOUT", 3)
+    asyncio.run(pool.render(pow, 2, 1))
+    [worker] = pool._idle
+
+    started = time.monotonic()
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(pool.render(time.sleep, 60))
+
+    assert excinfo.value.status_code == 504
+    assert time.monotonic() - started < 10
+    # Процесс с зависшим заданием убит, а не продолжает занимать CPU
+    assert not worker.process.is_alive()
+    assert not pool._busy and not pool._idle
+    assert multiprocessing.active_children() == []
+    assert pool._slots._value == pool.RENDER_QUEUE_LIMIT
+
+    # Следующее задание получает новый процесс
+    assert asyncio.run(pool.render(pow, 3, 2)) == 9
+    assert len(pool._idle) == 1 and pool._idle[0] is not worker
+
+
+def test_full_queue_is_rejected(pool, monkeypatch):
+    monkeypatch.setattr(pool, "_slots", type(pool._slots)(1))
+
+    async def run():
+        first = asyncio.ensure_future(pool.render(time.sleep, 1))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as excinfo:
+            await pool.render(pow, 2, 2)
+        await first
+        return excinfo.value.status_code
+
+    assert asyncio.run(run()) == 503
@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy import event, func, select
+
+from models.risk_map import RiskListEntry
+from services.risk_map_filters import compile_export_filters, folded
+
+
+@pytest.fixture
+def risks(db):
+    rows = [
+        ("Новый", "Высокий", "IT отдел"),
+        ("Новый", "Низкий", "Бухгалтерия"),
+        ("В работе", "Высокий", "IT отдел"),
+        ("Жаңа", "Жоғары", "IT бөлімі"),
+        ("Закрыт", "Средний", None),
+    ]
+    db.add_all([
+        RiskListEntry(title=f"Риск {i}", title_kz=f"Тәуекел {i}", likelihood=3, impact=3,
+                      status=status, priority=priority, department=department)
+        for i, (status, priority, department) in enumerate(rows)
+    ])
+    db.commit()
+
+
+def filtered_titles(db, column, value):
+    # То же условие, что строит get_risk_list
+    stmt = select(RiskListEntry.title).where(folded(column) == value.strip().lower())
+    return sorted(db.scalars(stmt))
+
+
+def test_sqlite_lower_folds_cyrillic(db):
+    # Встроенная lower() SQLite складывает только ASCII; db.use_unicode_lower подменяет её
+    assert db.scalar(select(func.lower("Новый ВЫСОКИЙ Жаңа"))) == "новый высокий жаңа"
+
+
+@pytest.mark.parametrize("value", ["новый", "НОВЫЙ", " Новый "])
+def test_status_filter_matches_cyrillic_values_case_insensitively(db, risks, value):
+    assert filtered_titles(db, RiskListEntry.status, value) == ["Риск 0", "Риск 1"]
+
+
+def test_priority_and_department_filters(db, risks):
+    assert filtered_titles(db, RiskListEntry.priority, "высокий") == ["Риск 0", "Риск 2"]
+    assert filtered_titles(db, RiskListEntry.department, "it отдел") == ["Риск 0", "Риск 2"]
+
+
+def test_unknown_value_matches_nothing(db, risks):
+    assert filtered_titles(db, RiskListEntry.status, "нет такого") == []
+
+
+def test_title_search_is_case_insensitive_for_cyrillic(db, risks):
+    stmt = select(RiskListEntry.title).where(func.lower(RiskListEntry.title).contains("РИСК 3".lower(), autoescape=True))
+    assert list(db.scalars(stmt)) == ["Риск 3"]
+
+
+def exported_titles(db, **filters):
+    stmt = select(RiskListEntry.title).where(*compile_export_filters(**filters))
+    return sorted(db.scalars(stmt))
+
+
+@pytest.mark.parametrize("lang, status", [("ru", "Новый"), ("ru", "новый"), ("kz", "ЖАҢА")])
+def test_export_status_filter_matches_both_languages(db, risks, lang, status):
+    # Статус сохранён и на русском, и на казахском — фильтр находит оба варианта
+    assert exported_titles(db, lang=lang, status=status) == ["Риск 0", "Риск 1", "Риск 3"]
+
+
+def test_export_priority_and_department_filters(db, risks):
+    assert exported_titles(db, priority="Высокий") == ["Риск 0", "Риск 2", "Риск 3"]
+    assert exported_titles(db, lang="kz", department="IT бөлімі", priority="жоғары") == ["Риск 0", "Риск 2", "Риск 3"]
+
+
+def test_export_filter_with_unknown_value_is_empty(db, risks):
+    assert exported_titles(db, status="нет такого") == []
+
+
+def test_export_runs_one_statement_without_scanning_values(engine, db, risks):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+
+    titles = exported_titles(db, status="новый", priority="высокий", department="IT отдел")
+
+    assert titles == ["Риск 0", "Риск 3"]
+    assert len(statements) == 1
+    assert "DISTINCT" not in statements[0]
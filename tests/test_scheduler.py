@@ -0,0 +1,26 @@
+from services import scheduler
+
+
+def use_engine_with_advisory_locks(engine, monkeypatch):
+    # Функции advisory-блокировок Postgres, чтобы _AdvisoryLock работал на SQLite
+    raw = engine.raw_connection()
+    raw.driver_connection.create_function("pg_try_advisory_lock", 1, lambda key: 1)
+    raw.driver_connection.create_function("pg_advisory_unlock", 1, lambda key: 1)
+    raw.close()
+    monkeypatch.setattr(scheduler, "engine", engine)
+
+
+def test_leader_connection_is_not_left_in_transaction(engine, monkeypatch):
+    use_engine_with_advisory_locks(engine, monkeypatch)
+    lock = scheduler._AdvisoryLock(1)
+
+    assert lock.acquire()
+    # Повторный acquire лидера только проверяет, что соединение живо
+    assert lock.acquire()
+
+    # pysqlite сам не открывает транзакцию на SELECT, поэтому проверяем и режим соединения:
+    # на Postgres без AUTOCOMMIT проверка оставила бы соединение «idle in transaction»
+    assert lock._conn.get_execution_options()["isolation_level"] == "AUTOCOMMIT"
+    assert not lock._conn.connection.driver_connection.in_transaction
+    lock.release()
+    assert lock._conn is None